@@ -0,0 +1,503 @@
+import io
+import gc
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import contextlib
+from types import SimpleNamespace
+
+from expression import ExpressionError, LiveEvaluator, compile_expression, parse
+from core import evaluate_many, run_many, unary_many
+from numeric import BACKENDS, FLOAT, DecimalBackend
+
+KEYS = list("0123456789") + ["+", "-", "*", "/", "(", ")", "²", "sin"]
+
+
+def sample_expressions(count, seed=0):
+    """Random well-formed expressions like the ones typed on the keypad."""
+    rng = random.Random(seed)
+    expressions = []
+    while len(expressions) < count:
+        live = LiveEvaluator()
+        for _ in range(rng.randint(3, 30)):
+            live.push(rng.choice(KEYS))
+        text = live.expression()
+        try:
+            parse(text)
+        except ExpressionError:
+            continue
+        expressions.append(text)
+    return expressions
+
+
+def timed(label, count, unit, func):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<24} {count / elapsed:12.0f} {unit}/sec")
+    return {"name": label, "per_sec": count / elapsed, "unit": unit}
+
+
+def evaluate_all(function, expressions, repeat=1):
+    for _ in range(repeat):
+        for text in expressions:
+            try:
+                function(text)()
+            except (ArithmeticError, ValueError):
+                pass
+
+
+def bench_eval(count, repeat):
+    expressions = sample_expressions(count)
+    compile_expression.cache_clear()
+    results = [
+        timed("parse", count, "expr", lambda: [parse(text) for text in expressions]),
+        timed("compile+eval (no cache)", count, "expr",
+              lambda: evaluate_all(compile_expression.__wrapped__, expressions)),
+    ]
+    evaluate_all(compile_expression, expressions)  # warm the cache
+    results.append(timed("eval (cached)", count * repeat, "expr",
+                         lambda: evaluate_all(compile_expression, expressions, repeat)))
+
+    compiled = [compile_expression(text) for text in expressions]
+
+    def call_compiled():
+        for _ in range(repeat):
+            for expression in compiled:
+                try:
+                    expression()
+                except (ArithmeticError, ValueError):
+                    pass
+
+    results.append(timed("eval (compiled object)", count * repeat, "expr", call_compiled))
+    return results
+
+
+def bench_live(count):
+    """Per-keystroke cost of the live result: incremental stacks vs re-parsing the text."""
+    rng = random.Random(1)
+    sequences = [[rng.choice(KEYS) for _ in range(rng.randint(3, 30))] for _ in range(count)]
+    keys = sum(len(keys) for keys in sequences)
+
+    def incremental():
+        for keys in sequences:
+            live = LiveEvaluator()
+            for key in keys:
+                live.push(key)
+                live.value
+
+    def reparse():
+        for keys in sequences:
+            live = LiveEvaluator()
+            for key in keys:
+                live.push(key)
+                try:
+                    compile_expression.__wrapped__(live.expression())()
+                except (ArithmeticError, ValueError):
+                    pass
+
+    return [
+        timed("live (incremental)", keys, "keys", incremental),
+        timed("live (re-parse)", keys, "keys", reparse),
+    ]
+
+
+# expressions where float rounding shows up on the display
+PROBES = {
+    "0.1+0.2": "0.3",
+    "1/3*3": "1",
+    "1.1*1.1": "1.21",
+    "0.7+0.1+0.1": "0.9",
+    "10^20+1-10^20": "1",
+}
+
+
+def bench_numeric(count, repeat, precisions):
+    """Evaluation / live-typing throughput and display correctness for each numeric backend."""
+    expressions = sample_expressions(count)
+    rng = random.Random(1)
+    sequences = [[rng.choice(KEYS) for _ in range(rng.randint(3, 30))] for _ in range(count)]
+    keys = sum(len(keys) for keys in sequences)
+
+    backends = list(BACKENDS.values()) + [DecimalBackend(p) for p in precisions]
+    results = []
+    for backend in backends:
+        label = repr(backend)
+        compiled = [compile_expression(text, backend) for text in expressions]
+
+        def evaluate():
+            for _ in range(repeat):
+                for expression in compiled:
+                    try:
+                        expression()
+                    except (ArithmeticError, ValueError):
+                        pass
+
+        def live():
+            for keys in sequences:
+                evaluator = LiveEvaluator(backend)
+                for key in keys:
+                    evaluator.push(key)
+                    evaluator.value
+
+        print(label)
+        eval_result = timed("  eval (compiled)", count * repeat, "expr", evaluate)
+        live_result = timed("  live", keys, "keys", live)
+        correct = {text: backend.format(compile_expression(text, backend)()) == expected
+                   for text, expected in PROBES.items()}
+        print(f"  {'display correct':<22} {sum(correct.values()):>12}/{len(correct)} "
+              + " ".join(text for text, ok in correct.items() if not ok))
+        results.append({"backend": label, "eval_per_sec": eval_result["per_sec"],
+                        "live_keys_per_sec": live_result["per_sec"], "probes": correct})
+    return results
+
+
+def bench_core(count, size):
+    """Batch API throughput: expressions, key sequences and NumPy element-wise operations."""
+    expressions = sample_expressions(count)
+    rng = random.Random(2)
+    sequences = [[rng.choice(KEYS + ["=", "+/-", "x²"]) for _ in range(rng.randint(3, 30))]
+                 for _ in range(count)]
+    keys = sum(len(keys) for keys in sequences)
+    results = [
+        timed("evaluate_many", count, "expr", lambda: evaluate_many(expressions)),
+        timed("run_many", keys, "keys", lambda: run_many(sequences)),
+    ]
+
+    import numpy as np
+    values = np.random.default_rng(0).uniform(-100, 100, size)
+    loop_values = values[:size // 20].tolist()
+    for key in ("x²", "x³", "sin", "cos", "tan"):
+        function = {"x²": lambda v: v ** 2, "x³": lambda v: v ** 3,
+                    **{name: FLOAT.functions[name] for name in ("sin", "cos", "tan")}}[key]
+        results.append(timed(f"{key} (python loop)", len(loop_values), "ops",
+                             lambda: [function(v) for v in loop_values]))
+        results.append(timed(f"{key} (unary_many)", size, "ops", lambda: unary_many(key, values)))
+    return results
+
+
+def ui_harness():
+    """A Flet page wired to a connection that counts the bytes it would send to the browser."""
+    from flet.core.local_connection import LocalConnection
+    from flet.core.page import Page
+    from flet.core.protocol import (
+        ClientActions, ClientMessage, CommandEncoder, PageCommandResponsePayload,
+        PageCommandsBatchResponsePayload,
+    )
+
+    class RecordingConnection(LocalConnection):
+        def __init__(self):
+            super().__init__()
+            self.bytes = 0
+            self.messages = 0
+
+        def record(self, message):
+            data = json.dumps(message, cls=CommandEncoder, separators=(",", ":"))
+            self.bytes += len(data.encode("utf-8"))
+            self.messages += 1
+
+        def send_command(self, session_id, command):
+            result, message = self._process_command(command)
+            if message:
+                self.record(message)
+            return PageCommandResponsePayload(result=result, error="")
+
+        def send_commands(self, session_id, commands):
+            results, messages = [], []
+            for command in commands:
+                result, message = self._process_command(command)
+                if command.name in ("add", "get"):
+                    results.append(result)
+                if message:
+                    messages.append(message)
+            if messages:
+                self.record(ClientMessage(ClientActions.PAGE_CONTROLS_BATCH, messages))
+            return PageCommandsBatchResponsePayload(results=results, error="")
+
+    loop = asyncio.new_event_loop()
+
+    def new_page():
+        connection = RecordingConnection()
+        return connection, Page(connection, "bench", loop=loop)
+
+    # for benchmarks that need the loop running (async handlers, page.run_thread)
+    new_page.loop = loop
+    return new_page
+
+
+def bench_ui(sessions, keys_per_session, paced):
+    """Bytes and messages per keystroke, and CPU per session, for whole-container vs targeted updates."""
+    from main import FRAME, CalculatorApp
+
+    class FullUpdateApp(CalculatorApp):
+        # the handler as it was before: print every key, then update the whole container
+        def handle_key(self, key):
+            print(f"Button clicked with data = {key}")
+            self.core.press(key)
+            self.expression.value, self.result.value = self.core.display
+            self.update()
+
+    new_page = ui_harness()
+    rng = random.Random(3)
+    scripts = [[rng.choice(KEYS + ["=", "+/-", "x²"]) for _ in range(keys_per_session)]
+               for _ in range(sessions)]
+    results = []
+    for name, app_class in (("full update", FullUpdateApp), ("targeted", CalculatorApp)):
+        total_bytes = total_messages = 0
+        cpu = 0.0
+        for script in scripts:
+            connection, page = new_page()
+            start = time.process_time()
+            with contextlib.redirect_stdout(io.StringIO()):
+                app = app_class()
+                page.add(app)
+                connection.bytes = connection.messages = 0
+                for key in script:
+                    app.button_clicked(SimpleNamespace(control=SimpleNamespace(data=key)))
+                    if paced:
+                        time.sleep(FRAME * 1.5)
+                time.sleep(FRAME * 2)  # let a pending frame flush
+            cpu += time.process_time() - start
+            total_bytes += connection.bytes
+            total_messages += connection.messages
+        keys = sessions * keys_per_session
+        print(f"{name:<12} {total_bytes / keys:8.1f} bytes/key {total_messages / keys:6.2f} msgs/key "
+              f"{cpu / sessions * 1000:8.2f} ms CPU/session")
+        results.append({"mode": name, "paced": paced, "bytes_per_key": total_bytes / keys,
+                        "messages_per_key": total_messages / keys,
+                        "cpu_ms_per_session": cpu / sessions * 1000})
+    return results
+
+
+def bench_keyboard(digits, intervals_ms):
+    """Messages sent to the browser while typing a long number on the keyboard, by typing speed."""
+    import threading
+
+    from main import CalculatorApp
+
+    new_page = ui_harness()
+    threading.Thread(target=new_page.loop.run_forever, daemon=True).start()
+    typed = [str(i % 10) for i in range(1, digits + 1)] + ["Enter"]
+    results = []
+    for interval in intervals_ms:
+        connection, page = new_page()
+        app = CalculatorApp()
+        page.add(app)
+        connection.bytes = connection.messages = 0
+        for key in typed:
+            event = SimpleNamespace(key=key, shift=False, ctrl=False, alt=False, meta=False)
+            asyncio.run_coroutine_threadsafe(app.key_pressed(event), new_page.loop).result()
+            time.sleep(interval / 1000)
+        time.sleep(0.1)  # let the last frame flush
+        assert app.core.expression == "".join(typed[:-1]) + " =", app.core.display
+        print(f"{interval:6.0f} ms between keys {len(typed):4d} keys {connection.messages:4d} messages "
+              f"{connection.bytes:7d} bytes  {len(typed) / connection.messages:4.1f} keys/message")
+        results.append({"interval_ms": interval, "keys": len(typed),
+                        "messages": connection.messages, "bytes": connection.bytes})
+    # key events are not buffered in the browser, so only keys within one frame share an update
+    print("keys further apart than one frame are sent back one update each")
+    return results
+
+
+def bench_history(count, users):
+    """History store: add() cost on the UI thread, batch writes, paging, search and replay."""
+    from history import HistoryStore, replay
+
+    expressions = sample_expressions(1000)
+    results = evaluate_many(expressions)
+    entries = [(f"user{i % users}", expressions[i % 1000], results[i % 1000]) for i in range(count)]
+    user = "user0"
+    per_user = count // users
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # a long flush interval, so the batches are written by the explicit flush() below
+        store = HistoryStore(os.path.join(tmp, "history.db"), batch_size=count + 1,
+                             flush_interval=3600)
+        out = [timed("add (UI thread)", count, "entries",
+                     lambda: [store.add(*entry) for entry in entries]),
+               timed("flush (one batch)", count, "entries", store.flush)]
+
+        def lookups(label, function, repeat=200):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                function()
+            ms = (time.perf_counter() - start) / repeat * 1000
+            print(f"{label:<24} {ms:12.3f} ms")
+            out.append({"name": label, "ms": ms})
+
+        newest = store.page(user, limit=1)[0].id
+        deep = store.page(user, before=newest, limit=per_user // 2)[-1].id
+        lookups("first page", lambda: store.page(user))
+        lookups("page deep in history", lambda: store.page(user, before=deep))
+        lookups("prefix search '1'", lambda: store.prefix(user, "1"))
+        # user0 has every users-th expression; [1] is one it doesn't have
+        lookups("prefix search (rare)", lambda: store.prefix(user, expressions[users][:8]))
+        lookups("prefix search (none)", lambda: store.prefix(user, expressions[1][:8]))
+        lookups("full-text 'sin'", lambda: store.search(user, "sin"))
+        lookups("full-text (rare)", lambda: store.search(user, expressions[users][:8]))
+        out.append(timed(f"replay ({per_user} entries)", per_user, "entries",
+                         lambda: replay(store.entries(user))))
+        store.close()
+    return out
+
+
+def bench_graph(frames, dense):
+    """Graph mode: cost and size of each frame while panning and zooming, against a plain cv.Path."""
+    import numpy as np
+    import flet.canvas as cv
+
+    from graph import Plotter
+    from main import GRAPH_HEIGHT, GRAPH_RANGE, GRAPH_WIDTH
+
+    out = []
+    for text in ("sin(x)", "tan(x)", "x³", "sin(1/x)", "sqrt(x)"):
+        plotter = Plotter(GRAPH_WIDTH, GRAPH_HEIGHT)
+        plotter.set_expression(text)
+        x0, x1 = GRAPH_RANGE
+        y0, y1 = plotter.auto_range(x0, x1)
+        plotter.path_json(x0, x1, y0, y1)
+        plotter.samples = 0
+        # a drag of 4 pixels per frame, then a zoom in and back out by 2% per frame
+        views = []
+        for i in range(frames):
+            dx = (x1 - x0) * 4 / GRAPH_WIDTH
+            x0, x1 = x0 + dx, x1 + dx
+            views.append((x0, x1, y0, y1))
+        for factor in [1 / 1.02] * frames + [1.02] * frames:
+            middle = (x0 + x1) / 2
+            x0, x1 = middle - (middle - x0) * factor, middle + (x1 - middle) * factor
+            views.append((x0, x1, y0, y1))
+        sizes = []
+        start = time.perf_counter()
+        for view in views:
+            sizes.append(len(plotter.path_json(*view)))
+        ms = (time.perf_counter() - start) / len(views) * 1000
+        result = {"name": text, "ms_per_frame": ms, "samples_per_frame": plotter.samples / len(views),
+                  "bytes_per_frame": sum(sizes) / len(views)}
+        print(f"{text:<10} {ms:8.2f} ms/frame {result['samples_per_frame']:8.0f} samples/frame "
+              f"{result['bytes_per_frame']:8.0f} bytes/frame")
+        out.append(result)
+
+    # the straightforward way: every one of `dense` samples as a PathElement of a cv.Path
+    plotter = Plotter(GRAPH_WIDTH, GRAPH_HEIGHT)
+    plotter.set_expression("sin(x)")
+    start = time.perf_counter()
+    xs = np.linspace(-10, 10, dense)
+    ys = plotter.evaluate(xs)
+    sx = (xs + 10) * (GRAPH_WIDTH / 20)
+    sy = (1.2 - ys) * (GRAPH_HEIGHT / 2.4)
+    path = cv.Path([cv.Path.MoveTo(sx[0], sy[0])]
+                   + [cv.Path.LineTo(x, y) for x, y in zip(sx[1:].tolist(), sy[1:].tolist())])
+    path.before_update()
+    ms = (time.perf_counter() - start) * 1000
+    size = len(path._get_attr("elements"))
+    print(f"{'cv.Path':<10} {ms:8.2f} ms/frame {dense:8d} samples/frame {size:8d} bytes/frame")
+    out.append({"name": f"cv.Path, {dense} points", "ms_per_frame": ms,
+                "samples_per_frame": dense, "bytes_per_frame": size})
+    return out
+
+
+def rss_kb():
+    with open("/proc/self/status") as f:
+        return next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+
+
+def bench_sessions(sessions):
+    """Time to build and render one CalculatorApp session, and memory held per 1,000 sessions."""
+    tmp = tempfile.TemporaryDirectory()
+    os.environ["CALC_HISTORY_DB"] = os.path.join(tmp.name, "history.db")
+    from main import main
+
+    new_page = ui_harness()
+    new_page()  # first page pays for imports
+    gc.collect()
+    base = rss_kb()
+    pages = []
+    start = time.perf_counter()
+    for _ in range(sessions):
+        connection, page = new_page()
+        main(page)
+        pages.append(page)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    per_1000 = (rss_kb() - base) / sessions * 1000
+    print(f"{elapsed / sessions * 1000:8.3f} ms/session {per_1000 / 1024:8.1f} MB RSS per 1000 sessions")
+    return {"sessions": sessions, "ms_per_session": elapsed / sessions * 1000,
+            "rss_mb_per_1000": per_1000 / 1024}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calculator benchmarks")
+    parser.add_argument("--json", help="write the results to this JSON file")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    eval_parser = sub.add_parser("eval", help="expression parse / evaluation throughput")
+    eval_parser.add_argument("--count", type=int, default=1_000,
+                             help="distinct expressions (keep within the compile cache size)")
+    eval_parser.add_argument("--repeat", type=int, default=20)
+
+    live_parser = sub.add_parser("live", help="live result update cost per keystroke")
+    live_parser.add_argument("--count", type=int, default=5_000)
+
+    numeric_parser = sub.add_parser("numeric", help="cost and correctness of each numeric backend")
+    numeric_parser.add_argument("--count", type=int, default=1_000)
+    numeric_parser.add_argument("--repeat", type=int, default=5)
+    numeric_parser.add_argument("--precision", type=int, nargs="*", default=[16, 50],
+                                help="extra Decimal precisions to measure")
+
+    core_parser = sub.add_parser("core", help="headless batch API throughput")
+    core_parser.add_argument("--count", type=int, default=1_000)
+    core_parser.add_argument("--size", type=int, default=2_000_000,
+                             help="array length for the element-wise operations")
+
+    ui_parser = sub.add_parser("ui", help="bytes per keystroke and CPU per Flet session")
+    ui_parser.add_argument("--sessions", type=int, default=20)
+    ui_parser.add_argument("--keys", type=int, default=40, help="key presses per session")
+    ui_parser.add_argument("--burst", action="store_true",
+                           help="press keys back to back instead of one per frame")
+
+    sessions_parser = sub.add_parser("sessions", help="session build time and memory per session")
+    sessions_parser.add_argument("--sessions", type=int, default=1_000)
+
+    keyboard_parser = sub.add_parser("keyboard", help="updates sent while typing on the keyboard")
+    keyboard_parser.add_argument("--digits", type=int, default=20)
+    keyboard_parser.add_argument("--interval", type=float, nargs="+", default=[0, 5, 20, 50, 120],
+                                 help="ms between keys (0: pasted or scripted input)")
+
+    history_parser = sub.add_parser("history", help="history store writes, paging and search")
+    history_parser.add_argument("--count", type=int, default=100_000, help="entries in the store")
+    history_parser.add_argument("--users", type=int, default=4)
+
+    graph_parser = sub.add_parser("graph", help="graph mode frame cost while panning and zooming")
+    graph_parser.add_argument("--frames", type=int, default=60, help="frames per gesture")
+    graph_parser.add_argument("--dense", type=int, default=20_000,
+                              help="points of the plain cv.Path compared against")
+
+    args = parser.parse_args()
+
+    if args.command == "eval":
+        results = bench_eval(args.count, args.repeat)
+    elif args.command == "live":
+        results = bench_live(args.count)
+    elif args.command == "numeric":
+        results = bench_numeric(args.count, args.repeat, args.precision)
+    elif args.command == "core":
+        results = bench_core(args.count, args.size)
+    elif args.command == "ui":
+        results = bench_ui(args.sessions, args.keys, not args.burst)
+    elif args.command == "sessions":
+        results = bench_sessions(args.sessions)
+    elif args.command == "keyboard":
+        results = bench_keyboard(args.digits, args.interval)
+    elif args.command == "graph":
+        results = bench_graph(args.frames, args.dense)
+    else:
+        results = bench_history(args.count, args.users)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,173 @@
+from expression import DIGITS, VARIABLE, ExpressionError, LiveEvaluator, compile_expression
+from numeric import FLOAT, array_backend
+
+# scientific keys that apply to the operand just entered
+SCIENTIFIC_KEYS = {"x²": "²", "x³": "³"}
+# takes back the last key of the expression being typed
+BACKSPACE = "⌫"
+
+
+class CalculatorCore:
+    """
+    The calculator without any UI: feed it key labels, read back the two display lines.
+    CalculatorApp, the replay harness and the benchmarks all drive this class.
+    """
+
+    # one of these per browser session, so no per-instance __dict__
+    __slots__ = ("numeric", "live", "expression", "result", "new_operand")
+
+    def __init__(self, numeric=FLOAT):
+        self.numeric = numeric
+        self.live = LiveEvaluator(numeric)
+        self.expression = ""
+        self.result = "0"
+        self.new_operand = True
+
+    @property
+    def display(self):
+        return self.expression, self.result
+
+    def set_numeric(self, numeric):
+        # switching between float / decimal / fraction starts a new calculation
+        self.numeric = numeric
+        self.live = LiveEvaluator(numeric)
+        self.clear()
+
+    def clear(self):
+        self.expression = ""
+        self.result = "0"
+        self.reset()
+
+    def reset(self):
+        self.live.clear()
+        self.new_operand = True
+
+    def recall(self, result):
+        """Show an earlier result (from the history); the next operator continues from it."""
+        self.clear()
+        self.result = result
+
+    def press(self, key):
+        """Apply one key (a button label) and return the display."""
+        key = SCIENTIFIC_KEYS.get(key, key)
+        if self.result == "Error" or key == "AC":
+            self.clear()
+            if key == "AC":
+                return self.display
+
+        if key == "=":
+            if self.live.text:
+                self.equals()
+
+        elif key == BACKSPACE:
+            # after "=" there is nothing typed to take back
+            if not self.new_operand:
+                self.live.backspace()
+                self.show_live()
+
+        elif key == "+/-":
+            self.seed()
+            self.live.toggle_sign()
+            self.show_live()
+
+        else:
+            self.push(key)
+        return self.display
+
+    def press_many(self, keys):
+        for key in keys:
+            self.press(key)
+        return self.display
+
+    def equals(self):
+        # a trailing operator or empty "(" has no operand yet, so "2 + =" is just 2
+        while self.live.expect_operand and self.live.history:
+            self.live.backspace()
+        if not self.live.text:
+            self.show_live()
+            self.reset()
+            return
+        text = self.live.expression()
+        try:
+            value = compile_expression(text, self.numeric)()
+            if not self.numeric.is_finite(value):
+                raise ValueError(value)
+            self.result = self.format_number(value)
+            self.expression = text + " ="
+        except (ExpressionError, ArithmeticError, ValueError):
+            self.result = "Error"
+        self.reset()
+
+    def push(self, key):
+        # a digit, "(" or x after "=" starts a new expression, anything else continues from the result
+        if self.new_operand and not (key in DIGITS or key in ("(", VARIABLE)):
+            self.seed()
+        self.new_operand = False
+        self.live.push(key)
+        self.show_live()
+
+    def seed(self):
+        if self.new_operand and self.result not in ("0", "Error"):
+            self.live.clear()
+            self.live.push_number(self.result)
+        self.new_operand = False
+
+    def show_live(self):
+        self.expression = self.live.text
+        value = self.live.value
+        if value is not None and self.numeric.is_finite(value):
+            self.result = self.format_number(value)
+        elif not self.live.text:
+            self.result = "0"
+        else:
+            # no value yet, or it errors ("4/0"): don't leave an older result under this expression
+            self.result = ""
+
+    def format_number(self, num):
+        return self.numeric.format(num)
+
+    def calculate(self, operand1, operand2, operator):
+        try:
+            return self.format_number(self.numeric.binary[operator](operand1, operand2))
+        except ArithmeticError:
+            return "Error"
+
+
+def evaluate_many(expressions, numeric=FLOAT):
+    """Evaluate many expression strings; each result is the display string or "Error"."""
+    results = []
+    for text in expressions:
+        try:
+            value = compile_expression(text, numeric)()
+            results.append(numeric.format(value) if numeric.is_finite(value) else "Error")
+        except (ExpressionError, ArithmeticError, ValueError):
+            results.append("Error")
+    return results
+
+
+def run_many(sequences, numeric=FLOAT):
+    """Replay key sequences, each on a fresh calculator; returns the final (expression, result)."""
+    return [CalculatorCore(numeric).press_many(keys) for keys in sequences]
+
+
+def unary_many(key, values):
+    """x² / x³ / sin / cos / tan applied element-wise to an array (NaN where undefined)."""
+    backend = array_backend()
+    np = backend.np
+    operations = {
+        "x²": np.square,
+        "x³": lambda v: v * v * v,
+        **{name: backend.functions[name] for name in ("sin", "cos", "tan")},
+    }
+    with np.errstate(all="ignore"):
+        return operations[key](np.asarray(values, dtype=np.float64))
+
+
+def evaluate_over(text, xs):
+    """Evaluate one expression of x over a whole array of x values."""
+    backend = array_backend()
+    np = backend.np
+    xs = np.asarray(xs, dtype=np.float64)
+    with np.errstate(all="ignore"):
+        # constant expressions still come back with one value per x
+        return np.broadcast_to(compile_expression(text, backend)(xs), xs.shape)
@@ -0,0 +1,414 @@
+import math
+import re
+from functools import lru_cache
+
+from numeric import FLOAT, OPERATOR_NAMES
+
+
+class ExpressionError(ValueError):
+    pass
+
+
+TOKEN_RE = re.compile(r"\s*(?:(\d+\.?\d*(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?)|([a-z]+)|(.))")
+
+# binary operator -> (binding power, right associative)
+BINARY = {
+    "+": (10, False),
+    "-": (10, False),
+    "*": (20, False),
+    "/": (20, False),
+    "^": (30, True),
+}
+PREFIX_BP = 25  # -2^2 == -(2^2), 2*-3 == 2*(-3)
+POSTFIX_BP = 40
+IMPLICIT_BP = BINARY["*"][0]  # 2(3+4), 2x, 3sin(x)
+
+POSTFIX = {"²": 2, "³": 3, "%": None}
+# every numeric backend provides these
+FUNCTIONS = frozenset(FLOAT.functions)
+CONSTANTS = frozenset(FLOAT.constants)
+VARIABLE = "x"
+DIGITS = frozenset("0123456789.")
+
+
+def tokenize(text):
+    tokens = []
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        match = TOKEN_RE.match(text, pos)
+        number, name, symbol = match.groups()
+        if number:
+            tokens.append(("num", number))
+        elif name:
+            if name not in FUNCTIONS and name not in CONSTANTS and name != VARIABLE:
+                raise ExpressionError(f"unknown name {name!r}")
+            tokens.append(("name", name))
+        elif symbol in BINARY or symbol in POSTFIX or symbol in "()":
+            tokens.append(("op", symbol))
+        else:
+            raise ExpressionError(f"unexpected {symbol!r}")
+        pos = match.end()
+    return tokens
+
+
+# AST nodes are plain tuples:
+#   ("num", literal) ("const", name) ("var",) ("neg", node) ("bin", op, left, right)
+#   ("call", name, node) ("pow", node, n) ("pct", node)
+
+class _Parser:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def next(self):
+        token = self.peek()
+        if token is None:
+            raise ExpressionError("unexpected end of expression")
+        self.pos += 1
+        return token
+
+    def left_bp(self, token):
+        kind, value = token
+        if kind == "op":
+            if value in BINARY:
+                return BINARY[value][0]
+            if value in POSTFIX:
+                return POSTFIX_BP
+            if value == "(":
+                return IMPLICIT_BP
+            return 0
+        return IMPLICIT_BP
+
+    def expression(self, rbp=0):
+        left = self.prefix(self.next())
+        while (token := self.peek()) is not None and self.left_bp(token) > rbp:
+            left = self.infix(left, token)
+        return left
+
+    def prefix(self, token):
+        kind, value = token
+        if kind == "num":
+            return ("num", value)
+        if kind == "name":
+            if value == VARIABLE:
+                return ("var",)
+            if value in CONSTANTS:
+                return ("const", value)
+            self.expect("(")
+            arg = self.expression()
+            self.expect(")")
+            return ("call", value, arg)
+        if value == "(":
+            node = self.expression()
+            self.expect(")")
+            return node
+        if value == "-":
+            return ("neg", self.expression(PREFIX_BP))
+        if value == "+":
+            return self.expression(PREFIX_BP)
+        raise ExpressionError(f"unexpected {value!r}")
+
+    def infix(self, left, token):
+        kind, value = token
+        if kind == "op" and value in BINARY:
+            self.pos += 1
+            bp, right_assoc = BINARY[value]
+            return ("bin", value, left, self.expression(bp - 1 if right_assoc else bp))
+        if kind == "op" and value in POSTFIX:
+            self.pos += 1
+            return ("pct", left) if value == "%" else ("pow", left, POSTFIX[value])
+        # implicit multiplication: the next operand starts right away
+        return ("bin", "*", left, self.expression(IMPLICIT_BP))
+
+    def expect(self, symbol):
+        if self.next() != ("op", symbol):
+            raise ExpressionError(f"expected {symbol!r}")
+
+
+def parse(text):
+    parser = _Parser(tokenize(text))
+    if parser.peek() is None:
+        raise ExpressionError("empty expression")
+    node = parser.expression()
+    if parser.peek() is not None:
+        raise ExpressionError(f"unexpected {parser.peek()[1]!r}")
+    return node
+
+
+def _source(node, backend, constants):
+    """Python source for node; backends that aren't inline go through named functions."""
+    kind = node[0]
+    if kind == "num":
+        # a literal too big for a float would come out as the bare name inf
+        if backend.inline and math.isfinite(float(node[1])):
+            return repr(float(node[1]))
+        constants.append(backend.number(node[1]))
+        return f"_c[{len(constants) - 1}]"
+    if kind == "const":
+        return node[1]
+    if kind == "var":
+        return "x"
+    if kind == "call":
+        return f"{node[1]}({_source(node[2], backend, constants)})"
+    if kind == "pow":
+        node = ("bin", "^", node[1], ("num", str(node[2])))
+        kind = "bin"
+    if kind == "bin":
+        left = _source(node[2], backend, constants)
+        right = _source(node[3], backend, constants)
+        if backend.inline:
+            op = "**" if node[1] == "^" else node[1]
+            return f"({left}{op}{right})"
+        return f"{OPERATOR_NAMES[node[1]]}({left}, {right})"
+    operand = _source(node[1], backend, constants)
+    if kind == "neg":
+        return f"(-{operand})" if backend.inline else f"neg({operand})"
+    if kind == "pct":
+        return f"({operand}/100.0)" if backend.inline else f"pct({operand})"
+    raise ExpressionError(f"bad node {node!r}")
+
+
+class Expression:
+    """A parsed expression compiled to a Python function of x for one numeric backend."""
+
+    __slots__ = ("text", "ast", "backend", "function")
+
+    def __init__(self, text, ast, backend=FLOAT):
+        self.text = text
+        self.ast = ast
+        self.backend = backend
+        constants = []
+        source = _source(ast, backend, constants)
+        # The source is generated from our own AST, so it only ever contains
+        # literals, x, arithmetic operators and the backend's function names.
+        namespace = {"__builtins__": {}, **backend.namespace(), "_c": tuple(constants),
+                     "_zero": backend.number("0")}
+        self.function = eval(f"lambda x=_zero: {source}", namespace)
+
+    def __call__(self, x=None):
+        return self.function() if x is None else self.function(x)
+
+    def __repr__(self):
+        return f"Expression({self.text!r}, {self.backend!r})"
+
+
+@lru_cache(maxsize=1024)
+def compile_expression(text, backend=FLOAT):
+    return Expression(text, parse(text), backend)
+
+
+def evaluate(text, x=None, backend=FLOAT):
+    return compile_expression(text, backend)(x)
+
+
+class LiveEvaluator:
+    """
+    Keeps the value of the expression being typed up to date one key at a time.
+
+    Operators are reduced as soon as a lower-or-equal precedence operator
+    arrives (shift-reduce), so the stacks only ever hold one pending operator
+    per precedence level and paren depth, and `value` never re-parses the text.
+    """
+
+    __slots__ = ("backend", "text", "values", "ops", "number", "number_start", "operand_start",
+                 "expect_operand", "error", "history")
+
+    def __init__(self, backend=FLOAT):
+        self.backend = backend
+        self.clear()
+
+    def clear(self):
+        self.text = ""
+        self.values = []
+        self.ops = []  # ("bin", op) / ("neg",) / ("(", function name or None, text position)
+        self.number = None  # the number literal being typed
+        self.number_start = 0
+        self.operand_start = 0  # where the last complete operand starts in text
+        self.expect_operand = True
+        self.error = False
+        self.history = []
+
+    def _save(self):
+        self.history.append((self.text, tuple(self.values), tuple(self.ops), self.number,
+                             self.number_start, self.operand_start, self.expect_operand, self.error))
+
+    def backspace(self):
+        if self.history:
+            (self.text, values, ops, self.number, self.number_start, self.operand_start,
+             self.expect_operand, self.error) = self.history.pop()
+            self.values = list(values)
+            self.ops = list(ops)
+
+    @property
+    def open_parens(self):
+        return sum(1 for op in self.ops if op[0] == "(")
+
+    def _apply(self, op):
+        if self.error:
+            return
+        try:
+            if op[0] == "bin":
+                b = self.values.pop()
+                self.values[-1] = self.backend.binary[op[1]](self.values[-1], b)
+            elif op[0] == "neg":
+                self.values[-1] = self.backend.neg(self.values[-1])
+            elif op[1] is not None:
+                self.values[-1] = self.backend.functions[op[1]](self.values[-1])
+            if isinstance(self.values[-1], complex):
+                raise ValueError("complex result")
+        except (ArithmeticError, ValueError):
+            self.error = True
+
+    def _reduce(self, bp, right_assoc=False):
+        while self.ops and self.ops[-1][0] != "(":
+            top = self.ops[-1]
+            top_bp = PREFIX_BP if top[0] == "neg" else BINARY[top[1]][0]
+            if top_bp < bp or (top_bp == bp and right_assoc):
+                break
+            self._apply(self.ops.pop())
+
+    def _operand(self, value, text):
+        if not self.expect_operand:
+            # written out so that "2" "e" "-" "3" can't read back as 2e-3
+            self._binary("*", "*")
+        self.values.append(value)
+        self.operand_start = len(self.text)
+        self.text += text
+        self.expect_operand = False
+
+    def _binary(self, op, text):
+        self.number = None
+        bp, right_assoc = BINARY[op]
+        self._reduce(bp, right_assoc)
+        self.ops.append(("bin", op))
+        self.text += text
+        self.expect_operand = True
+
+    def push(self, key):
+        """
+        Append one key: a digit, '.', an operator, a paren, a postfix or a function name.
+        A function name after an operand applies to that operand, like a postfix does.
+        """
+        self._save()
+        if key in DIGITS:
+            if self.number is None:
+                self._operand(None, "")
+                self.number = ""
+                self.number_start = len(self.text)
+            if key == "." and "." in self.number:
+                self.history.pop()
+                return
+            if key == "." and not self.number:
+                key = "0."
+            self.number += key
+            self.text += key
+            self.values[-1] = self.backend.number(self.number)
+            return
+
+        self.number = None
+        if key in BINARY:
+            if self.expect_operand:
+                if key == "-":
+                    self.ops.append(("neg",))
+                    self.text += key
+                elif self.ops and self.ops[-1][0] == "bin" and self.text[-1:] in BINARY:
+                    # replace the operator that was just typed; it may already have
+                    # reduced the stacks for its own precedence, so undo it first
+                    self.history.pop()
+                    self.backspace()
+                    self.push(key)
+                else:
+                    self.history.pop()
+                return
+            self._binary(key, key)
+        elif key in POSTFIX:
+            if self.expect_operand:
+                self.history.pop()
+                return
+            op = ("bin", "/") if key == "%" else ("bin", "^")
+            operand = self.backend.number("100" if key == "%" else str(POSTFIX[key]))
+            self.values.append(operand)
+            self._apply(op)
+            self.text += key
+        elif key in FUNCTIONS and not self.expect_operand:
+            operand = self.text[self.operand_start:]
+            if not (operand.startswith("(") and operand.endswith(")")):
+                operand = f"({operand})"
+            self._apply(("(", key))
+            self.text = self.text[:self.operand_start] + key + operand
+        elif key == "(" or key in FUNCTIONS:
+            if not self.expect_operand:
+                self._binary("*", "*" if self.text[-1:].isalpha() else "")
+            self.ops.append(("(", None if key == "(" else key, len(self.text)))
+            self.text += key if key == "(" else key + "("
+            self.expect_operand = True
+        elif key == ")":
+            if self.expect_operand or not self.open_parens:
+                self.history.pop()
+                return
+            self._reduce(0)
+            paren = self.ops.pop()
+            self._apply(paren)
+            self.operand_start = paren[2]
+            self.text += key
+        elif key == VARIABLE or key in CONSTANTS:
+            self._operand(self.backend.constants.get(key, self.backend.number("0")), key)
+        else:
+            self.history.pop()
+            raise ExpressionError(f"unknown key {key!r}")
+
+    def push_number(self, literal):
+        """Enter a whole number literal (e.g. the previous result) as one operand."""
+        self._save()
+        if literal.startswith("-"):
+            self.ops.append(("neg",))
+            self.text += "-"
+            literal = literal[1:]
+        self._operand(self.backend.number(literal), "")
+        self.number = literal
+        self.number_start = len(self.text)
+        self.text += literal
+
+    def toggle_sign(self):
+        """Negate the number being typed (or start a negative one)."""
+        if self.number is None:
+            if self.expect_operand:
+                self.push("-")
+            return
+        self._save()
+        start = self.number_start
+        if self.ops and self.ops[-1] == ("neg",) and self.text[start - 1:start] == "-":
+            self.ops.pop()
+            self.text = self.text[:start - 1] + self.text[start:]
+            self.number_start -= 1
+        else:
+            self.ops.append(("neg",))
+            self.text = self.text[:start] + "-" + self.text[start:]
+            self.number_start += 1
+        self.operand_start = self.number_start
+
+    @property
+    def value(self):
+        """The value of what has been typed so far (a trailing operator is ignored)."""
+        if self.error or not self.values:
+            return None
+        values, ops = self.values, self.ops
+        self.values, self.ops = list(values), list(ops)
+        try:
+            if self.expect_operand:
+                # drop the dangling operator(s) and any empty parens
+                while self.ops and len(self.values) <= sum(op[0] == "bin" for op in self.ops):
+                    self.ops.pop()
+            while self.ops:
+                self._apply(self.ops.pop())
+            return None if self.error else self.values[-1]
+        finally:
+            self.values, self.ops, self.error = values, ops, False
+
+    def expression(self):
+        """The typed text with open parentheses closed, ready for compile_expression."""
+        return self.text + ")" * self.open_parens
@@ -0,0 +1,220 @@
+import json
+import math
+
+from expression import compile_expression
+from numeric import array_backend
+
+
+class Plotter:
+    """
+    Turns one expression of x into canvas path elements for a view (x0, x1, y0, y1).
+
+    Sampling is vectorized and adaptive: a base grid of at least `density` points per pixel,
+    refined `refine` times wherever the curve bends by more than half a pixel or
+    jumps (tan's asymptotes). The base grid sits on multiples of a power-of-two step,
+    so panning reuses the samples already computed for that step and only evaluates
+    the strip that came into view. Whatever the number of samples, at most four points
+    per pixel column are sent (first, min, max, last), and none that lie on a straight
+    line between their neighbours.
+    """
+
+    def __init__(self, width, height, density=1, refine=16, cache_limit=1 << 18):
+        self.np = array_backend().np
+        self.width = width
+        self.height = height
+        self.density = density
+        self.refine = refine
+        self.cache_limit = cache_limit
+        self.function = None
+        self.text = None
+        # step exponent -> (first grid index, ys on the grid)
+        self.cache = {}
+        self.samples = 0
+
+    def set_expression(self, text):
+        """Compile text for plotting; raises ExpressionError for text that doesn't parse."""
+        if text != self.text:
+            expression = compile_expression(text, array_backend())
+            self.function = expression.function
+            self.text = text
+            self.cache.clear()
+
+    def evaluate(self, xs):
+        np = self.np
+        self.samples += len(xs)
+        with np.errstate(all="ignore"):
+            ys = np.asarray(self.function(xs), dtype=np.float64)
+        # a constant expression comes back as a single value
+        return np.broadcast_to(ys, xs.shape) if ys.shape != xs.shape else ys
+
+    def grid(self, x0, x1):
+        """Samples on the base grid covering [x0, x1], reusing the cached ones."""
+        np = self.np
+        exponent = math.floor(math.log2((x1 - x0) / (self.width * self.density)))
+        step = 2.0 ** exponent
+        lo, hi = math.floor(x0 / step), math.ceil(x1 / step)
+
+        cached = self.cache.get(exponent)
+        if cached is not None:
+            k0, ys = cached
+            k1 = k0 + len(ys) - 1
+            if lo >= k0 and hi <= k1:
+                return np.arange(lo, hi + 1) * step, ys[lo - k0:hi - k0 + 1]
+            if k0 <= hi and lo <= k1 and (max(hi, k1) - min(lo, k0)) < self.cache_limit:
+                # evaluate only the strips on either side of what is cached
+                parts = []
+                if lo < k0:
+                    parts.append(self.evaluate(np.arange(lo, k0) * step))
+                parts.append(ys)
+                if hi > k1:
+                    parts.append(self.evaluate(np.arange(k1 + 1, hi + 1) * step))
+                k0 = min(lo, k0)
+                ys = np.concatenate(parts)
+                self.cache[exponent] = (k0, ys)
+                return np.arange(lo, hi + 1) * step, ys[lo - k0:hi - k0 + 1]
+
+        xs = np.arange(lo, hi + 1) * step
+        ys = self.evaluate(xs)
+        # keep a few zoom levels: zooming back and forth reuses them too
+        if len(self.cache) >= 4:
+            del self.cache[next(iter(self.cache))]
+        self.cache[exponent] = (lo, ys)
+        return xs, ys
+
+    def sample(self, x0, x1, y0, y1):
+        """Adaptive samples over [x0, x1] for a view whose y axis spans [y0, y1]."""
+        np = self.np
+        xs, ys = self.grid(x0, x1)
+        if len(xs) < 3:
+            return xs, ys
+
+        # half a pixel, in y units: bends smaller than this don't show
+        tolerance = 0.5 * (y1 - y0) / self.height
+        finite = np.isfinite(ys)
+        with np.errstate(all="ignore"):
+            bend = np.abs(ys[:-2] - 2 * ys[1:-1] + ys[2:]) > tolerance
+            jump = np.abs(np.diff(ys)) > (y1 - y0)
+        flagged = jump | (finite[:-1] != finite[1:])
+        flagged[:-1] |= bend
+        flagged[1:] |= bend
+        flagged &= (finite[:-1] | finite[1:])
+        if not flagged.any():
+            return xs, ys
+
+        # interval i gets `refine` extra points when flagged, built in x order
+        counts = np.where(flagged, self.refine + 1, 1)
+        starts = np.concatenate(([0], np.cumsum(counts)))
+        total = int(starts[-1])
+        position = np.arange(total) - np.repeat(starts[:-1], counts)
+        fraction = position / np.repeat(counts, counts)
+        step = xs[1] - xs[0]
+        fine_xs = np.empty(total + 1)
+        fine_xs[:-1] = np.repeat(xs[:-1], counts) + fraction * step
+        fine_xs[-1] = xs[-1]
+
+        fine_ys = np.empty(total + 1)
+        on_grid = position == 0
+        fine_ys[:-1][on_grid] = ys[:-1]
+        fine_ys[-1] = ys[-1]
+        between = ~on_grid
+        fine_ys[:-1][between] = self.evaluate(fine_xs[:-1][between])
+        return fine_xs, fine_ys
+
+    def auto_range(self, x0, x1):
+        """A y range that shows the bulk of the curve (tan's spikes don't flatten the rest)."""
+        np = self.np
+        _, ys = self.grid(x0, x1)
+        ys = ys[np.isfinite(ys)]
+        if not len(ys):
+            return -1.0, 1.0
+        lo, hi = np.percentile(ys, [2, 98])
+        if hi - lo < 1e-9:
+            lo, hi = lo - 1, hi + 1
+        margin = (hi - lo) * 0.1
+        return float(lo - margin), float(hi + margin)
+
+    def columns(self, xs, ys, x0, x1, y0, y1):
+        """
+        Screen points, at most four per pixel column, as a list of segments.
+        Segments break at non-finite values and at jumps taller than the view (asymptotes).
+        """
+        np = self.np
+        sx = (xs - x0) * (self.width / (x1 - x0))
+        with np.errstate(all="ignore"):
+            sy = (y1 - ys) * (self.height / (y1 - y0))
+            finite = np.isfinite(sy)
+            breaks = ~finite[:-1] | ~finite[1:] | (np.abs(np.diff(sy)) > self.height)
+        # points far outside the view still draw the right slope once clamped
+        sy = np.clip(sy, -self.height, 2 * self.height)
+
+        segments = []
+        edges = np.flatnonzero(breaks) + 1
+        for start, end in zip(np.concatenate(([0], edges)), np.concatenate((edges, [len(xs)]))):
+            if not finite[start]:
+                start += 1
+            if end - start < 2:
+                continue
+            segments.append(self.reduce(sx[start:end], sy[start:end]))
+        return segments
+
+    def reduce(self, sx, sy):
+        # first, min, max, last of every pixel column, min/max in the order they occur
+        np = self.np
+        column = np.floor(sx).astype(np.int64)
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(column)) + 1))
+        ends = np.concatenate((starts[1:], [len(sx)])) - 1
+        first, last = sy[starts], sy[ends]
+        low = np.minimum.reduceat(sy, starts)
+        high = np.maximum.reduceat(sy, starts)
+        low_first = np.abs(first - low) <= np.abs(first - high)
+        ys = np.stack((first, np.where(low_first, low, high), np.where(low_first, high, low),
+                       last), axis=1).ravel()
+        # first and last keep their own x: a straight line stays straight
+        middle = column[starts] + 0.5
+        xs = np.stack((sx[starts], middle, middle, sx[ends]), axis=1).ravel()
+        # columns with one or two samples repeat points: min/max that are first or last go,
+        # and so does last when the column has a single sample
+        middle_kept = (low != first) & (low != last), (high != first) & (high != last)
+        keep = np.stack((np.ones(len(starts), dtype=bool),
+                         np.where(low_first, *middle_kept), np.where(low_first, *middle_kept[::-1]),
+                         starts != ends), axis=1).ravel()
+        xs, ys = xs[keep], ys[keep]
+        # drop points within 0.15 pixel of the line through their neighbours. A pass
+        # never drops two neighbours, so each dropped point's line stays valid; repeating
+        # it lets a straight run collapse to its ends
+        while len(xs) > 2:
+            dx, dy = xs[2:] - xs[:-2], ys[2:] - ys[:-2]
+            cross = np.abs(dx * (ys[1:-1] - ys[:-2]) - dy * (xs[1:-1] - xs[:-2]))
+            keep = np.ones(len(xs), dtype=bool)
+            keep[1:-1] = cross > 0.15 * np.hypot(dx, dy)
+            keep[2:-1:2] = True
+            if keep.all():
+                break
+            xs, ys = xs[keep], ys[keep]
+        return xs, ys
+
+    def path_json(self, x0, x1, y0, y1):
+        """The "elements" JSON of a flet.canvas.Path drawing the curve."""
+        np = self.np
+        xs, ys = self.sample(x0, x1, y0, y1)
+        elements = []
+        for sx, sy in self.columns(xs, ys, x0, x1, y0, y1):
+            # a tenth of a pixel is plenty, and keeps the message short
+            points = zip(np.round(sx, 1).tolist(), np.round(sy, 1).tolist())
+            x, y = next(points)
+            elements.append({"x": x, "y": y, "type": "moveto"})
+            elements.extend({"x": x, "y": y, "type": "lineto"} for x, y in points)
+        return json.dumps(elements, separators=(",", ":"))
+
+    def axes_json(self, x0, x1, y0, y1):
+        """The x and y axes (where they are in view) as path elements."""
+        elements = []
+        if y0 < 0 < y1:
+            y = round(y1 * self.height / (y1 - y0), 1)
+            elements += [{"x": 0, "y": y, "type": "moveto"},
+                         {"x": self.width, "y": y, "type": "lineto"}]
+        if x0 < 0 < x1:
+            x = round(-x0 * self.width / (x1 - x0), 1)
+            elements += [{"x": x, "y": 0, "type": "moveto"},
+                         {"x": x, "y": self.height, "type": "lineto"}]
+        return json.dumps(elements, separators=(",", ":"))
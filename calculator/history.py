@@ -0,0 +1,220 @@
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+from core import evaluate_many
+from numeric import FLOAT
+
+Entry = namedtuple("Entry", "id expression result created")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY,
+    user TEXT NOT NULL,
+    expression TEXT NOT NULL,
+    result TEXT NOT NULL,
+    created REAL NOT NULL
+);
+-- newest-first pages of one user's history
+CREATE INDEX IF NOT EXISTS idx_history_user_id ON history(user, id);
+-- prefix search: expression >= '12+' AND expression < '12,' is a range on this index
+CREATE INDEX IF NOT EXISTS idx_history_user_expression ON history(user, expression);
+"""
+
+# user is not in the index: a phrase match on it also finds ids that merely contain its
+# tokens ("abc" in "abc-123"), so search() filters on history.user instead.
+# '.' is kept inside tokens: 0.5 is one token, not "0" and "5"
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(
+    expression, result, content='history', content_rowid='id',
+    tokenize="unicode61 tokenchars '.'"
+);
+CREATE TRIGGER IF NOT EXISTS history_fts_insert AFTER INSERT ON history BEGIN
+    INSERT INTO history_fts(rowid, expression, result)
+    VALUES (new.id, new.expression, new.result);
+END;
+CREATE TRIGGER IF NOT EXISTS history_fts_delete AFTER DELETE ON history BEGIN
+    INSERT INTO history_fts(history_fts, rowid, expression, result)
+    VALUES ('delete', old.id, old.expression, old.result);
+END;
+"""
+
+# history.db files written before user was taken out of the index
+OLD_FTS_SQL = "SELECT 1 FROM sqlite_master WHERE name = 'history_fts' AND sql LIKE '%user, expression%'"
+DROP_OLD_FTS = """
+DROP TRIGGER IF EXISTS history_fts_insert;
+DROP TRIGGER IF EXISTS history_fts_delete;
+DROP TABLE history_fts;
+"""
+
+COLUMNS = "id, expression, result, created"
+
+
+class HistoryStore:
+    """
+    Calculation history per user in SQLite. add() only appends to a buffer; a background
+    thread writes the buffer in one transaction every batch_size entries or flush_interval
+    seconds, so the UI thread never waits on the disk.
+    """
+
+    def __init__(self, path="history.db", batch_size=200, flush_interval=1.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pending = []
+        self.cond = threading.Condition()
+        self.write_lock = threading.Lock()
+        self.local = threading.local()
+        self.closed = False
+
+        conn = self.connect()
+        # WAL: readers don't block the writer, and serve.py's workers can share the file
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        try:
+            rebuild = conn.execute(OLD_FTS_SQL).fetchone() is not None
+            if rebuild:
+                conn.executescript(DROP_OLD_FTS)
+            conn.executescript(FTS_SCHEMA)
+            if rebuild:
+                with conn:
+                    conn.execute("INSERT INTO history_fts(history_fts) VALUES ('rebuild')")
+            self.fts = True
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5: search() falls back to prefix search
+            self.fts = False
+
+        self.writer = threading.Thread(target=self.write_loop, name="history-writer", daemon=True)
+        self.writer.start()
+
+    def connect(self):
+        # one connection per thread; Flet runs handlers on a thread pool
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def add(self, user, expression, result, created=None):
+        with self.cond:
+            self.pending.append((user, expression, result, created or time.time()))
+            if len(self.pending) >= self.batch_size:
+                self.cond.notify()
+
+    def write_loop(self):
+        while True:
+            with self.cond:
+                if len(self.pending) < self.batch_size and not self.closed:
+                    self.cond.wait(self.flush_interval)
+                closed = self.closed
+            self.flush()
+            if closed:
+                return
+
+    def flush(self):
+        """Write everything buffered so far; returns the number of entries written."""
+        with self.write_lock:
+            with self.cond:
+                rows, self.pending = self.pending, []
+            if rows:
+                conn = self.connect()
+                with conn:
+                    conn.executemany(
+                        "INSERT INTO history (user, expression, result, created) VALUES (?, ?, ?, ?)",
+                        rows,
+                    )
+            return len(rows)
+
+    def query(self, sql, params):
+        # whatever is still buffered belongs on the page the user is about to see
+        if self.pending:
+            self.flush()
+        return [Entry(*row) for row in self.connect().execute(sql, params)]
+
+    def page(self, user, before=None, limit=50):
+        """Newest first; pass the id of the last entry shown as `before` for the next page."""
+        return self.query(
+            f"SELECT {COLUMNS} FROM history WHERE user = ? AND id < ? ORDER BY id DESC LIMIT ?",
+            (user, before or 2 ** 63 - 1, limit),
+        )
+
+    def prefix(self, user, text, before=None, limit=50):
+        """Entries whose expression starts with text, newest first."""
+        if not text:
+            return self.page(user, before, limit)
+        # every string starting with text sorts between text and text with its last char bumped.
+        # Left to itself the planner walks the id index and filters, which is slow for
+        # prefixes that match little or nothing; the expression index reads only the matches.
+        upper = text[:-1] + chr(ord(text[-1]) + 1)
+        return self.query(
+            f"SELECT {COLUMNS} FROM history INDEXED BY idx_history_user_expression "
+            "WHERE user = ? AND expression >= ? AND expression < ? AND id < ? "
+            "ORDER BY id DESC LIMIT ?",
+            (user, text, upper, before or 2 ** 63 - 1, limit),
+        )
+
+    def search(self, user, text, before=None, limit=50):
+        """Entries with every word of text in the expression or result (word prefixes match)."""
+        words = text.replace("(", " ").replace(")", " ").split()
+        if not self.fts or not words:
+            return self.prefix(user, text.strip(), before, limit)
+
+        def quote(word):
+            return '"' + word.replace('"', '""') + '"'
+
+        match = " AND ".join(quote(word) + "*" for word in words)
+        # matches come newest rowid first; the join keeps only this user's, up to the page size
+        return self.query(
+            "SELECT h.id, h.expression, h.result, h.created"
+            " FROM history_fts CROSS JOIN history h ON h.id = history_fts.rowid"
+            " WHERE history_fts MATCH ? AND history_fts.rowid < ? AND h.user = ?"
+            " ORDER BY history_fts.rowid DESC LIMIT ?",
+            (match, before or 2 ** 63 - 1, user, limit),
+        )
+
+    def entries(self, user, chunk=1000):
+        """Every entry of a user, oldest first, read chunk rows at a time."""
+        after = 0
+        while True:
+            rows = self.query(
+                f"SELECT {COLUMNS} FROM history WHERE user = ? AND id > ? ORDER BY id LIMIT ?",
+                (user, after, chunk),
+            )
+            yield from rows
+            if len(rows) < chunk:
+                return
+            after = rows[-1].id
+
+    def count(self, user):
+        if self.pending:
+            self.flush()
+        return self.connect().execute("SELECT COUNT(*) FROM history WHERE user = ?",
+                                      (user,)).fetchone()[0]
+
+    def clear(self, user):
+        if self.pending:
+            self.flush()
+        conn = self.connect()
+        with conn:
+            conn.execute("DELETE FROM history WHERE user = ?", (user,))
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        self.writer.join()
+        conn = getattr(self.local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+
+def replay(entries, numeric=FLOAT):
+    """
+    Re-evaluate history entries in bulk with today's engine (or another numeric backend).
+    Returns (entry, result) for every entry whose result comes out different.
+    """
+    entries = list(entries)
+    results = evaluate_many([entry.expression for entry in entries], numeric)
+    return [(entry, result) for entry, result in zip(entries, results) if result != entry.result]
@@ -0,0 +1,416 @@
+import os
+import json
+import time
+import shlex
+import random
+import signal
+import asyncio
+import argparse
+import subprocess
+
+import websockets
+
+# the first messages a Flet web client sends, as the browser would
+REGISTER = {
+    "pageName": "",
+    "pageRoute": "/",
+    "pageWidth": "800",
+    "pageHeight": "600",
+    "windowWidth": "800",
+    "windowHeight": "600",
+    "windowTop": "0",
+    "windowLeft": "0",
+    "isPWA": "false",
+    "isWeb": "true",
+    "isDebug": "false",
+    "platform": "linux",
+    "platformBrightness": "dark",
+    "media": "{}",
+    "sessionId": None,
+}
+
+# click scripts: buttons are found by their text (or icon, for the counter's IconButtons)
+SCRIPTS = {
+    # calc.py and main.py
+    "digits": ["1", "2", "+", "3", "4", "*", "5", "6", "-", "7", "8", "9", "/", "4", "=", "AC"],
+    # main.py only
+    # sin after "=" applies to the result; with nothing typed it opens "sin(". Every click
+    # changes the display, since a click only counts once the browser is sent an update
+    "scientific": ["2", "x²", "+", "3", "x³", "=", "sin", "*", "4", "=", "AC",
+                   "sin", "3", "0", ")", "=", "AC"],
+    # counter/main.py
+    "counter": ["add", "add", "add", "remove"],
+}
+# messages that change what the browser shows
+UPDATES = ("pageControlsBatch", "updateControlProps", "addPageControls")
+
+
+def process_tree(pid):
+    """pid and all of its descendants, from /proc (Linux only)."""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # the command name may contain spaces, the parent pid follows the closing paren
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    tree, stack = [], [pid]
+    while stack:
+        tree.append(stack.pop())
+        stack.extend(children.get(tree[-1], []))
+    return tree
+
+
+def rss_kb(pid):
+    """Resident memory of pid and its worker processes, in kB (None without a pid)."""
+    if not pid:
+        return None
+    total = 0
+    for p in process_tree(pid):
+        try:
+            with open(f"/proc/{p}/status") as f:
+                total += next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+        except (OSError, StopIteration):
+            pass
+    return total
+
+
+class Session:
+    """One simulated browser tab: a websocket that registered and got the page rendered."""
+
+    def __init__(self, ws, client_ip):
+        self.ws = ws
+        self.client_ip = client_ip
+        self.targets = {}  # button label -> control id
+        self.inbox = asyncio.Queue()  # (arrival time, message)
+        self.reader = None
+
+    @classmethod
+    async def open(cls, url, client_ip, timeout=30):
+        # X-Forwarded-For spreads the simulated clients over serve.py's workers
+        ws = await websockets.connect(url, additional_headers={"X-Forwarded-For": client_ip},
+                                      max_size=None, open_timeout=timeout)
+        session = cls(ws, client_ip)
+        try:
+            await ws.send(json.dumps({"action": "registerWebClient", "payload": REGISTER}))
+            await asyncio.wait_for(session.wait_rendered(), timeout)
+        except BaseException:
+            await ws.close()
+            raise
+        session.reader = asyncio.create_task(session.read())
+        return session
+
+    async def wait_rendered(self):
+        # the session is usable once the app has added its controls to the page
+        while True:
+            message = json.loads(await self.ws.recv())
+            if message["action"] in ("pageControlsBatch", "addPageControls"):
+                self.find_targets(message)
+                return message
+
+    def find_targets(self, message):
+        if message["action"] == "pageControlsBatch":
+            for part in message["payload"]:
+                self.find_targets(part)
+        elif message["action"] == "addPageControls":
+            for control in message["payload"]["controls"]:
+                label = control.get("text") or control.get("icon")
+                if label is not None:
+                    self.targets.setdefault(label, control["i"])
+
+    async def read(self):
+        try:
+            async for data in self.ws:
+                self.inbox.put_nowait((time.perf_counter(), json.loads(data)))
+        except websockets.ConnectionClosed:
+            pass
+
+    async def click(self, label, timeout=5):
+        """Click a button; milliseconds until the page update arrives (None if none did)."""
+        while not self.inbox.empty():
+            self.inbox.get_nowait()  # a late update from the previous click
+        start = time.perf_counter()
+        await self.ws.send(json.dumps({
+            "action": "pageEventFromWeb",
+            "payload": {"eventTarget": self.targets[label], "eventName": "click", "eventData": ""},
+        }))
+        deadline = start + timeout
+        while True:
+            try:
+                arrived, message = await asyncio.wait_for(self.inbox.get(),
+                                                          deadline - time.perf_counter())
+            except asyncio.TimeoutError:
+                return None
+            if message["action"] in UPDATES:
+                return (arrived - start) * 1000
+
+    async def alive(self):
+        try:
+            await asyncio.wait_for(await self.ws.ping(), 10)
+            return True
+        except (asyncio.TimeoutError, websockets.ConnectionClosed):
+            return False
+
+    async def close(self):
+        await self.ws.close()
+        if self.reader:
+            await self.reader
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+
+async def open_sessions(url, sessions, rate):
+    """Open sessions at `rate` per second; returns the sessions, open times in ms and errors."""
+    opened, open_ms, errors = [], [], {}
+
+    async def open_one(i):
+        start = time.perf_counter()
+        try:
+            opened.append(await Session.open(url, f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}"))
+            open_ms.append((time.perf_counter() - start) * 1000)
+        except (OSError, asyncio.TimeoutError, websockets.WebSocketException) as e:
+            errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+
+    tasks = []
+    for i in range(sessions):
+        tasks.append(asyncio.create_task(open_one(i)))
+        await asyncio.sleep(1 / rate)
+    await asyncio.gather(*tasks)
+    return opened, open_ms, errors
+
+
+async def close_sessions(opened):
+    await asyncio.gather(*(session.close() for session in opened), return_exceptions=True)
+
+
+async def hold(url, sessions, rate, seconds, server_pid):
+    """Open sessions at `rate` per second, keep them for `seconds`, report how many survived."""
+    base_rss = rss_kb(server_pid)
+    opened, open_ms, errors = await open_sessions(url, sessions, rate)
+    await asyncio.sleep(seconds)
+
+    held = sum(await asyncio.gather(*(session.alive() for session in opened)))
+    rss = rss_kb(server_pid)
+    await close_sessions(opened)
+
+    result = {
+        "sessions": sessions,
+        "opened": len(opened),
+        "held": held,
+        "errors": errors,
+        "open_p50_ms": percentile(open_ms, 50),
+        "open_p95_ms": percentile(open_ms, 95),
+        "rss_base_kb": base_rss,
+        "rss_kb": rss,
+        "rss_per_session_kb": (rss - base_rss) / held if rss and held else None,
+    }
+    print(f"held {held}/{sessions} sessions ({len(opened)} opened, errors {errors or 'none'})")
+    if open_ms:
+        print(f"open p50 {result['open_p50_ms']:.1f} ms  p95 {result['open_p95_ms']:.1f} ms")
+    if result["rss_per_session_kb"] is not None:
+        print(f"server RSS {base_rss / 1024:.1f} -> {rss / 1024:.1f} MB, "
+              f"{result['rss_per_session_kb']:.1f} kB/session")
+    return result
+
+
+async def replay(url, script, sessions, clicks, think, rate, server_pid):
+    """Every session clicks through `script` (cyclically) with `think` ms between clicks."""
+    base_rss = rss_kb(server_pid)
+    opened, open_ms, errors = await open_sessions(url, sessions, rate)
+    rss = rss_kb(server_pid)
+    latencies, missed = [], 0
+
+    async def clicker(session, seed):
+        nonlocal missed
+        rng = random.Random(seed)
+        # start at a random point so the sessions don't click in lockstep
+        await asyncio.sleep(rng.uniform(0, think) / 1000)
+        for i in range(clicks):
+            try:
+                latency = await session.click(script[i % len(script)])
+            except websockets.ConnectionClosed:
+                errors["ConnectionClosed"] = errors.get("ConnectionClosed", 0) + 1
+                return
+            if latency is None:
+                missed += 1
+            else:
+                latencies.append(latency)
+            await asyncio.sleep(rng.uniform(0.5, 1.5) * think / 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(clicker(session, i) for i, session in enumerate(opened)))
+    elapsed = time.perf_counter() - start
+    await close_sessions(opened)
+
+    result = {
+        "sessions": sessions,
+        "opened": len(opened),
+        "clicks": len(latencies) + missed,
+        "missed": missed,
+        "errors": errors,
+        "clicks_per_sec": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "max_ms": max(latencies, default=None),
+        "open_p50_ms": percentile(open_ms, 50),
+        "rss_base_kb": base_rss,
+        "rss_kb": rss,
+        "rss_per_session_kb": (rss - base_rss) / len(opened) if rss and opened else None,
+    }
+    if latencies:
+        print(f"{sessions:>6} sessions {result['clicks_per_sec']:8.1f} clicks/s  "
+              f"p50 {result['p50_ms']:7.1f}  p95 {result['p95_ms']:7.1f}  "
+              f"p99 {result['p99_ms']:7.1f} ms  missed {missed}  errors {errors or 'none'}")
+    else:
+        print(f"{sessions:>6} sessions: no clicks answered, errors {errors or 'none'}")
+    if result["rss_per_session_kb"] is not None:
+        print(f"{'':>6} server RSS {rss / 1024:.1f} MB, {result['rss_per_session_kb']:.1f} kB/session")
+    return result
+
+
+def sustainable(result, slo_ms):
+    clicks = result["clicks"]
+    return (clicks > 0 and result["opened"] == result["sessions"] and not result["errors"]
+            and result["missed"] <= clicks * 0.01 and result["p95_ms"] <= slo_ms)
+
+
+async def ramp(url, script, steps, clicks, think, rate, server_pid, slo_ms):
+    """Replay at growing session counts until p95 latency passes slo_ms or sessions fail."""
+    results, best = [], 0
+    for sessions in steps:
+        result = await replay(url, script, sessions, clicks, think, rate, server_pid)
+        results.append(result)
+        if not sustainable(result, slo_ms):
+            break
+        best = sessions
+    print(f"max sustainable sessions: {best} (p95 <= {slo_ms:g} ms, no errors)")
+    return {"max_sustainable_sessions": best, "slo_p95_ms": slo_ms, "steps": results}
+
+
+async def first_frame(url, timeout):
+    """Connect as soon as the server lets us; ms to the first frame and to the rendered page."""
+    start = time.perf_counter()
+    deadline = start + timeout
+    while True:
+        try:
+            ws = await websockets.connect(url, max_size=None,
+                                          open_timeout=max(deadline - time.perf_counter(), 0.1))
+            break
+        except (OSError, asyncio.TimeoutError, websockets.InvalidHandshake):
+            # not listening yet, or the balancer had no worker to hand the connection to
+            if time.perf_counter() > deadline:
+                raise
+            await asyncio.sleep(0.02)
+    session = Session(ws, None)
+    try:
+        await ws.send(json.dumps({"action": "registerWebClient", "payload": REGISTER}))
+        await asyncio.wait_for(ws.recv(), timeout)
+        first = time.perf_counter()
+        await asyncio.wait_for(session.wait_rendered(), timeout)
+        return first, time.perf_counter()
+    finally:
+        await ws.close()
+
+
+async def startup(url, command, runs, timeout):
+    """Start the server (or its container) `runs` times; time to the first websocket frame."""
+    results = []
+    for run in range(runs):
+        start = time.perf_counter()
+        process = subprocess.Popen(shlex.split(command), start_new_session=True)
+        try:
+            first, rendered = await first_frame(url, timeout)
+            result = {"first_frame_ms": (first - start) * 1000,
+                      "rendered_ms": (rendered - start) * 1000}
+        except (OSError, asyncio.TimeoutError, websockets.WebSocketException) as e:
+            result = {"first_frame_ms": None, "rendered_ms": None, "error": type(e).__name__}
+        finally:
+            os.killpg(process.pid, signal.SIGTERM)
+            try:
+                process.wait(30)
+            except subprocess.TimeoutExpired:
+                os.killpg(process.pid, signal.SIGKILL)
+                process.wait()
+        results.append(result)
+        if result["first_frame_ms"] is None:
+            print(f"run {run + 1}: no frame within {timeout:g} s ({result['error']})")
+        else:
+            print(f"run {run + 1}: first frame {result['first_frame_ms']:8.0f} ms  "
+                  f"rendered {result['rendered_ms']:8.0f} ms")
+    first_ms = [r["first_frame_ms"] for r in results if r["first_frame_ms"] is not None]
+    rendered_ms = [r["rendered_ms"] for r in results if r["rendered_ms"] is not None]
+    summary = {"runs": results, "first_frame_p50_ms": percentile(first_ms, 50),
+               "rendered_p50_ms": percentile(rendered_ms, 50), "failed": runs - len(first_ms)}
+    if first_ms:
+        print(f"median: first frame {summary['first_frame_p50_ms']:.0f} ms, "
+              f"rendered {summary['rendered_p50_ms']:.0f} ms, {summary['failed']} failed")
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulated Flet web clients against a running server")
+    parser.add_argument("--url", default="ws://127.0.0.1:8080/ws")
+    parser.add_argument("--server-pid", type=int,
+                        help="pid of serve.py (or the Flet server) to read RSS from, with its workers")
+    parser.add_argument("--json", help="write the results to this JSON file")
+    parser.add_argument("--label", help="name for this run in the JSON, e.g. the release")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    hold_parser = sub.add_parser("hold", help="open N sessions and check how many the server holds")
+    hold_parser.add_argument("--sessions", type=int, default=100)
+    hold_parser.add_argument("--rate", type=float, default=20, help="new sessions per second")
+    hold_parser.add_argument("--seconds", type=float, default=10, help="how long to hold them open")
+
+    for name, help in (("run", "replay a click script on N sessions"),
+                       ("ramp", "replay at growing session counts to find the sustainable maximum")):
+        replay_parser = sub.add_parser(name, help=help)
+        replay_parser.add_argument("--script", choices=SCRIPTS, default="digits")
+        replay_parser.add_argument("--clicks", type=int, default=50, help="clicks per session")
+        replay_parser.add_argument("--think", type=float, default=300,
+                                   help="mean ms between one session's clicks")
+        replay_parser.add_argument("--rate", type=float, default=50, help="new sessions per second")
+        if name == "run":
+            replay_parser.add_argument("--sessions", type=int, default=50)
+        else:
+            replay_parser.add_argument("--steps", type=int, nargs="+",
+                                       default=[25, 50, 100, 200, 400, 800])
+            replay_parser.add_argument("--slo", type=float, default=100,
+                                       help="p95 click-to-update latency a step must stay under, ms")
+
+    startup_parser = sub.add_parser("startup",
+                                    help="start the server N times and time its first websocket frame")
+    startup_parser.add_argument("--command", dest="command_line", default="python serve.py",
+                                help='what starts the server, e.g. "docker run --rm -p 8080:8080 flet-calc"')
+    startup_parser.add_argument("--runs", type=int, default=5)
+    startup_parser.add_argument("--timeout", type=float, default=60,
+                                help="seconds a run may take to serve its first frame")
+
+    args = parser.parse_args()
+
+    if args.command == "hold":
+        results = asyncio.run(hold(args.url, args.sessions, args.rate, args.seconds,
+                                   args.server_pid))
+    elif args.command == "startup":
+        results = asyncio.run(startup(args.url, args.command_line, args.runs, args.timeout))
+    elif args.command == "run":
+        results = asyncio.run(replay(args.url, SCRIPTS[args.script], args.sessions, args.clicks,
+                                     args.think, args.rate, args.server_pid))
+    else:
+        results = asyncio.run(ramp(args.url, SCRIPTS[args.script], args.steps, args.clicks,
+                                   args.think, args.rate, args.server_pid, args.slo))
+
+    if args.json:
+        run = {name: value for name, value in vars(args).items() if name != "json"}
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"time": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "args": run,
+                       "results": results}, f, indent=2)
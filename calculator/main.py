@@ -1,215 +1,422 @@
 import flet as ft
-import math
-
-class CalcButton(ft.ElevatedButton):
-    def __init__(self, text, button_clicked, expand=1):
-        super().__init__()
-        self.text = text
-        self.expand = expand
-        self.on_click = button_clicked
-        self.data = text
-
-
-class DigitButton(CalcButton):
-    def __init__(self, text, button_clicked, expand=1):
-        CalcButton.__init__(self, text, button_clicked, expand)
-        self.bgcolor = ft.colors.WHITE24
-        self.color = ft.colors.WHITE
-
-
-class ActionButton(CalcButton):
-    def __init__(self, text, button_clicked):
-        CalcButton.__init__(self, text, button_clicked)
-        self.bgcolor = ft.colors.ORANGE
-        self.color = ft.colors.WHITE
-
-
-class ExtraActionButton(CalcButton):
-    def __init__(self, text, button_clicked):
-        CalcButton.__init__(self, text, button_clicked)
-        self.bgcolor = ft.colors.BLUE_GREY_100
-        self.color = ft.colors.BLACK
+import flet.canvas as cv
+import atexit
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+
+from core import BACKSPACE, CalculatorCore
+from expression import ExpressionError
+from graph import Plotter
+from history import HistoryStore
+from numeric import BACKENDS, FLOAT
+
+logger = logging.getLogger("calculator")
+
+# fraction of frames of key presses that get logged; the rest cost one random() call
+LOG_SAMPLE_RATE = float(os.environ.get("CALC_LOG_SAMPLE_RATE", "0.01"))
+# key presses closer together than this are sent to the browser as one update
+FRAME = 1 / 60
+# history entries loaded per page of the history panel
+HISTORY_PAGE = 50
+# the graph panel, in pixels, and the x range a new plot starts with
+GRAPH_WIDTH = 460
+GRAPH_HEIGHT = 260
+GRAPH_RANGE = (-10.0, 10.0)
+
+
+# button styles, shared by every session
+STYLES = {
+    "digit": {"bgcolor": ft.colors.WHITE24, "color": ft.colors.WHITE},
+    "action": {"bgcolor": ft.colors.ORANGE, "color": ft.colors.WHITE},
+    "extra": {"bgcolor": ft.colors.BLUE_GREY_100, "color": ft.colors.BLACK},
+}
+
+# the keypad as (label, style, expand) rows; the label is also the key sent to CalculatorCore
+KEYPAD = (
+    (("AC", "extra", 1), ("+/-", "extra", 1), ("%", "extra", 1), ("/", "action", 1)),
+    (("7", "digit", 1), ("8", "digit", 1), ("9", "digit", 1), ("*", "action", 1)),
+    (("4", "digit", 1), ("5", "digit", 1), ("6", "digit", 1), ("-", "action", 1)),
+    (("1", "digit", 1), ("2", "digit", 1), ("3", "digit", 1), ("+", "action", 1)),
+    (("0", "digit", 2), (".", "digit", 1), ("=", "action", 1)),
+)
+# the column next to the keypad
+SCIENTIFIC = (
+    ("x²", "extra", 1), ("x³", "extra", 1), ("sin", "extra", 1), ("cos", "extra", 1),
+    ("tan", "extra", 1), ("(", "extra", 1), (")", "extra", 1), ("x", "extra", 1),
+)
+KEY_STYLES = {label: style for row in KEYPAD + (SCIENTIFIC,) for label, style, _ in row}
+
+# keyboard keys (Flutter's key labels) -> calculator keys. Desktop browsers report the key,
+# not the character, for shifted symbols, so those are looked up by key and shift as well
+KEYBOARD = {
+    **{digit: digit for digit in "0123456789"},
+    **{f"Numpad {digit}": digit for digit in "0123456789"},
+    ".": ".", ",": ".", "Numpad Decimal": ".",
+    "+": "+", "-": "-", "*": "*", "/": "/", "%": "%", "(": "(", ")": ")",
+    "Numpad Add": "+", "Numpad Subtract": "-", "Numpad Multiply": "*", "Numpad Divide": "/",
+    "=": "=", "Enter": "=", "Numpad Enter": "=", "Numpad Equal": "=",
+    "Escape": "AC", "Delete": "AC", "Backspace": BACKSPACE, "X": "x",
+}
+SHIFTED_KEYBOARD = {"=": "+", "8": "*", "5": "%", "9": "(", "0": ")"}
+
+
+class KeypadButton(ft.ElevatedButton):
+    """
+    An ElevatedButton built from a KEYPAD entry. ElevatedButton encodes its style to JSON
+    every time it is sent; keypad styles never change, so that JSON is made once per style.
+    """
+
+    style_json = {}
+
+    def __init__(self, key, on_click):
+        # no attributes of its own: Flet controls are already at the size where one more
+        # turns every button's key-sharing __dict__ into a much larger one
+        label, _, expand = key
+        super().__init__(text=label, data=label, expand=expand, on_click=on_click)
+
+    def before_update(self):
+        # skip ElevatedButton.before_update (the style encoding), keep the rest of the chain
+        super(ft.ElevatedButton, self).before_update()
+        style = KEY_STYLES[self.data]
+        encoded = self.style_json.get(style)
+        if encoded is None:
+            button = ft.ElevatedButton(text=" ", **STYLES[style])
+            button.before_update()
+            encoded = self.style_json[style] = button._get_attr("style")
+        self._set_attr("style", encoded)
+
+
+class PlotPath(cv.Path):
+    """
+    A canvas Path whose elements arrive as JSON made by Plotter. cv.Path would encode
+    a PathElement object per point on every update; Plotter already has the JSON.
+    """
+
+    def __init__(self, paint):
+        super().__init__(paint=paint)
+        self.elements_json = "[]"
+
+    def before_update(self):
+        super(cv.Path, self).before_update()
+        self._set_attr("elements", self.elements_json)
+        self._set_attr_json("paint", self.paint)
+
+
+@lru_cache(maxsize=None)
+def history_store():
+    # one store per process, shared by every session
+    store = HistoryStore(os.environ.get("CALC_HISTORY_DB", "history.db"))
+    atexit.register(store.close)
+    return store
 
 
 class CalculatorApp(ft.Container):
-    def __init__(self):
+    def __init__(self, numeric=FLOAT, history=None, user=""):
         super().__init__()
-        self.reset()
-
+        self.core = CalculatorCore(numeric)
+        self.lock = threading.Lock()
+        self.last_flush = 0.0
+        self.flush_timer = None
+        # keys received since the last frame, applied together when it is sent
+        self.keys = deque()
+        # typing goes to the history search box while it has the focus
+        self.search_focused = False
+        self.history = history
+        self.user = user
+        # the history and graph panels are only built when they are first opened
+        self.history_panel = None
+        self.graph_panel = None
+
+        self.mode = ft.Dropdown(
+            value=numeric.name,
+            options=[ft.dropdown.Option(name) for name in BACKENDS],
+            on_change=self.mode_changed,
+            width=120,
+            text_size=12,
+            color=ft.colors.WHITE,
+        )
+        self.expression = ft.Text(value="", color=ft.colors.WHITE54, size=14)
         self.result = ft.Text(value="0", color=ft.colors.WHITE, size=20)
         self.width = 500
         self.bgcolor = ft.colors.BLACK
         self.border_radius = ft.border_radius.all(20)
         self.padding = 20
 
-        self.scientific_buttons = ft.Column(
-            controls=[
-                ExtraActionButton(text="x²", button_clicked=self.scientific_button_clicked),
-                ExtraActionButton(text="x³", button_clicked=self.scientific_button_clicked),
-                ExtraActionButton(text="sin", button_clicked=self.scientific_button_clicked),
-                ExtraActionButton(text="cos", button_clicked=self.scientific_button_clicked),
-                ExtraActionButton(text="tan", button_clicked=self.scientific_button_clicked),
-            ]
-        )
+        top = [self.mode, ft.IconButton(ft.icons.SHOW_CHART, icon_color=ft.colors.WHITE54,
+                                        on_click=self.toggle_graph)]
+        if history is not None:
+            top.append(ft.IconButton(ft.icons.HISTORY, icon_color=ft.colors.WHITE54,
+                                     on_click=self.toggle_history))
 
+        # one bound method shared by every button
+        on_click = self.button_clicked
         self.content = ft.Column(
             controls=[
+                ft.Row(controls=[ft.Row(controls=top), self.expression],
+                       alignment="spaceBetween"),
                 ft.Row(controls=[self.result], alignment="end"),
                 ft.Row(
                     controls=[
                         ft.Column(
                             controls=[
-                                ft.Row(
-                                    controls=[
-                                        ExtraActionButton(
-                                            text="AC", button_clicked=self.button_clicked
-                                        ),
-                                        ExtraActionButton(
-                                            text="+/-", button_clicked=self.button_clicked
-                                        ),
-                                        ExtraActionButton(text="%", button_clicked=self.button_clicked),
-                                        ActionButton(text="/", button_clicked=self.button_clicked),
-                                    ]
-                                ),
-                                ft.Row(
-                                    controls=[
-                                        DigitButton(text="7", button_clicked=self.button_clicked),
-                                        DigitButton(text="8", button_clicked=self.button_clicked),
-                                        DigitButton(text="9", button_clicked=self.button_clicked),
-                                        ActionButton(text="*", button_clicked=self.button_clicked),
-                                    ]
-                                ),
-                                ft.Row(
-                                    controls=[
-                                        DigitButton(text="4", button_clicked=self.button_clicked),
-                                        DigitButton(text="5", button_clicked=self.button_clicked),
-                                        DigitButton(text="6", button_clicked=self.button_clicked),
-                                        ActionButton(text="-", button_clicked=self.button_clicked),
-                                    ]
-                                ),
-                                ft.Row(
-                                    controls=[
-                                        DigitButton(text="1", button_clicked=self.button_clicked),
-                                        DigitButton(text="2", button_clicked=self.button_clicked),
-                                        DigitButton(text="3", button_clicked=self.button_clicked),
-                                        ActionButton(text="+", button_clicked=self.button_clicked),
-                                    ]
-                                ),
-                                ft.Row(
-                                    controls=[
-                                        DigitButton(
-                                            text="0", expand=2, button_clicked=self.button_clicked
-                                        ),
-                                        DigitButton(text=".", button_clicked=self.button_clicked),
-                                        ActionButton(text="=", button_clicked=self.button_clicked),
-                                    ]
-                                ),
+                                ft.Row(controls=[KeypadButton(key, on_click) for key in row])
+                                for row in KEYPAD
                             ]
                         ),
-                        self.scientific_buttons
+                        ft.Column(controls=[KeypadButton(key, on_click) for key in SCIENTIFIC]),
                     ]
-                )
+                ),
             ]
         )
 
-    def scientific_button_clicked(self, e):
-        data = e.control.data
-        try:
-            value = float(self.result.value)
-            if data == "x²":
-                self.result.value = str(self.format_number(value ** 2))
-            elif data == "x³":
-                self.result.value = str(self.format_number(value ** 3))
-            elif data == "sin":
-                self.result.value = str(self.format_number(math.sin(value)))
-            elif data == "cos":
-                self.result.value = str(self.format_number(math.cos(value)))
-            elif data == "tan":
-                self.result.value = str(self.format_number(math.tan(value)))
-            self.update()
-        except Exception:
-            self.result.value = "Error"
-            self.update()
-
     def button_clicked(self, e):
-        data = e.control.data
-        print(f"Button clicked with data = {data}")
-        if self.result.value == "Error" or data == "AC":
-            self.result.value = "0"
-            self.reset()
-
-        elif data in ("1", "2", "3", "4", "5", "6", "7", "8", "9", "0", "."):
-            if self.result.value == "0" or self.new_operand == True:
-                self.result.value = data
-                self.new_operand = False
-            else:
-                self.result.value = self.result.value + data
-
-        elif data in ("+", "-", "*", "/"):
-            self.result.value = self.calculate(
-                self.operand1, float(self.result.value), self.operator
-            )
-            self.operator = data
-            if self.result.value == "Error":
-                self.operand1 = "0"
-            else:
-                self.operand1 = float(self.result.value)
-            self.new_operand = True
-
-        elif data in ("="):
-            self.result.value = self.calculate(
-                self.operand1, float(self.result.value), self.operator
-            )
-            self.reset()
-
-        elif data in ("%"):
-            self.result.value = float(self.result.value) / 100
-            self.reset()
-
-        elif data in ("+/-"):
-            if float(self.result.value) > 0:
-                self.result.value = "-" + str(self.result.value)
-
-            elif float(self.result.value) < 0:
-                self.result.value = str(
-                    self.format_number(abs(float(self.result.value)))
-                )
-
+        # every key, digits to sin / cos / tan, goes through CalculatorCore by its label
+        self.handle_key(e.control.data)
+
+    async def key_pressed(self, e):
+        # async: Flet runs it on the event loop, in the order the keys arrived; plain
+        # handlers go to a thread pool, where two quick keys could swap places.
+        # Every key event is its own message from the browser; only keys that land in the
+        # same frame share the update sent back, so typing at human speed is one update per key
+        if self.search_focused or e.ctrl or e.alt or e.meta:
+            return
+        key = (e.shift and SHIFTED_KEYBOARD.get(e.key)) or KEYBOARD.get(e.key)
+        if key is not None:
+            self.keys.append(key)
+            self.page.run_thread(self.keys_received)
+
+    def handle_key(self, key):
+        with self.lock:
+            self.keys.append(key)
+            self.schedule_flush()
+
+    def keys_received(self):
+        with self.lock:
+            self.schedule_flush()
+
+    def apply_keys_locked(self):
+        """Apply every key received since the last frame, in one step."""
+        keys = [self.keys.popleft() for _ in range(len(self.keys))]
+        if "=" not in keys or self.history is None:
+            self.core.press_many(keys)
+        else:
+            # split at each "=" so that every result can go to the history
+            start = 0
+            for i, key in enumerate(keys):
+                if key == "=":
+                    before = self.core.press_many(keys[start:i])
+                    expression, result = self.core.press("=")
+                    if result != "Error" and (expression, result) != before:
+                        # only buffered here; the store writes it to SQLite from its own thread
+                        self.history.add(self.user, expression.removesuffix(" ="), result)
+                    start = i + 1
+            self.core.press_many(keys[start:])
+        if LOG_SAMPLE_RATE and random.random() < LOG_SAMPLE_RATE:
+            logger.info("keys session=%x keys=%s expression=%s result=%s",
+                        id(self), " ".join(keys), *self.core.display)
+
+    def schedule_flush(self):
+        # the first key of a frame is sent right away, the rest of the frame is sent once
+        if self.flush_timer is not None:
+            return
+        wait = self.last_flush + FRAME - time.monotonic()
+        if wait <= 0:
+            self.flush_locked()
+        else:
+            self.flush_timer = threading.Timer(wait, self.flush)
+            self.flush_timer.daemon = True
+            self.flush_timer.start()
+
+    def flush(self):
+        with self.lock:
+            self.flush_timer = None
+            self.flush_locked()
+
+    def flush_locked(self):
+        self.last_flush = time.monotonic()
+        if self.keys:
+            self.apply_keys_locked()
+        changed = []
+        for control, value in zip((self.expression, self.result), self.core.display):
+            if control.value != value:
+                control.value = value
+                changed.append(control)
+        if self.graph_panel is not None and self.graph_panel.visible and self.plot_locked():
+            changed += [self.axes, self.plot]
+        # only the changed controls are diffed and sent, not the whole keypad
+        if changed and self.page:
+            self.page.update(*changed)
+
+    def toggle_history(self, e):
+        if self.history_panel is None:
+            self.history_search = ft.TextField(hint_text="Search history", dense=True,
+                                               text_size=12, color=ft.colors.WHITE,
+                                               on_change=self.history_search_changed,
+                                               on_focus=self.search_focus_changed,
+                                               on_blur=self.search_focus_changed)
+            self.history_list = ft.ListView(height=200, spacing=0)
+            self.history_last = None
+            self.history_panel = ft.Column(controls=[self.history_search, self.history_list])
+            self.content.controls.append(self.history_panel)
+        else:
+            self.history_panel.visible = not self.history_panel.visible
+        if self.history_panel.visible:
+            self.show_history()
         self.update()
 
-    def format_number(self, num):
-        if num % 1 == 0:
-            return int(num)
+    def search_focus_changed(self, e):
+        self.search_focused = e.name == "focus"
+
+    def history_search_changed(self, e):
+        self.show_history()
+        self.history_list.update()
+
+    def more_history(self, e):
+        self.show_history(more=True)
+        self.history_list.update()
+
+    def show_history(self, more=False):
+        """Fill the history panel with the newest entries matching the search box."""
+        entries = self.history.search(self.user, self.history_search.value or "",
+                                      before=self.history_last if more else None,
+                                      limit=HISTORY_PAGE)
+        controls = self.history_list.controls
+        if more:
+            controls.pop()  # the "More" button
         else:
-            return num
-
-    def calculate(self, operand1, operand2, operator):
-
-        if operator == "+":
-            return self.format_number(operand1 + operand2)
+            controls.clear()
+        controls.extend(
+            ft.TextButton(text=f"{entry.expression} = {entry.result}", data=entry.result,
+                          on_click=self.history_clicked)
+            for entry in entries
+        )
+        if len(entries) == HISTORY_PAGE:
+            controls.append(ft.TextButton(text="More", on_click=self.more_history))
+        self.history_last = entries[-1].id if entries else None
+
+    def toggle_graph(self, e):
+        with self.lock:
+            if self.graph_panel is None:
+                self.plotter = Plotter(GRAPH_WIDTH, GRAPH_HEIGHT)
+                # (x0, x1, y0, y1); None until there is something to plot
+                self.view = None
+                self.graph_scale = 1.0
+                self.graph_dirty = False
+                self.axes = PlotPath(ft.Paint(stroke_width=1, style=ft.PaintingStyle.STROKE,
+                                              color=ft.colors.WHITE24))
+                self.plot = PlotPath(ft.Paint(stroke_width=2, style=ft.PaintingStyle.STROKE,
+                                              color=ft.colors.ORANGE))
+                self.graph_panel = ft.GestureDetector(
+                    # points off the view are clamped, not dropped: the canvas must clip
+                    content=ft.Container(cv.Canvas([self.axes, self.plot]), width=GRAPH_WIDTH,
+                                         height=GRAPH_HEIGHT, clip_behavior=ft.ClipBehavior.HARD_EDGE),
+                    on_scale_start=self.graph_scale_start,
+                    on_scale_update=self.graph_scale_update,
+                    on_scroll=self.graph_scrolled,
+                    drag_interval=int(FRAME * 1000),
+                )
+                self.content.controls.append(self.graph_panel)
+            else:
+                self.graph_panel.visible = not self.graph_panel.visible
+            if self.graph_panel.visible:
+                self.graph_dirty = True
+                self.plot_locked()
+        self.update()
 
-        elif operator == "-":
-            return self.format_number(operand1 - operand2)
+    def plot_locked(self):
+        """Re-render the plot if the expression or the view changed; True if it did."""
+        text = self.core.expression.removesuffix(" =")
+        if text and text != self.plotter.text:
+            try:
+                self.plotter.set_expression(text)
+            except ExpressionError:
+                # half-typed ("x²+"): keep showing the last expression that parsed
+                pass
+            else:
+                x0, x1 = GRAPH_RANGE
+                self.view = (x0, x1, *self.plotter.auto_range(x0, x1))
+                self.graph_dirty = True
+        if not self.graph_dirty or self.view is None:
+            return False
+        self.graph_dirty = False
+        self.axes.elements_json = self.plotter.axes_json(*self.view)
+        self.plot.elements_json = self.plotter.path_json(*self.view)
+        return True
+
+    def move_view(self, dx, dy, factor=1.0, fx=0.0, fy=0.0):
+        # dx, dy: pixels dragged; factor: zoom around the pixel (fx, fy)
+        if self.view is None:
+            return
+        x0, x1, y0, y1 = self.view
+        ux, uy = (x1 - x0) / GRAPH_WIDTH, (y1 - y0) / GRAPH_HEIGHT
+        x0, x1 = x0 - dx * ux, x1 - dx * ux
+        y0, y1 = y0 + dy * uy, y1 + dy * uy
+        if factor != 1.0 and 1e-9 < (x1 - x0) * factor < 1e9:
+            x, y = x0 + fx * ux, y1 - fy * uy
+            x0, x1 = x - (x - x0) * factor, x + (x1 - x) * factor
+            y0, y1 = y - (y - y0) * factor, y + (y1 - y) * factor
+        self.view = (x0, x1, y0, y1)
+        self.graph_dirty = True
+        # gestures arrive faster than frames; they add up in view and are drawn once a frame
+        self.schedule_flush()
+
+    def graph_scale_start(self, e):
+        with self.lock:
+            self.graph_scale = 1.0
+
+    def graph_scale_update(self, e):
+        # one finger or the mouse drags, two fingers also pinch
+        with self.lock:
+            scale = e.scale or 1.0
+            factor = self.graph_scale / scale
+            self.graph_scale = scale
+            self.move_view(e.focal_point_delta_x or 0.0, e.focal_point_delta_y or 0.0, factor,
+                           e.local_focal_point_x or 0.0, e.local_focal_point_y or 0.0)
+
+    def graph_scrolled(self, e):
+        with self.lock:
+            self.move_view(0.0, 0.0, 1.1 ** ((e.scroll_delta_y or 0.0) / 100),
+                           e.local_x or 0.0, e.local_y or 0.0)
+
+    def history_clicked(self, e):
+        with self.lock:
+            # keys typed before the click come first
+            if self.keys:
+                self.apply_keys_locked()
+            self.core.recall(e.control.data)
+            self.schedule_flush()
+
+    def mode_changed(self, e):
+        with self.lock:
+            if self.keys:
+                self.apply_keys_locked()
+            self.core.set_numeric(BACKENDS[self.mode.value])
+            self.schedule_flush()
 
-        elif operator == "*":
-            return self.format_number(operand1 * operand2)
+    def format_number(self, num):
+        return self.core.format_number(num)
 
-        elif operator == "/":
-            if operand2 == 0:
-                return "Error"
-            else:
-                return self.format_number(operand1 / operand2)
+    def calculate(self, operand1, operand2, operator):
+        return self.core.calculate(operand1, operand2, operator)
 
     def reset(self):
-        self.operator = "+"
-        self.operand1 = 0
-        self.new_operand = True
+        self.core.reset()
 
 
 def main(page: ft.Page):
     page.title = "Calc App"
-    calc = CalculatorApp()
+    # Flet has no accounts: history belongs to the browser session, which survives reconnects
+    calc = CalculatorApp(history=history_store(), user=page.session_id)
+    page.on_keyboard_event = calc.key_pressed
     page.add(calc)
 
 
-ft.app(target=main)
\ No newline at end of file
+if __name__ == "__main__":
+    logging.basicConfig(level=os.environ.get("CALC_LOG_LEVEL", "INFO"),
+                        format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    ft.app(target=main)
\ No newline at end of file
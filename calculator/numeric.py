@@ -0,0 +1,244 @@
+import math
+import operator
+from decimal import Context, Decimal, localcontext
+from fractions import Fraction
+from functools import lru_cache
+
+# names the compiled expressions use for the binary operators
+OPERATOR_NAMES = {"+": "add", "-": "sub", "*": "mul", "/": "div", "^": "pow"}
+
+
+class FloatBackend:
+    """Plain floats: the fast path, with the usual binary rounding (0.1 + 0.2)."""
+
+    name = "float"
+    # compiled expressions use Python operators directly instead of function calls
+    inline = True
+
+    def __init__(self):
+        self.binary = {
+            "+": operator.add,
+            "-": operator.sub,
+            "*": operator.mul,
+            "/": operator.truediv,
+            "^": operator.pow,
+        }
+        self.functions = {
+            "sin": math.sin,
+            "cos": math.cos,
+            "tan": math.tan,
+            "sqrt": math.sqrt,
+            "ln": math.log,
+            "log": math.log10,
+            "abs": abs,
+        }
+        self.constants = {"pi": math.pi, "e": math.e}
+
+    def number(self, literal):
+        return float(literal)
+
+    def neg(self, value):
+        return -value
+
+    def pct(self, value):
+        return self.binary["/"](value, self.number("100"))
+
+    def is_finite(self, value):
+        return not isinstance(value, complex) and math.isfinite(value)
+
+    def format(self, value):
+        # integers print without ".0" while they are still exact (below 2**53)
+        if value.is_integer() and abs(value) < 2 ** 53:
+            return str(int(value))
+        return repr(value)
+
+    def namespace(self):
+        """Names available to compiled expressions."""
+        names = {OPERATOR_NAMES[op]: function for op, function in self.binary.items()}
+        names.update(self.functions)
+        names.update(self.constants)
+        names.update(neg=self.neg, pct=self.pct)
+        return names
+
+    def __repr__(self):
+        return f"{type(self).__name__}()"
+
+
+class DecimalBackend(FloatBackend):
+    """decimal.Decimal at a fixed number of significant digits: 0.1 + 0.2 == 0.3."""
+
+    name = "decimal"
+    inline = False
+
+    def __init__(self, precision=28):
+        super().__init__()
+        self.precision = precision
+        self.context = Context(prec=precision)
+        ctx = self.context
+        self.binary = {
+            "+": ctx.add,
+            "-": ctx.subtract,
+            "*": ctx.multiply,
+            "/": ctx.divide,
+            "^": ctx.power,
+        }
+        self.functions = {
+            "sin": self.sin,
+            "cos": self.cos,
+            "tan": lambda x: ctx.divide(self.sin(x), self.cos(x)),
+            "sqrt": ctx.sqrt,
+            "ln": ctx.ln,
+            "log": ctx.log10,
+            "abs": ctx.abs,
+        }
+        self.constants = {"pi": self.pi(), "e": ctx.exp(Decimal(1))}
+
+    def number(self, literal):
+        return self.context.create_decimal(literal)
+
+    def neg(self, value):
+        return self.context.minus(value)
+
+    def pi(self):
+        # the pi() recipe from the decimal module documentation
+        with localcontext(self.context) as ctx:
+            ctx.prec += 2
+            three = Decimal(3)
+            lasts, t, s, n, na, d, da = 0, three, 3, 1, 0, 0, 24
+            while s != lasts:
+                lasts = s
+                n, na = n + na, na + 8
+                d, da = d + da, da + 32
+                t = (t * n) / d
+                s += t
+            ctx.prec -= 2
+            return +s
+
+    def _series(self, x, i):
+        # Taylor series for sin (i=1) and cos (i=0), after reducing x to [-pi, pi]
+        with localcontext(self.context) as ctx:
+            ctx.prec += 2
+            x = x.remainder_near(2 * self.constants["pi"])
+            term = x if i else Decimal(1)
+            lasts, s = 0, term
+            while s != lasts:
+                lasts = s
+                i += 2
+                term = -term * x * x / (i * (i - 1))
+                s += term
+            ctx.prec -= 2
+            return +s
+
+    def sin(self, x):
+        return self._series(x, 1)
+
+    def cos(self, x):
+        return self._series(x, 0)
+
+    def is_finite(self, value):
+        return value.is_finite()
+
+    def format(self, value):
+        value = value.normalize(self.context)
+        if value.is_finite() and -6 <= value.adjusted() < self.precision:
+            return format(value, "f")
+        return str(value)
+
+    def __repr__(self):
+        return f"DecimalBackend(precision={self.precision})"
+
+
+class FractionBackend(FloatBackend):
+    """
+    fractions.Fraction: exact + - * / and integer powers.
+    sin/cos/tan, roots and fractional powers go through float.
+    """
+
+    name = "fraction"
+    inline = False
+
+    def __init__(self, digits=15):
+        super().__init__()
+        self.digits = digits
+        self.binary = dict(self.binary, **{"^": self.power})
+        self.functions = {
+            name: self._via_float(function) for name, function in self.functions.items()
+        }
+        self.functions["abs"] = abs
+        self.constants = {name: self._from_float(value) for name, value in self.constants.items()}
+        self.display = DecimalBackend(digits)
+
+    def _from_float(self, value):
+        if isinstance(value, complex) or not math.isfinite(value):
+            raise ValueError(value)
+        return Fraction(repr(value))
+
+    def _via_float(self, function):
+        return lambda x: self._from_float(function(float(x)))
+
+    def number(self, literal):
+        return Fraction(literal)
+
+    def power(self, base, exponent):
+        if exponent.denominator == 1 and abs(exponent.numerator) <= 1024:
+            return base ** exponent.numerator
+        # fractional or huge exponents: let float raise OverflowError instead of
+        # building a number with millions of digits
+        return self._from_float(float(base) ** float(exponent))
+
+    def is_finite(self, value):
+        return True
+
+    def format(self, value):
+        if value.denominator == 1:
+            return str(value.numerator)
+        ctx = self.display.context
+        return self.display.format(ctx.divide(Decimal(value.numerator), Decimal(value.denominator)))
+
+    def __repr__(self):
+        return f"FractionBackend(digits={self.digits})"
+
+
+class ArrayBackend(FloatBackend):
+    """NumPy float64 arrays: one compiled expression evaluated over many x values at once."""
+
+    name = "array"
+
+    def __init__(self):
+        super().__init__()
+        try:
+            import numpy as np
+        except ImportError:
+            raise ImportError("vectorized evaluation needs numpy (pip install numpy)")
+        self.np = np
+        self.functions = {
+            "sin": np.sin,
+            "cos": np.cos,
+            "tan": np.tan,
+            "sqrt": np.sqrt,
+            "ln": np.log,
+            "log": np.log10,
+            "abs": np.abs,
+        }
+        self.constants = {"pi": np.pi, "e": np.e}
+
+    def is_finite(self, value):
+        return self.np.isfinite(value)
+
+
+FLOAT = FloatBackend()
+DECIMAL = DecimalBackend()
+FRACTION = FractionBackend()
+BACKENDS = {backend.name: backend for backend in (FLOAT, DECIMAL, FRACTION)}
+
+
+@lru_cache(maxsize=None)
+def array_backend():
+    # numpy is only imported when something asks for vectorized evaluation
+    return ArrayBackend()
+
+
+def get_backend(name, precision=None):
+    if name == "decimal" and precision:
+        return DecimalBackend(precision)
+    return BACKENDS[name]
@@ -0,0 +1,211 @@
+import argparse
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import os
+import signal
+
+logger = logging.getLogger("calculator.serve")
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# largest HTTP request head (request line + headers) the balancer will read
+HEAD_LIMIT = 64 * 1024
+# imported once by the fork server; every worker is forked with them already loaded
+PRELOAD = ["main", "uvicorn", "flet_web.fastapi.serve_fastapi_web_app"]
+
+
+def run_worker(port):
+    """One worker process: the Flet app as an ASGI app under uvicorn, on a local port."""
+    # own session: a Ctrl+C in the terminal reaches only the balancer, which drains first
+    os.setsid()
+    # assets and history.db are found relative to the app directory
+    os.chdir(HERE)
+    import flet as ft
+    import uvicorn
+
+    from main import main
+
+    app = ft.app(target=main, export_asgi_app=True)
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def client_key(head, peername):
+    """What a connection is pinned by: the client IP fly.io reports, else the peer address."""
+    for line in head.split(b"\r\n")[1:]:
+        name, _, value = line.partition(b":")
+        if name.strip().lower() in (b"fly-client-ip", b"x-forwarded-for"):
+            return value.split(b",")[0].strip().decode("latin-1")
+    return peername[0] if peername else ""
+
+
+class Balancer:
+    """
+    Accepts connections on the public port and pipes each one to a worker process.
+    A Flet session lives in the worker that holds its websocket, so connections are
+    pinned to a worker by client IP: a reconnecting browser comes back to its session.
+
+    Workers are forked from a fork server that has imported Flet and the app once, instead
+    of each one importing them on its own (about a second of CPU each). Only `prestart`
+    workers start with the balancer; the others start when a connection is first pinned
+    to them, and a worker that exits is started again the same way.
+    """
+
+    def __init__(self, workers, base_port, drain_timeout, prestart=1):
+        self.ports = [base_port + i for i in range(workers)]
+        self.drain_timeout = drain_timeout
+        self.prestart = prestart
+        self.context = multiprocessing.get_context("forkserver")
+        self.context.set_forkserver_preload(PRELOAD)
+        self.processes = {}
+        self.starting = {}
+        self.connections = set()
+        self.server = None
+        self.draining = False
+
+    def spawn(self, port):
+        process = self.context.Process(target=run_worker, args=(port,), name=f"worker-{port}")
+        process.start()
+        return process
+
+    async def worker(self, port):
+        """Start the worker for port unless it is running; returns once it has been forked."""
+        if port not in self.processes:
+            if port not in self.starting:
+                self.starting[port] = asyncio.ensure_future(self.start(port))
+            await asyncio.shield(self.starting[port])
+
+    async def start(self, port):
+        try:
+            # the first start waits for the fork server's imports, so not on the event loop
+            self.processes[port] = await asyncio.to_thread(self.spawn, port)
+        finally:
+            del self.starting[port]
+
+    def pick(self, key):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+        return self.ports[int.from_bytes(digest, "big") % len(self.ports)]
+
+    async def open_upstream(self, port, timeout=30.0):
+        # a worker that is (re)starting gets some time to start listening
+        deadline = asyncio.get_running_loop().time() + timeout
+        while True:
+            try:
+                return await asyncio.open_connection("127.0.0.1", port)
+            except OSError:
+                if asyncio.get_running_loop().time() > deadline:
+                    raise
+                await asyncio.sleep(0.1)
+
+    async def handle(self, reader, writer):
+        self.connections.add(writer)
+        upstream_writer = None
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 30)
+            port = self.pick(client_key(head, writer.get_extra_info("peername")))
+            await self.worker(port)
+            upstream_reader, upstream_writer = await self.open_upstream(port)
+            upstream_writer.write(head)
+            pipes = [asyncio.create_task(self.pipe(reader, upstream_writer)),
+                     asyncio.create_task(self.pipe(upstream_reader, writer))]
+            try:
+                # a websocket or keep-alive connection ends when either side closes
+                await asyncio.wait(pipes, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for pipe in pipes:
+                    pipe.cancel()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError,
+                OSError):
+            pass
+        finally:
+            for w in (writer, upstream_writer):
+                if w is not None:
+                    w.close()
+            self.connections.discard(writer)
+
+    async def pipe(self, reader, writer):
+        try:
+            while data := await reader.read(65536):
+                writer.write(data)
+                await writer.drain()
+        except OSError:
+            pass
+
+    async def supervise(self):
+        while True:
+            await asyncio.sleep(1)
+            if self.draining:
+                return
+            for port, process in list(self.processes.items()):
+                if process.exitcode is not None:
+                    # started again by the next connection pinned to it
+                    logger.warning("worker port=%d exited with %s", port, process.exitcode)
+                    del self.processes[port]
+
+    async def drain(self):
+        """Stop accepting, give open sessions drain_timeout seconds, then stop the workers."""
+        if self.draining:
+            return
+        self.draining = True
+        logger.info("draining: %d open connections", len(self.connections))
+        self.server.close()
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.drain_timeout
+        while self.connections and loop.time() < deadline:
+            await asyncio.sleep(0.2)
+        for writer in list(self.connections):
+            writer.close()
+
+        # SIGTERM rather than SIGINT: a balancer started in the background may have
+        # SIGINT ignored, and workers inherit that; uvicorn shuts down cleanly on either
+        for process in self.processes.values():
+            process.terminate()
+        for port, process in self.processes.items():
+            await asyncio.to_thread(process.join, 5)
+            if process.exitcode is None:
+                logger.warning("worker port=%d did not stop, killing it", port)
+                process.kill()
+
+    async def serve(self, host, port):
+        # listen before any worker exists: early connections wait in handle(), not refused
+        self.server = await asyncio.start_server(self.handle, host, port, limit=HEAD_LIMIT)
+        for worker_port in self.ports[:self.prestart]:
+            asyncio.ensure_future(self.worker(worker_port))
+        loop = asyncio.get_running_loop()
+        stopped = asyncio.Event()
+
+        async def stop():
+            await self.drain()
+            stopped.set()
+
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, lambda: asyncio.ensure_future(stop()))
+
+        logger.info("listening on %s:%d with up to %d workers", host, port, len(self.ports))
+        supervisor = asyncio.create_task(self.supervise())
+        await stopped.wait()
+        supervisor.cancel()
+        logger.info("stopped")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the calculator from several worker processes")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("FLET_SERVER_PORT", "8080")))
+    parser.add_argument("--workers", type=int,
+                        default=int(os.environ.get("WORKERS", "0")) or os.cpu_count())
+    parser.add_argument("--base-port", type=int, default=8100,
+                        help="workers listen on 127.0.0.1 from this port up")
+    parser.add_argument("--drain-timeout", type=float,
+                        default=float(os.environ.get("DRAIN_TIMEOUT", "25")),
+                        help="seconds open sessions get after SIGINT before the workers stop")
+    parser.add_argument("--prestart", type=int, default=int(os.environ.get("PRESTART", "1")),
+                        help="workers started right away; the rest start on their first connection")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=os.environ.get("CALC_LOG_LEVEL", "INFO"),
+                        format="%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    asyncio.run(Balancer(args.workers, args.base_port, args.drain_timeout, args.prestart)
+                .serve(args.host, args.port))
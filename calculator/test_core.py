@@ -0,0 +1,35 @@
+import math
+
+from core import CalculatorCore, evaluate_many
+
+
+def press(*keys):
+    return CalculatorCore().press_many(keys)
+
+
+def test_function_key_applies_to_operand():
+    assert press("3", "0", "sin", "=") == ("sin(30) =", CalculatorCore().format_number(math.sin(30)))
+
+
+def test_function_key_applies_to_result():
+    assert press("3", "0", "=", "sin", "=") == ("sin(30) =", CalculatorCore().format_number(math.sin(30)))
+
+
+def test_function_key_after_group():
+    assert press("(", "1", "+", "2", ")", "cos", "=")[0] == "cos(1+2) ="
+
+
+def test_equals_ignores_trailing_operator():
+    assert press("2", "+", "=") == ("2 =", "2")
+    assert press("2", "+", "3", "*", "=") == ("2+3 =", "5")
+
+
+def test_overflowing_literal_is_an_error():
+    assert press(*["9"] * 400, "=")[1] == "Error"
+    assert evaluate_many(["1e999", "2"]) == ["Error", "2"]
+
+
+def test_live_result_is_cleared_when_it_errors():
+    assert press("4", "=", "/", "0") == ("4/0", "")
+    assert press("4", "=", "/", "0", "=")[1] == "Error"
+    assert press("4", "=", "/", "0", "⌫") == ("4/", "4")
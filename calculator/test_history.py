@@ -0,0 +1,16 @@
+from history import HistoryStore
+
+
+def test_search_is_limited_to_the_user(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    try:
+        # "abc" is the first token of "abc-123"; "" has no tokens at all
+        store.add("abc", "1+2", "3")
+        store.add("abc-123", "1+5", "6")
+        store.add("", "1+7", "8")
+
+        assert [entry.expression for entry in store.search("abc", "1")] == ["1+2"]
+        assert [entry.expression for entry in store.search("abc-123", "1")] == ["1+5"]
+        assert [entry.expression for entry in store.search("", "1")] == ["1+7"]
+    finally:
+        store.close()
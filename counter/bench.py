@@ -0,0 +1,171 @@
+import os
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from rooms import FRAME, CounterStore, Rooms
+
+
+def harness(workers):
+    """
+    Flet pages in one process, like the sessions of one server: a running event loop,
+    one thread pool for handlers and one pubsub hub. The connections only count the
+    messages they would send to the browsers.
+    """
+    from flet.core.local_connection import LocalConnection
+    from flet.core.page import Page
+    from flet.core.protocol import PageCommandResponsePayload, PageCommandsBatchResponsePayload
+    from flet.core.pubsub.pubsub_hub import PubSubHub
+
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="bench-loop", daemon=True).start()
+    executor = ThreadPoolExecutor(workers)
+    hub = PubSubHub(loop, executor)
+
+    class CountingConnection(LocalConnection):
+        def __init__(self):
+            super().__init__()
+            self.pubsubhub = hub
+            self.messages = 0
+
+        def send_command(self, session_id, command):
+            result, message = self._process_command(command)
+            self.messages += bool(message)
+            return PageCommandResponsePayload(result=result, error="")
+
+        def send_commands(self, session_id, commands):
+            results, sent = [], False
+            for command in commands:
+                result, message = self._process_command(command)
+                if command.name in ("add", "get"):
+                    results.append(result)
+                sent = sent or bool(message)
+            self.messages += sent
+            return PageCommandsBatchResponsePayload(results=results, error="")
+
+    def new_page(session_id, route):
+        connection = CountingConnection()
+        page = Page(connection, session_id, loop=loop, executor=executor)
+        page.route = route
+        return connection, page
+
+    new_page.hub = hub
+    new_page.executor = executor
+    return new_page
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+def bench_room(clients, clicks, rate, threads, frame, workers):
+    """
+    Increments/sec, broadcasts and broadcast latency with every client clicking at once,
+    `rate` clicks per second each (0: as fast as the threads go).
+    """
+    import main
+
+    new_page = harness(workers)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = CounterStore(os.path.join(tmp, "counter.db"))
+        rooms = Rooms(store, frame)
+        main.rooms = lambda: rooms
+
+        sessions = []
+        for i in range(clients):
+            connection, page = new_page(f"session-{i}", "/bench")
+            main.main(page)
+            minus, txt_number, plus = page.controls[0].controls
+            sessions.append((connection, txt_number, plus, minus))
+        room = rooms.get("bench")
+
+        # one more subscriber, to time each broadcast from its oldest increment
+        latencies = []
+        delivered = threading.Event()
+        increments = clicks // threads * threads
+        expected = room.value + increments
+
+        def probe(topic, message):
+            value, seq, since = message
+            latencies.append(time.monotonic() - since)
+            if value == expected:
+                delivered.set()
+
+        new_page.hub.subscribe_topic("probe", room.topic, probe)
+        sent_before = [connection.messages for connection, *_ in sessions]
+
+        # each thread clicks for a random client, at its share of the overall rate
+        interval = threads / (clients * rate) if rate else 0.0
+
+        def click(seed):
+            rng = random.Random(seed)
+            for i in range(increments // threads):
+                if interval:
+                    time.sleep(max(0.0, start + i * interval - time.perf_counter()))
+                _, _, plus, _ = sessions[rng.randrange(clients)]
+                plus.on_click(None)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            list(pool.map(click, range(threads)))
+        clicked = time.perf_counter() - start
+        delivered.wait(30)
+
+        # every session ends on the final value, once its handlers have run
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if all(txt_number.value == str(expected) for _, txt_number, _, _ in sessions):
+                break
+            time.sleep(0.01)
+        settled = time.perf_counter() - start
+        correct = sum(txt_number.value == str(expected) for _, txt_number, _, _ in sessions)
+        messages = sum(connection.messages for connection, *_ in sessions) - sum(sent_before)
+
+        written = store.flush()
+        store.close()
+        persisted = CounterStore(store.path)
+        stored = persisted.load("bench")
+        persisted.close()
+    new_page.executor.shutdown(wait=False)
+
+    return {
+        "frame_ms": frame * 1000,
+        "increments": increments,
+        "increments_per_sec": increments / clicked,
+        "settled_ms": settled * 1000,
+        "broadcasts": room.seq,
+        "messages_per_client": messages / clients,
+        "latency_p50_ms": percentile(latencies, 0.5) * 1000,
+        "latency_p95_ms": percentile(latencies, 0.95) * 1000,
+        "latency_max_ms": max(latencies, default=0.0) * 1000,
+        "clients_correct": correct,
+        "persisted": stored == expected,
+        "rooms_written": written,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shared counter benchmark")
+    parser.add_argument("--clients", type=int, default=300, help="sessions in the room")
+    parser.add_argument("--clicks", type=int, default=20_000, help="increments, all clients together")
+    parser.add_argument("--rate", type=float, default=10, help="clicks/sec per client; 0 for a burst")
+    parser.add_argument("--threads", type=int, default=16, help="clicks handled at the same time")
+    parser.add_argument("--workers", type=int, default=32, help="Flet handler thread pool size")
+    parser.add_argument("--frame", type=float, nargs="+", default=[0, FRAME * 1000],
+                        help="ms between broadcasts; 0 broadcasts every increment")
+    args = parser.parse_args()
+
+    for frame in args.frame:
+        result = bench_room(args.clients, args.clicks, args.rate, args.threads, frame / 1000, args.workers)
+        print(f"frame {result['frame_ms']:5.1f} ms: {result['increments_per_sec']:9.0f} increments/sec "
+              f"{result['broadcasts']:6d} broadcasts {result['messages_per_client']:7.1f} msgs/client "
+              f"settled {result['settled_ms']:8.0f} ms")
+        print(f"{'':17}latency p50 {result['latency_p50_ms']:7.1f} ms p95 {result['latency_p95_ms']:7.1f} ms "
+              f"max {result['latency_max_ms']:7.1f} ms, "
+              f"{result['clients_correct']}/{args.clients} clients on the final value, "
+              f"persisted {'ok' if result['persisted'] else 'WRONG'}")
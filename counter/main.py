@@ -1,18 +1,64 @@
+import atexit
+import os
+import threading
+from functools import lru_cache
+
 import flet as ft
 
+from rooms import CounterStore, Rooms
+
+
+@lru_cache(maxsize=None)
+def rooms():
+    # one counter per room for the whole process, shared by every session
+    store = CounterStore(os.environ.get("COUNTER_DB", "counter.db"))
+    atexit.register(store.close)
+    return Rooms(store)
+
+
 def main(page: ft.Page):
     page.title = "Flet counter example"
     page.vertical_alignment = ft.MainAxisAlignment.CENTER
 
     txt_number = ft.TextField(value="0", text_align=ft.TextAlign.RIGHT, width=100)
 
-    def minus_click(e):
-        txt_number.value = str(int(txt_number.value) - 1)
-        page.update()
+    # /<room> shares one counter with everyone else on that route; / counts on its own
+    room_name = page.route.strip("/")
+    if room_name:
+        room = rooms().get(room_name)
+        shown = 0  # seq of the broadcast on screen
+        shown_lock = threading.Lock()
+        txt_number.read_only = True
+
+        def room_changed(topic, message):
+            nonlocal shown
+            value, seq, _ = message
+            # broadcasts are handled on a thread pool, so an older one can come in late
+            with shown_lock:
+                if seq <= shown:
+                    return
+                shown = seq
+                txt_number.value = str(value)
+                txt_number.update()
 
-    def plus_click(e):
-        txt_number.value = str(int(txt_number.value) + 1)
-        page.update()
+        def minus_click(e):
+            room.add(-1)
+
+        def plus_click(e):
+            room.add(1)
+
+        page.pubsub.subscribe_topic(room.topic, room_changed)
+        value, shown = room.join(page.pubsub)
+        txt_number.value = str(value)
+
+    else:
+        def minus_click(e):
+            txt_number.value = str(int(txt_number.value) - 1)
+            page.update()
+
+        def plus_click(e):
+            txt_number.value = str(int(txt_number.value) + 1)
+            page.update()
 
     page.add(
         ft.Row(
@@ -25,4 +71,6 @@ def main(page: ft.Page):
         )
     )
 
-ft.app(main)
\ No newline at end of file
+
+if __name__ == "__main__":
+    ft.app(main)
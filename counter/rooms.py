@@ -0,0 +1,160 @@
+import sqlite3
+import threading
+import time
+
+# broadcasts to one room are at least this far apart; increments in between go out as one
+FRAME = 1 / 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS counters (
+    room TEXT PRIMARY KEY,
+    value INTEGER NOT NULL,
+    updated REAL NOT NULL
+);
+"""
+
+
+class CounterStore:
+    """
+    Room counters in SQLite. save() only notes the latest value of a room; a background
+    thread writes every room that changed in one transaction each flush_interval seconds.
+    """
+
+    def __init__(self, path="counter.db", flush_interval=1.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.pending = {}  # room -> latest value
+        self.cond = threading.Condition()
+        self.closed = False
+        # one connection, used by load() on session threads and by the writer
+        self.conn_lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+        self.writer = threading.Thread(target=self.write_loop, name="counter-writer", daemon=True)
+        self.writer.start()
+
+    def load(self, room):
+        with self.cond:
+            if room in self.pending:
+                return self.pending[room]
+        with self.conn_lock:
+            row = self.conn.execute("SELECT value FROM counters WHERE room = ?", (room,)).fetchone()
+        return row[0] if row else 0
+
+    def save(self, room, value):
+        with self.cond:
+            self.pending[room] = value
+
+    def write_loop(self):
+        while True:
+            with self.cond:
+                if not self.closed:
+                    self.cond.wait(self.flush_interval)
+                closed = self.closed
+            self.flush()
+            if closed:
+                return
+
+    def flush(self):
+        """Write every room saved since the last flush; returns the number of rooms written."""
+        with self.cond:
+            rooms, self.pending = self.pending, {}
+        if rooms:
+            now = time.time()
+            with self.conn_lock, self.conn:
+                self.conn.executemany(
+                    "INSERT INTO counters (room, value, updated) VALUES (?, ?, ?) "
+                    "ON CONFLICT(room) DO UPDATE SET value = excluded.value, updated = excluded.updated",
+                    [(room, value, now) for room, value in rooms.items()],
+                )
+        return len(rooms)
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        self.writer.join()
+        self.conn.close()
+
+
+class Room:
+    """
+    One counter shared by every session on the room's route. The value lives here, in the
+    process, and only changes under the lock; sessions learn about it from broadcasts on
+    the room's pubsub topic, at most one per frame, as (value, seq, since): seq orders the
+    broadcasts, since is when the oldest increment in this one happened (time.monotonic()).
+    """
+
+    def __init__(self, name, value, store, frame=FRAME):
+        self.name = name
+        self.topic = f"counter/{name}"
+        self.value = value
+        self.store = store
+        self.frame = frame
+        self.lock = threading.Lock()
+        self.pubsub = None
+        self.seq = 0
+        self.since = None
+        self.last_broadcast = 0.0
+        self.timer = None
+
+    def join(self, pubsub):
+        """A session's pubsub client, for broadcasting; returns the (value, seq) to show now."""
+        with self.lock:
+            # any client will do: they all send through the same hub
+            self.pubsub = pubsub
+            return self.value, self.seq
+
+    def add(self, delta):
+        with self.lock:
+            self.value += delta
+            if self.since is None:
+                self.since = time.monotonic()
+            self.schedule_broadcast()
+            return self.value
+
+    def schedule_broadcast(self):
+        # the first increment of a frame is sent right away, the rest of the frame once
+        if self.timer is not None:
+            return
+        wait = self.last_broadcast + self.frame - time.monotonic()
+        if wait <= 0:
+            self.broadcast_locked()
+        else:
+            self.timer = threading.Timer(wait, self.broadcast)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def broadcast(self):
+        with self.lock:
+            self.timer = None
+            self.broadcast_locked()
+
+    def broadcast_locked(self):
+        self.last_broadcast = time.monotonic()
+        self.seq += 1
+        message = (self.value, self.seq, self.since)
+        self.since = None
+        self.store.save(self.name, self.value)
+        # the hub only queues a call per subscriber on Flet's thread pool
+        self.pubsub.send_all_on_topic(self.topic, message)
+
+
+class Rooms:
+    """Every room of the process, created on first use with the value last persisted."""
+
+    def __init__(self, store, frame=FRAME):
+        self.store = store
+        self.frame = frame
+        self.rooms = {}
+        self.lock = threading.Lock()
+
+    def get(self, name):
+        with self.lock:
+            room = self.rooms.get(name)
+            if room is None:
+                room = self.rooms[name] = Room(name, self.store.load(name), self.store, self.frame)
+            return room
@@ -0,0 +1,213 @@
+import math
+import sqlite3
+import argparse
+
+# 時給ヒストグラムのビン幅（円）。ビン番号は wage_info / HIST_BIN_WIDTH
+HIST_BIN_WIDTH = 50
+
+
+def setup_aggregates(conn):
+    """
+    区ごとの集計テーブルと、jobs への INSERT / DELETE で集計を更新するトリガーを作成する。
+    新しく作った場合は既存の jobs から集計し直す。
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'district_stats'"
+    ).fetchone()
+
+    conn.executescript(f'''
+        CREATE TABLE IF NOT EXISTS district_stats (
+            district TEXT PRIMARY KEY,
+            count INTEGER NOT NULL,
+            wage_sum INTEGER NOT NULL,
+            wage_sq_sum INTEGER NOT NULL,
+            min_wage INTEGER,
+            max_wage INTEGER
+        );
+
+        CREATE TABLE IF NOT EXISTS district_wage_hist (
+            district TEXT NOT NULL,
+            bin INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (district, bin)
+        );
+
+        -- 削除時に最小・最大を引き直すためのインデックス
+        CREATE INDEX IF NOT EXISTS idx_jobs_district_wage ON jobs(district, wage_info);
+
+        CREATE TRIGGER IF NOT EXISTS jobs_aggregate_insert AFTER INSERT ON jobs
+        BEGIN
+            INSERT INTO district_stats (district, count, wage_sum, wage_sq_sum, min_wage, max_wage)
+            VALUES (NEW.district, 1, NEW.wage_info, NEW.wage_info * NEW.wage_info,
+                    NEW.wage_info, NEW.wage_info)
+            ON CONFLICT(district) DO UPDATE SET
+                count = count + 1,
+                wage_sum = wage_sum + excluded.wage_sum,
+                wage_sq_sum = wage_sq_sum + excluded.wage_sq_sum,
+                min_wage = MIN(min_wage, excluded.min_wage),
+                max_wage = MAX(max_wage, excluded.max_wage);
+
+            INSERT INTO district_wage_hist (district, bin, count)
+            VALUES (NEW.district, NEW.wage_info / {HIST_BIN_WIDTH}, 1)
+            ON CONFLICT(district, bin) DO UPDATE SET count = count + 1;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS jobs_aggregate_delete AFTER DELETE ON jobs
+        BEGIN
+            UPDATE district_stats SET
+                count = count - 1,
+                wage_sum = wage_sum - OLD.wage_info,
+                wage_sq_sum = wage_sq_sum - OLD.wage_info * OLD.wage_info,
+                min_wage = (SELECT MIN(wage_info) FROM jobs WHERE district = OLD.district),
+                max_wage = (SELECT MAX(wage_info) FROM jobs WHERE district = OLD.district)
+            WHERE district = OLD.district;
+            DELETE FROM district_stats WHERE district = OLD.district AND count <= 0;
+
+            UPDATE district_wage_hist SET count = count - 1
+            WHERE district = OLD.district AND bin = OLD.wage_info / {HIST_BIN_WIDTH};
+            DELETE FROM district_wage_hist
+            WHERE district = OLD.district AND bin = OLD.wage_info / {HIST_BIN_WIDTH} AND count <= 0;
+        END;
+    ''')
+
+    if not exists:
+        reconcile(conn)
+
+
+def reconcile(conn):
+    """集計テーブルを jobs から作り直す（トリガーを入れる前のデータやずれの修正用）"""
+    with conn:
+        conn.execute('DELETE FROM district_stats')
+        conn.execute('DELETE FROM district_wage_hist')
+        conn.execute('''
+            INSERT INTO district_stats (district, count, wage_sum, wage_sq_sum, min_wage, max_wage)
+            SELECT district, COUNT(*), SUM(wage_info), SUM(wage_info * wage_info),
+                   MIN(wage_info), MAX(wage_info)
+            FROM jobs
+            GROUP BY district
+        ''')
+        conn.execute(f'''
+            INSERT INTO district_wage_hist (district, bin, count)
+            SELECT district, wage_info / {HIST_BIN_WIDTH}, COUNT(*)
+            FROM jobs
+            GROUP BY district, wage_info / {HIST_BIN_WIDTH}
+        ''')
+
+
+class WageStats:
+    """
+    1つの区（または複数の区をまとめたもの）の時給の集計値。
+    件数・合計・二乗和・最小・最大とヒストグラムだけを持ち、足し合わせることができる。
+    """
+
+    def __init__(self, count=0, wage_sum=0, wage_sq_sum=0, min_wage=None, max_wage=None,
+                 hist=None):
+        self.count = count
+        self.wage_sum = wage_sum
+        self.wage_sq_sum = wage_sq_sum
+        self.min_wage = min_wage
+        self.max_wage = max_wage
+        self.hist = hist or {}
+
+    def merge(self, other):
+        hist = dict(self.hist)
+        for bin, count in other.hist.items():
+            hist[bin] = hist.get(bin, 0) + count
+        mins = [w for w in (self.min_wage, other.min_wage) if w is not None]
+        maxs = [w for w in (self.max_wage, other.max_wage) if w is not None]
+        return WageStats(
+            self.count + other.count,
+            self.wage_sum + other.wage_sum,
+            self.wage_sq_sum + other.wage_sq_sum,
+            min(mins) if mins else None,
+            max(maxs) if maxs else None,
+            hist,
+        )
+
+    @property
+    def mean(self):
+        return self.wage_sum / self.count if self.count else None
+
+    @property
+    def std(self):
+        if self.count < 2:
+            return 0.0
+        variance = (self.wage_sq_sum - self.wage_sum ** 2 / self.count) / (self.count - 1)
+        return math.sqrt(max(variance, 0.0))
+
+    def quantile(self, q):
+        """ヒストグラムから分位点を近似する（ビン内は一様分布とみなして線形補間）"""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for bin in sorted(self.hist):
+            count = self.hist[bin]
+            if seen + count >= target:
+                low = max(bin * HIST_BIN_WIDTH, self.min_wage)
+                high = min((bin + 1) * HIST_BIN_WIDTH, self.max_wage)
+                return low + (high - low) * (target - seen) / count
+            seen += count
+        return self.max_wage
+
+    def boxplot_stats(self, label):
+        """matplotlib の Axes.bxp にそのまま渡せる箱ひげ図の値"""
+        q1, med, q3 = self.quantile(0.25), self.quantile(0.5), self.quantile(0.75)
+        iqr = q3 - q1
+        return {
+            "label": label,
+            "q1": q1,
+            "med": med,
+            "q3": q3,
+            "mean": self.mean,
+            "whislo": max(self.min_wage, q1 - 1.5 * iqr),
+            "whishi": min(self.max_wage, q3 + 1.5 * iqr),
+            "fliers": [],
+        }
+
+
+def load_stats(conn):
+    """
+    {区名: WageStats} を集計テーブルから読む（jobs は読まない）。
+    集計テーブルがまだないDB（取り込みを通していないDB）では、何も書き込まずに jobs から集計する。
+    """
+    if conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'district_stats'"
+    ).fetchone():
+        stats_query = 'SELECT district, count, wage_sum, wage_sq_sum, min_wage, max_wage FROM district_stats'
+        hist_query = 'SELECT district, bin, count FROM district_wage_hist'
+    else:
+        stats_query = '''
+            SELECT district, COUNT(*), SUM(wage_info), SUM(wage_info * wage_info),
+                   MIN(wage_info), MAX(wage_info)
+            FROM jobs
+            GROUP BY district
+        '''
+        hist_query = f'''
+            SELECT district, wage_info / {HIST_BIN_WIDTH}, COUNT(*)
+            FROM jobs
+            GROUP BY district, wage_info / {HIST_BIN_WIDTH}
+        '''
+
+    stats = {}
+    for district, count, wage_sum, wage_sq_sum, min_wage, max_wage in conn.execute(stats_query):
+        stats[district] = WageStats(count, wage_sum, wage_sq_sum, min_wage, max_wage)
+    for district, bin, count in conn.execute(hist_query):
+        if district in stats:
+            stats[district].hist[bin] = count
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="区ごとの時給集計テーブルの管理")
+    parser.add_argument("command", choices=["reconcile"])
+    parser.add_argument("databases", nargs="+", help="対象のDBファイル（例: minato.db adachi.db）")
+    args = parser.parse_args()
+
+    for path in args.databases:
+        conn = sqlite3.connect(path)
+        setup_aggregates(conn)
+        reconcile(conn)
+        for district, stats in load_stats(conn).items():
+            print(f"{path}: {district} {stats.count}件 平均{stats.mean:.1f}円")
+        conn.close()
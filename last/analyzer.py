@@ -0,0 +1,285 @@
+import json
+import sqlite3
+import argparse
+from pathlib import Path
+
+from aggregates import WageStats, load_stats
+from rollups import load_rollups
+from sketch import KLLSketch, merged_sketch
+
+# pandas / numpy / matplotlib / seaborn はグラフや時系列を扱うメソッドの中でだけ読み込む。
+# summary / compare は標準ライブラリだけで集計テーブルから答えるので、cron からでもすぐ終わる。
+
+# 区名と、その区の求人が入っているDB
+# （minato.db の district 列は「足立区」になっているので、区名はDBファイルで決める）
+DISTRICT_DBS = {
+    '足立区': 'adachi.db',
+    '港区': 'minato.db',
+}
+
+
+def _connect_readonly(path):
+    """
+    集計を読むだけなので読み取り専用で開く（テーブルやトリガーは取り込み側で作る）。
+    ファイルがなければ空のDBを作らずにエラーにする。
+    """
+    return sqlite3.connect(f"{Path(path).absolute().as_uri()}?mode=ro", uri=True)
+
+
+class WageAnalyzer:
+    def __init__(self, district_dbs=DISTRICT_DBS, parquet_dir=None):
+        """parquet_dir を渡すと、SQLite ではなく columnar.py で書き出した Parquet を DuckDB で集計する"""
+        self.district_dbs = district_dbs
+        self.parquet = None
+        if parquet_dir:
+            from columnar import ParquetJobs
+            self.parquet = ParquetJobs(parquet_dir)
+        self.load_data()
+
+    def load_data(self):
+        """
+        各DBの集計テーブル（district_stats / district_wage_hist）を読み込む。
+        jobs の全件は読まないので、求人が何件溜まっても区の数に比例した時間で済む
+        （集計テーブルのないDBだけは jobs から集計する）。
+        """
+        if self.parquet:
+            self.stats = self.parquet.stats()
+            return
+
+        self.stats = {}
+        for district, path in self.district_dbs.items():
+            conn = _connect_readonly(path)
+            try:
+                merged = WageStats()
+                for stats in load_stats(conn).values():
+                    merged = merged.merge(stats)
+                self.stats[district] = merged
+            finally:
+                conn.close()
+
+    def summary(self):
+        """区ごとの基本統計量（辞書のリスト）"""
+        return [
+            {
+                'district': district,
+                'count': stats.count,
+                'avg_wage': stats.mean,
+                'min_wage': stats.min_wage,
+                'max_wage': stats.max_wage,
+            }
+            for district, stats in self.stats.items()
+        ]
+
+    def compare(self, district='港区', baseline='足立区'):
+        """2つの区の平均時給の差"""
+        return self.stats[district].mean - self.stats[baseline].mean
+
+    def print_summary(self):
+        """統計情報の出力"""
+        print("\n=== 詳細な統計情報 ===")
+        for row in self.summary():
+            print(f"\n{row['district']}:")
+            print(f"- 求人数: {row['count']}件")
+            print(f"- 平均時給: {row['avg_wage']:.1f}円")
+            print(f"- 最低時給: {row['min_wage']}円")
+            print(f"- 最高時給: {row['max_wage']}円")
+
+    def print_comparison(self):
+        """時給差の計算と仮説検証"""
+        wage_diff = self.compare('港区', '足立区')
+        print(f"\n港区と足立区の平均時給差: {wage_diff:.1f}円")
+
+        # 仮説の検証結果
+        print("\n=== 仮説の検証 ===")
+        if wage_diff > 0:
+            print("仮説が支持されました：港区の平均時給が足立区より高いことが確認されました。")
+        else:
+            print("仮説は支持されませんでした：予想に反する結果となりました。")
+
+    def percentiles(self, qs=(0.5, 0.9, 0.99), start_day=None, end_day=None):
+        """
+        区ごと（と全区の合計）の時給の分位点。
+        各DBの分位点スケッチを足し合わせるだけなので、求人の行は読まない。
+        Parquet バックエンドでは区ごとの正確な値を返す。
+        """
+        if self.parquet:
+            return self.parquet.percentiles(qs, start_day, end_day).to_dict('records')
+
+        rows = []
+        total = KLLSketch()
+        for district, path in self.district_dbs.items():
+            conn = _connect_readonly(path)
+            try:
+                sketch = merged_sketch(conn, start_day=start_day, end_day=end_day)
+            finally:
+                conn.close()
+            total.merge(sketch)
+            rows.append({'district': district, 'count': sketch.n,
+                         **{f'p{round(q * 100)}': v for q, v in zip(qs, sketch.quantiles(qs))}})
+        rows.append({'district': '合計', 'count': total.n,
+                     **{f'p{round(q * 100)}': v for q, v in zip(qs, total.quantiles(qs))}})
+        return rows
+
+    def trend(self, grain='month', start=None, end=None):
+        """
+        区ごとの時給の時系列（grain は 'day' / 'week' / 'month'）。
+        各DBの wage_rollups を読むだけなので、期間数×区の数の行しか扱わない。
+        """
+        import numpy as np
+        import pandas as pd
+
+        columns = ['bucket', 'district', 'count', 'wage_sum', 'wage_sq_sum', 'min_wage', 'max_wage']
+        frames = []
+        if self.parquet:
+            frames.append(pd.DataFrame(self.parquet.rollups(grain, start, end), columns=columns))
+        for district, path in ({} if self.parquet else self.district_dbs).items():
+            conn = _connect_readonly(path)
+            try:
+                rows = load_rollups(conn, grain, start, end)
+            finally:
+                conn.close()
+            df = pd.DataFrame(rows, columns=columns)
+            df['district'] = district
+            frames.append(df)
+
+        combined = pd.concat(frames).groupby(['district', 'bucket'], as_index=False).agg(
+            count=('count', 'sum'), wage_sum=('wage_sum', 'sum'),
+            wage_sq_sum=('wage_sq_sum', 'sum'), min_wage=('min_wage', 'min'),
+            max_wage=('max_wage', 'max'),
+        )
+        combined['bucket'] = pd.to_datetime(combined['bucket'])
+        combined['avg_wage'] = combined['wage_sum'] / combined['count']
+        variance = (combined['wage_sq_sum'] - combined['wage_sum'] ** 2 / combined['count']) \
+            / (combined['count'] - 1).clip(lower=1)
+        combined['std_wage'] = np.sqrt(variance.clip(lower=0))
+        return combined
+
+    def trend_summary(self, grain='month', start=None, end=None):
+        """
+        区ごとの時系列の傾き（1期間あたりの円）と変化点。
+        全区の系列を (期間 × 区) の行列にして、まとめて numpy で計算する。
+        """
+        import numpy as np
+        import pandas as pd
+
+        series = self.trend(grain, start, end).pivot(
+            index='bucket', columns='district', values='avg_wage'
+        ).sort_index()
+        values = series.to_numpy()
+        n = len(series)
+
+        # 欠けている期間を除いた最小二乗の傾き
+        mask = ~np.isnan(values)
+        t = np.arange(n, dtype=float)[:, None] * mask
+        y = np.where(mask, values, 0.0)
+        count = mask.sum(axis=0)
+        t_mean = t.sum(axis=0) / np.maximum(count, 1)
+        y_mean = y.sum(axis=0) / np.maximum(count, 1)
+        cov = ((t - t_mean) * (y - y_mean) * mask).sum(axis=0)
+        var = (((t - t_mean) ** 2) * mask).sum(axis=0)
+        slope = np.divide(cov, var, out=np.full(values.shape[1], np.nan), where=var > 0)
+
+        # 変化点: 平均の異なる2区間に分けたとき二乗誤差が最小になる位置
+        filled = series.ffill().bfill().to_numpy()
+        change_at = [None] * values.shape[1]
+        before = after = np.full(values.shape[1], np.nan)
+        if n >= 2:
+            cumsum = np.cumsum(filled, axis=0)
+            total = cumsum[-1]
+            k = np.arange(1, n)[:, None]
+            left = cumsum[:-1]
+            gain = left ** 2 / k + (total - left) ** 2 / (n - k)
+            split = gain.argmax(axis=0) + 1
+            cols = np.arange(values.shape[1])
+            before = cumsum[split - 1, cols] / split
+            after = (total - cumsum[split - 1, cols]) / (n - split)
+            # 実データが2期間未満の区では変化点を出さない
+            change_at = [series.index[s] if c >= 2 else None for s, c in zip(split, count)]
+
+        return pd.DataFrame({
+            'district': series.columns,
+            'periods': count,
+            'slope_per_period': slope,
+            'change_at': change_at,
+            'avg_before': before,
+            'avg_after': after,
+        })
+
+    def report(self, output=None):
+        """
+        箱ひげ図と平均時給の棒グラフを描く。
+        output を指定するとウィンドウを出さずに画像として保存する。
+        """
+        import matplotlib
+        if output:
+            matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+        import pandas as pd
+        import seaborn as sns
+
+        stats = pd.DataFrame(self.summary())
+
+        # 可視化
+        plt.rcParams['font.family'] = 'Arial Unicode MS'
+        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 6))
+
+        # 箱ひげ図（ヒストグラムから近似した四分位数で描く）
+        ax1.bxp([s.boxplot_stats(district) for district, s in self.stats.items()],
+                showfliers=False)
+        ax1.set_title('時給の分布比較')
+        ax1.set_ylabel('時給（円）')
+
+        # 平均時給の棒グラフ
+        sns.barplot(data=stats, x='district', y='avg_wage', ax=ax2)
+        ax2.set_title('平均時給の比較')
+        ax2.set_ylabel('時給（円）')
+
+        for i, v in enumerate(stats['avg_wage']):
+            ax2.text(i, v, f'{v:.0f}円', ha='center', va='bottom')
+
+        plt.tight_layout()
+        if output:
+            fig.savefig(output)
+            plt.close(fig)
+        else:
+            plt.show()
+
+    def analyze_wages(self):
+        """賃金分析の実行（グラフ・統計情報・仮説の検証）"""
+        self.report()
+        self.print_summary()
+        self.print_comparison()
+
+
+def _parse_db(value):
+    district, _, path = value.partition('=')
+    if not path:
+        raise argparse.ArgumentTypeError("区名=DBファイル の形式で指定してください")
+    return district, path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="区ごとの時給の分析")
+    parser.add_argument("command", nargs="?", default="report",
+                        choices=["summary", "compare", "report"],
+                        help="summary: 統計量 / compare: 仮説の検証 / report: グラフ付きの分析")
+    parser.add_argument("--db", type=_parse_db, action="append",
+                        help="区名=DBファイル（複数指定可、省略時は足立区と港区）")
+    parser.add_argument("--parquet-dir", help="columnar.py で書き出した Parquet を DuckDB で集計する")
+    parser.add_argument("--json", action="store_true", help="summary を JSON で出力する")
+    parser.add_argument("--output", help="report のグラフを保存する画像ファイル名")
+    args = parser.parse_args()
+
+    analyzer = WageAnalyzer(dict(args.db) if args.db else DISTRICT_DBS, args.parquet_dir)
+
+    if args.command == "summary":
+        if args.json:
+            print(json.dumps(analyzer.summary(), ensure_ascii=False))
+        else:
+            analyzer.print_summary()
+    elif args.command == "compare":
+        analyzer.print_comparison()
+    else:
+        analyzer.report(args.output)
+        analyzer.print_summary()
+        analyzer.print_comparison()
@@ -0,0 +1,181 @@
+import os
+import gzip
+import mmap
+import struct
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# レコードヘッダ: マジック, 圧縮方式, URL長, 本文長
+RECORD_HEADER = struct.Struct('<2sBHI')
+RECORD_MAGIC = b'PA'
+# インデックス1件: セグメント内オフセット, レコード全体の長さ
+INDEX_ENTRY = struct.Struct('<QI')
+
+CODEC_GZIP = 1
+CODEC_ZSTD = 2
+
+
+def _compress(codec, data, level):
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdCompressor(level=level or 9).compress(data)
+    return gzip.compress(data, compresslevel=level or 6, mtime=0)
+
+
+def _decompress(codec, data):
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("zstd圧縮のレコードを読むには zstandard が必要です")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+class PageArchive:
+    """
+    クロールしたHTMLを圧縮して保存する追記専用アーカイブ。
+
+    pages.seg に圧縮レコードを追記し、pages.idx に固定長のオフセットを書く。
+    読み込み時は両ファイルを mmap し、任意のページに O(1) でアクセスできる。
+    """
+
+    def __init__(self, directory, mode='a', codec=None, level=None):
+        self.directory = directory
+        self.mode = mode
+        self.segment_path = os.path.join(directory, 'pages.seg')
+        self.index_path = os.path.join(directory, 'pages.idx')
+        self.codec = codec or (CODEC_ZSTD if zstandard is not None else CODEC_GZIP)
+        self.level = level
+
+        self._segment_map = None
+        self._index_map = None
+
+        if mode == 'a':
+            os.makedirs(directory, exist_ok=True)
+            open(self.segment_path, 'ab').close()
+            self._index = open(self.index_path, 'ab')
+            self._recover()
+            # 切り詰めた後に開くことで tell() が正しいオフセットを返す
+            self._segment = open(self.segment_path, 'ab')
+        else:
+            self._segment = open(self.segment_path, 'rb')
+            self._index = open(self.index_path, 'rb')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self._unmap()
+        self._segment.close()
+        self._index.close()
+
+    def _unmap(self):
+        if self._segment_map is not None:
+            self._segment_map.close()
+            self._segment_map = None
+        if self._index_map is not None:
+            self._index_map.close()
+            self._index_map = None
+
+    def _maps(self):
+        """セグメントとインデックスを mmap する（追記後は張り直す）"""
+        if self._index_map is None:
+            if os.path.getsize(self.index_path) == 0:
+                return None, None
+            with open(self.segment_path, 'rb') as f:
+                self._segment_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            with open(self.index_path, 'rb') as f:
+                self._index_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._segment_map, self._index_map
+
+    def _recover(self):
+        """
+        レコードを書いた直後に落ちた場合、インデックスが追いついていないことがある。
+        インデックス末尾以降のセグメントを走査して、完全なレコードだけ索引に追加し、
+        途中で切れたレコードは切り捨てる。
+        """
+        index_size = os.path.getsize(self.index_path)
+        if index_size % INDEX_ENTRY.size:
+            with open(self.index_path, 'r+b') as f:
+                f.truncate(index_size - index_size % INDEX_ENTRY.size)
+            index_size -= index_size % INDEX_ENTRY.size
+
+        end = 0
+        if index_size:
+            with open(self.index_path, 'rb') as f:
+                f.seek(index_size - INDEX_ENTRY.size)
+                offset, length = INDEX_ENTRY.unpack(f.read(INDEX_ENTRY.size))
+                end = offset + length
+
+        segment_size = os.path.getsize(self.segment_path)
+        if segment_size == end:
+            return
+
+        with open(self.segment_path, 'rb') as f:
+            f.seek(end)
+            while end + RECORD_HEADER.size <= segment_size:
+                magic, _, url_len, body_len = RECORD_HEADER.unpack(f.read(RECORD_HEADER.size))
+                length = RECORD_HEADER.size + url_len + body_len
+                if magic != RECORD_MAGIC or end + length > segment_size:
+                    break
+                self._index.write(INDEX_ENTRY.pack(end, length))
+                f.seek(end + length)
+                end += length
+        self._index.flush()
+
+        if end < segment_size:
+            with open(self.segment_path, 'r+b') as f:
+                f.truncate(end)
+
+    def append(self, url, html):
+        """1ページ分のHTMLを圧縮して追記し、レコード番号を返す"""
+        url_bytes = url.encode('utf-8')
+        body = _compress(self.codec, html.encode('utf-8'), self.level)
+
+        offset = self._segment.tell()
+        self._segment.write(RECORD_HEADER.pack(RECORD_MAGIC, self.codec, len(url_bytes), len(body)))
+        self._segment.write(url_bytes)
+        self._segment.write(body)
+        self._segment.flush()
+
+        # セグメントを書き切ってからインデックスを書く
+        self._index.write(INDEX_ENTRY.pack(offset, RECORD_HEADER.size + len(url_bytes) + len(body)))
+        self._index.flush()
+
+        self._unmap()
+        return len(self) - 1
+
+    def __len__(self):
+        if self.mode == 'a':
+            return self._index.tell() // INDEX_ENTRY.size
+        return os.path.getsize(self.index_path) // INDEX_ENTRY.size
+
+    def _record(self, i):
+        segment, index = self._maps()
+        if index is None or not 0 <= i < len(index) // INDEX_ENTRY.size:
+            raise IndexError(i)
+        offset, _ = INDEX_ENTRY.unpack_from(index, i * INDEX_ENTRY.size)
+        magic, codec, url_len, body_len = RECORD_HEADER.unpack_from(segment, offset)
+        if magic != RECORD_MAGIC:
+            raise ValueError(f"壊れたレコードです: {i}")
+        start = offset + RECORD_HEADER.size
+        return segment, codec, start, url_len, body_len
+
+    def url(self, i):
+        segment, _, start, url_len, _ = self._record(i)
+        return segment[start:start + url_len].decode('utf-8')
+
+    def __getitem__(self, i):
+        """i番目のレコードを (URL, HTML) で返す"""
+        segment, codec, start, url_len, body_len = self._record(i)
+        url = segment[start:start + url_len].decode('utf-8')
+        body = segment[start + url_len:start + url_len + body_len]
+        return url, _decompress(codec, body).decode('utf-8')
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
@@ -0,0 +1,172 @@
+import io
+import os
+import json
+import time
+import sqlite3
+import argparse
+import tempfile
+import contextlib
+
+import requests
+
+from archive import PageArchive
+from metrics import CrawlMetrics
+from pipeline import bulk_insert_jobs, parse_pages
+from scraper import extract_jobs, scrape
+from sinks import SqliteSink
+from stub_site import StubSite, fixture_pages, sample_page
+
+
+def parse_backends():
+    """使えるパーサーの一覧（lxml は入っている場合のみ）"""
+    backends = ["html.parser"]
+    try:
+        import lxml  # noqa: F401
+        backends.append("lxml")
+    except ImportError:
+        pass
+    return backends
+
+
+def fetch_backends():
+    return {
+        "requests": lambda: None,
+        "session": requests.Session,
+    }
+
+
+def bench_reparse(pages, worker_counts, chunk_size):
+    print(f"{len(pages)}ページ, chunk_size={chunk_size}")
+    results = []
+    baseline = None
+    for workers in worker_counts:
+        start = time.perf_counter()
+        rows = parse_pages(pages, workers, chunk_size)
+        elapsed = time.perf_counter() - start
+
+        pages_per_sec = len(pages) / elapsed
+        baseline = baseline or pages_per_sec
+        print(f"workers={workers}: {pages_per_sec:8.1f} pages/sec "
+              f"(x{pages_per_sec / baseline:.2f}, {len(rows)}件)")
+        results.append({"workers": workers, "pages_per_sec": pages_per_sec, "rows": len(rows)})
+    return results
+
+
+def bench_parse(pages):
+    """パーサーごとの1プロセスでの解析スループット"""
+    results = []
+    for parser in parse_backends():
+        start = time.perf_counter()
+        rows = sum(len(extract_jobs(html_content, parser=parser)) for html_content in pages)
+        elapsed = time.perf_counter() - start
+        print(f"parse[{parser}]: {len(pages) / elapsed:8.1f} pages/sec, {rows / elapsed:9.1f} cards/sec")
+        results.append({"parser": parser, "pages_per_sec": len(pages) / elapsed,
+                        "cards_per_sec": rows / elapsed})
+    return results
+
+
+def bench_ingest(row_count, batch_rows):
+    """jobs テーブルへの挿入速度（まとめて1回 / sink のページ単位コミット）"""
+    rows = [(f"テスト店舗{i}", 1000 + i % 1000) for i in range(row_count)]
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, "bulk.db"))
+        start = time.perf_counter()
+        bulk_insert_jobs(conn, rows, '港区')
+        elapsed = time.perf_counter() - start
+        conn.close()
+        print(f"ingest[bulk]: {row_count / elapsed:10.1f} rows/sec")
+        results.append({"mode": "bulk", "rows_per_sec": row_count / elapsed})
+
+        start = time.perf_counter()
+        with SqliteSink(os.path.join(tmp, "sink.db"), '港区', "bench", batch_pages=5) as sink:
+            for page_no, offset in enumerate(range(0, row_count, batch_rows), start=1):
+                sink.write_page(page_no, rows[offset:offset + batch_rows])
+        elapsed = time.perf_counter() - start
+        print(f"ingest[sink]: {row_count / elapsed:10.1f} rows/sec ({batch_rows}行/ページ)")
+        results.append({"mode": "sink", "rows_per_sec": row_count / elapsed})
+    return results
+
+
+def bench_crawl(page_count, cards, latency, error_rate, end):
+    """
+    スタブサイトに対してクロール全体を実行し、取得方法×パーサーごとに計測する。
+    結果件数と「1600xxxx」の補正も確認する。
+    """
+    # 各ページ: 通常カード + 1600xxxx のカードが採用され、日給のカードは除外される
+    expected = page_count * (cards + 1)
+    results = []
+    for fetch_name, make_session in fetch_backends().items():
+        for parser in parse_backends():
+            site = StubSite(fixture_pages(page_count, cards, end), latency=latency,
+                            error_rate=error_rate)
+            with site, tempfile.TemporaryDirectory() as tmp:
+                db_filename = os.path.join(tmp, "crawl.db")
+                metrics = CrawlMetrics()
+                start = time.perf_counter()
+                with SqliteSink(db_filename, '港区', site.base_url) as sink, \
+                        contextlib.redirect_stdout(io.StringIO()):
+                    scrape(site.base_url, sink, page_count + 5, metrics=metrics,
+                           delay=0, session=make_session(), parser=parser)
+                elapsed = time.perf_counter() - start
+
+                conn = sqlite3.connect(db_filename)
+                count, fixed = conn.execute(
+                    "SELECT COUNT(*), SUM(wage_info = 1600) FROM jobs"
+                ).fetchone()
+                conn.close()
+
+            ok = count == expected and fixed >= page_count
+            fetch = metrics.histograms["fetch"]
+            print(f"crawl[{fetch_name}/{parser}]: {elapsed:6.2f}s, "
+                  f"{page_count / elapsed:7.1f} pages/sec, fetch平均 "
+                  f"{fetch.sum / fetch.count * 1000:.1f}ms, "
+                  f"retries={metrics.counters['retries']}, {count}件 "
+                  f"{'OK' if ok else f'NG (期待値 {expected}件)'}")
+            results.append({"fetch": fetch_name, "parser": parser, "seconds": elapsed,
+                            "rows": count, "ok": ok, "metrics": metrics.to_dict()})
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="スクレイパーのベンチマーク")
+    parser.add_argument("--json", help="結果をJSONで保存するファイル名")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    reparse = sub.add_parser("reparse", help="再解析のスループットをプロセス数ごとに計測")
+    reparse.add_argument("--archive", help="計測に使うアーカイブ（省略時は生成したページ）")
+    reparse.add_argument("--pages", type=int, default=400)
+    reparse.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    reparse.add_argument("--chunk-size", type=int, default=16)
+
+    crawl = sub.add_parser("crawl", help="スタブサイトに対するクロール全体の計測")
+    crawl.add_argument("--pages", type=int, default=30)
+    crawl.add_argument("--cards", type=int, default=30)
+    crawl.add_argument("--latency", type=float, default=0.05)
+    crawl.add_argument("--error-rate", type=float, default=0.0)
+    crawl.add_argument("--end", choices=["404", "empty"], default="404")
+
+    sub.add_parser("all", help="crawl / parse / ingest をまとめて計測")
+
+    args = parser.parse_args()
+
+    if args.command == "reparse":
+        if args.archive:
+            with PageArchive(args.archive, mode='r') as archive:
+                pages = [html_content for _, html_content in archive]
+        else:
+            pages = [sample_page(page_no) for page_no in range(1, args.pages + 1)]
+        results = bench_reparse(pages, args.workers, args.chunk_size)
+    elif args.command == "crawl":
+        results = bench_crawl(args.pages, args.cards, args.latency, args.error_rate, args.end)
+    else:
+        results = {
+            "crawl": bench_crawl(30, 30, 0.05, 0.05, "404")
+                     + bench_crawl(30, 30, 0.05, 0.0, "empty"),
+            "parse": bench_parse([sample_page(page_no) for page_no in range(1, 201)]),
+            "ingest": bench_ingest(100_000, 30),
+        }
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,145 @@
+import os
+import sqlite3
+import argparse
+
+from aggregates import HIST_BIN_WIDTH, WageStats
+from analyzer import DISTRICT_DBS
+
+# SQLite から一度に読む行数（エクスポート時のメモリ使用量の上限）
+BATCH_ROWS = 50_000
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.dataset
+        return pyarrow
+    except ImportError:
+        raise ImportError("Parquet を扱うには pyarrow が必要です（pip install pyarrow）")
+
+
+def export_jobs(out_dir, district_dbs=DISTRICT_DBS):
+    """
+    各DBの jobs を district=<区名>/ で分割した Parquet に書き出す。
+    区名は WageAnalyzer と同じくDBファイルで決める。
+    SQLite からは BATCH_ROWS 行ずつ読むので、件数が増えてもメモリは一定。
+    """
+    pa = _pyarrow()
+    schema = pa.schema([
+        ("id", pa.int64()),
+        ("company_name", pa.string()),
+        ("wage_info", pa.int32()),
+        ("created_at", pa.timestamp("s")),
+        ("district", pa.string()),
+    ])
+
+    def batches():
+        for district, path in district_dbs.items():
+            conn = sqlite3.connect(path)
+            try:
+                cursor = conn.execute('''
+                    SELECT id, company_name, wage_info, datetime(created_at) FROM jobs ORDER BY id
+                ''')
+                while True:
+                    rows = cursor.fetchmany(BATCH_ROWS)
+                    if not rows:
+                        break
+                    ids, names, wages, created = zip(*rows)
+                    yield pa.record_batch([
+                        pa.array(ids, pa.int64()),
+                        pa.array(names, pa.string()),
+                        pa.array(wages, pa.int32()),
+                        pa.array(created, pa.string()).cast(pa.timestamp("s")),
+                        pa.array([district] * len(rows), pa.string()),
+                    ], schema=schema)
+            finally:
+                conn.close()
+
+    pa.dataset.write_dataset(
+        pa.RecordBatchReader.from_batches(schema, batches()),
+        out_dir,
+        format="parquet",
+        partitioning=pa.dataset.partitioning(pa.schema([("district", pa.string())]),
+                                             flavor="hive"),
+        existing_data_behavior="delete_matching",
+    )
+
+
+class ParquetJobs:
+    """
+    export_jobs() で書き出した Parquet を DuckDB で直接集計する WageAnalyzer のバックエンド。
+    結果は Arrow のまま受け取り、pandas には ArrowDtype でコピーせずに渡す。
+    """
+
+    def __init__(self, parquet_dir):
+        try:
+            import duckdb
+        except ImportError:
+            raise ImportError("DuckDB バックエンドには duckdb が必要です（pip install duckdb）")
+
+        self.con = duckdb.connect()
+        pattern = os.path.join(parquet_dir, "**", "*.parquet").replace("'", "''")
+        self.source = f"read_parquet('{pattern}', hive_partitioning = true)"
+
+    def query(self, sql, params=None):
+        """{jobs} を Parquet に置き換えて実行し、pandas の DataFrame で返す"""
+        import pandas as pd
+        result = self.con.execute(sql.format(jobs=self.source), params or [])
+        # DuckDB 1.4 以降は to_arrow_table()、それより前は fetch_arrow_table()
+        fetch = getattr(result, 'to_arrow_table', None) or result.fetch_arrow_table
+        table = fetch()
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+    def stats(self):
+        """{区名: WageStats}（集計テーブルと同じ形）"""
+        rows = self.con.execute(f'''
+            SELECT district, COUNT(*), SUM(wage_info), SUM(wage_info::HUGEINT * wage_info),
+                   MIN(wage_info), MAX(wage_info)
+            FROM {self.source}
+            GROUP BY district
+        ''').fetchall()
+        stats = {
+            district: WageStats(count, int(wage_sum), int(wage_sq_sum), min_wage, max_wage)
+            for district, count, wage_sum, wage_sq_sum, min_wage, max_wage in rows
+        }
+        for district, bin, count in self.con.execute(f'''
+            SELECT district, wage_info // {HIST_BIN_WIDTH}, COUNT(*)
+            FROM {self.source}
+            GROUP BY 1, 2
+        ''').fetchall():
+            stats[district].hist[bin] = count
+        return stats
+
+    def percentiles(self, qs, start_day=None, end_day=None):
+        """区ごとの正確な分位点（Parquet を列単位で読むので速い）"""
+        columns = ", ".join(f"quantile_cont(wage_info, {q}) AS p{round(q * 100)}" for q in qs)
+        return self.query(f'''
+            SELECT district, COUNT(*) AS count, {columns}
+            FROM {{jobs}}
+            WHERE created_at::DATE BETWEEN ? AND ?
+            GROUP BY district
+            ORDER BY district
+        ''', [start_day or '0001-01-01', end_day or '9999-12-31'])
+
+    def rollups(self, grain='month', start=None, end=None):
+        """rollups.load_rollups() と同じ列の行を Parquet から直接集計する"""
+        # DuckDB の date_trunc('week') も月曜始まりなので rollups.GRAINS と同じ期間になる
+        unit = {'day': 'day', 'week': 'week', 'month': 'month'}[grain]
+        return self.con.execute(f'''
+            SELECT strftime(date_trunc('{unit}', created_at), '%Y-%m-%d') AS bucket, district,
+                   COUNT(*), SUM(wage_info), SUM(wage_info::HUGEINT * wage_info),
+                   MIN(wage_info), MAX(wage_info)
+            FROM {self.source}
+            WHERE created_at::DATE BETWEEN ? AND ?
+            GROUP BY 1, 2
+            ORDER BY 1
+        ''', [start or '0001-01-01', end or '9999-12-31']).fetchall()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="jobs を区ごとに分割した Parquet に書き出す")
+    parser.add_argument("out_dir", nargs="?", default="jobs_parquet")
+    args = parser.parse_args()
+
+    export_jobs(args.out_dir)
+    print(f"==== {args.out_dir} に書き出しました ====")
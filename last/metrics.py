@@ -0,0 +1,181 @@
+import json
+import time
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 秒単位のバケット境界（3秒待機の外側で測るので数秒までを細かく見る）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Prometheus と同じ累積バケット形式のヒストグラム"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield bound, total
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "max": self.max,
+            "buckets": {str(bound): total for bound, total in self.cumulative()},
+        }
+
+
+class CrawlMetrics:
+    """
+    クロール1回分の計測値。
+
+    fetch / parse / write の各段階の処理時間をヒストグラムで持ち、
+    ページ数・カード数・除外理由・ダウンロード量・リトライ回数を数える。
+    """
+
+    STAGES = ("fetch", "parse", "write")
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.histograms = {stage: Histogram() for stage in self.STAGES}
+        self.counters = Counter()
+        self.rejected = Counter()
+        self.status_codes = Counter()
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.histograms[stage].observe(elapsed)
+
+    def inc(self, name, value=1):
+        with self.lock:
+            self.counters[name] += value
+
+    def record_response(self, status_code, size):
+        with self.lock:
+            self.counters["responses"] += 1
+            self.counters["bytes_downloaded"] += size
+            self.status_codes[status_code] += 1
+
+    def record_cards(self, accepted, rejected):
+        """accepted は採用したカード数、rejected は {除外理由: 件数}"""
+        with self.lock:
+            self.counters["cards_accepted"] += accepted
+            self.counters["cards_seen"] += accepted + sum(rejected.values())
+            self.rejected.update(rejected)
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                "elapsed_seconds": time.time() - self.started_at,
+                "counters": dict(self.counters),
+                "cards_rejected": dict(self.rejected),
+                "status_codes": {str(code): n for code, n in self.status_codes.items()},
+                "histograms": {stage: h.to_dict() for stage, h in self.histograms.items()},
+            }
+
+    def to_json(self, path=None):
+        text = json.dumps(self.to_dict(), ensure_ascii=False, indent=2)
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(text)
+        return text
+
+    def to_prometheus(self):
+        """Prometheus のテキスト形式で出力する"""
+        lines = []
+        with self.lock:
+            for stage, h in self.histograms.items():
+                name = f"crawl_{stage}_seconds"
+                lines.append(f"# TYPE {name} histogram")
+                for bound, total in h.cumulative():
+                    lines.append(f'{name}_bucket{{le="{bound}"}} {total}')
+                lines.append(f'{name}_bucket{{le="+Inf"}} {h.count}')
+                lines.append(f"{name}_sum {h.sum}")
+                lines.append(f"{name}_count {h.count}")
+
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"# TYPE crawl_{name}_total counter")
+                lines.append(f"crawl_{name}_total {value}")
+
+            lines.append("# TYPE crawl_cards_rejected_total counter")
+            for reason, value in sorted(self.rejected.items()):
+                lines.append(f'crawl_cards_rejected_total{{reason="{reason}"}} {value}')
+
+            lines.append("# TYPE crawl_http_responses_total counter")
+            for code, value in sorted(self.status_codes.items()):
+                lines.append(f'crawl_http_responses_total{{code="{code}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port=9108, host="127.0.0.1"):
+        """/metrics をバックグラウンドスレッドで公開し、サーバーを返す"""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body = metrics.to_prometheus().encode('utf-8')
+                    content_type = "text/plain; version=0.0.4; charset=utf-8"
+                elif self.path == "/metrics.json":
+                    body = metrics.to_json().encode('utf-8')
+                    content_type = "application/json; charset=utf-8"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    def report(self):
+        """クロール終了時に表示するサマリー"""
+        data = self.to_dict()
+        counters = data["counters"]
+        elapsed = data["elapsed_seconds"]
+        pages = counters.get("pages", 0)
+
+        lines = ["==== クロール結果 ===="]
+        lines.append(f"- 経過時間: {elapsed:.1f}秒 ({pages / elapsed if elapsed else 0:.2f} pages/sec)")
+        lines.append(f"- ページ数: {pages} / リトライ: {counters.get('retries', 0)}回")
+        lines.append(f"- ダウンロード量: {counters.get('bytes_downloaded', 0) / 1024:.1f}KB")
+        lines.append(f"- カード: {counters.get('cards_seen', 0)}件中 "
+                     f"{counters.get('cards_accepted', 0)}件を採用")
+        for reason, value in sorted(data["cards_rejected"].items()):
+            lines.append(f"  - 除外 ({reason}): {value}件")
+        for stage, h in self.histograms.items():
+            if h.count:
+                lines.append(f"- {stage}: 平均 {h.sum / h.count * 1000:.1f}ms / "
+                             f"最大 {h.max * 1000:.1f}ms ({h.count}回)")
+        return "\n".join(lines)
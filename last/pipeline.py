@@ -0,0 +1,77 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from archive import PageArchive
+from scraper import extract_jobs
+from sinks import create_jobs_table
+from sketch import update_sketches
+
+# ワーカープロセスごとに1回だけ開いたアーカイブ
+_archive = None
+
+
+def _open_archive(archive_dir):
+    global _archive
+    _archive = PageArchive(archive_dir, mode='r')
+
+
+def _parse_chunk(pages):
+    """HTMLのまとまりを解析して (会社名, 時給) のタプルを平らなリストで返す"""
+    rows = []
+    for html_content in pages:
+        rows.extend(extract_jobs(html_content))
+    return rows
+
+
+def _parse_range(bounds):
+    """アーカイブの [start, stop) 番目のレコードを解析する"""
+    start, stop = bounds
+    rows = []
+    for i in range(start, stop):
+        rows.extend(extract_jobs(_archive[i][1]))
+    return rows
+
+
+def _chunks(count, chunk_size):
+    return [(start, min(start + chunk_size, count)) for start in range(0, count, chunk_size)]
+
+
+def parse_pages(pages, workers=None, chunk_size=16):
+    """
+    HTMLのリストを chunk_size ページずつに分けてプロセスプールで解析する。
+    1ページずつ投げるとプロセス間通信の方が重くなるので、まとめて渡す。
+    """
+    workers = workers or os.cpu_count()
+    if workers == 1:
+        return _parse_chunk(pages)
+
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        chunks = [pages[start:stop] for start, stop in _chunks(len(pages), chunk_size)]
+        for chunk_rows in pool.map(_parse_chunk, chunks):
+            rows.extend(chunk_rows)
+    return rows
+
+
+def parse_archive(archive_dir, workers=None, chunk_size=16):
+    """
+    アーカイブ全体を解析し、チャンクごとの結果を順に yield する。
+    ワーカーは自分でアーカイブを mmap するので、渡すのはレコード番号の範囲だけ。
+    """
+    with PageArchive(archive_dir, mode='r') as archive:
+        page_count = len(archive)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_open_archive,
+                             initargs=(archive_dir,)) as pool:
+        yield from pool.map(_parse_range, _chunks(page_count, chunk_size))
+
+
+def bulk_insert_jobs(conn, rows, district):
+    """解析結果を1トランザクションで jobs テーブルにまとめて挿入する"""
+    create_jobs_table(conn)
+    with conn:
+        conn.executemany(
+            'INSERT INTO jobs (company_name, wage_info, district) VALUES (?, ?, ?)',
+            ((company_name, wage_info, district) for company_name, wage_info in rows)
+        )
+        update_sketches(conn, district, (wage_info for _, wage_info in rows))
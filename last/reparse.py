@@ -0,0 +1,56 @@
+import csv
+import sqlite3
+import argparse
+
+from pipeline import bulk_insert_jobs, parse_archive
+from rollups import refresh_rollups
+
+
+def reparse_archive(archive_dir, csv_filename=None, db_filename=None, district=None,
+                    workers=None, chunk_size=16):
+    """
+    保存済みのHTMLアーカイブを再クロールせずに解析し直す。
+    CSVに書き出すか、DBの jobs テーブルにまとめて挿入する。
+    """
+    conn = sqlite3.connect(db_filename) if db_filename else None
+    f = open(csv_filename, 'w', newline='', encoding='utf-8') if csv_filename else None
+
+    total = 0
+    try:
+        if f:
+            writer = csv.writer(f)
+            writer.writerow(["company_name", "wage_info"])
+
+        for rows in parse_archive(archive_dir, workers, chunk_size):
+            if f:
+                writer.writerows(rows)
+            if conn:
+                bulk_insert_jobs(conn, rows, district)
+            total += len(rows)
+    finally:
+        if f:
+            f.close()
+        if conn:
+            if total:
+                refresh_rollups(conn)
+            conn.close()
+
+    print(f"{total}件を抽出しました")
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="保存済みHTMLアーカイブの再解析")
+    parser.add_argument("archive_dir")
+    parser.add_argument("--csv", help="出力するCSVファイル名")
+    parser.add_argument("--db", help="結果を挿入するDBファイル名（例: minato.db）")
+    parser.add_argument("--district", default='港区', help="DBに記録する区名")
+    parser.add_argument("--workers", type=int, help="プロセス数（省略時はCPU数）")
+    parser.add_argument("--chunk-size", type=int, default=16, help="1回にワーカーへ渡すページ数")
+    args = parser.parse_args()
+
+    if not args.csv and not args.db:
+        args.csv = "wage_info.csv"
+
+    reparse_archive(args.archive_dir, args.csv, args.db, args.district,
+                    args.workers, args.chunk_size)
@@ -0,0 +1,124 @@
+import sqlite3
+import argparse
+
+# 粒度ごとの created_at → 期間の先頭日 の式（週は月曜始まり）
+GRAINS = {
+    'day': "date(created_at)",
+    'week': "date(created_at, '-6 days', 'weekday 1')",
+    'month': "strftime('%Y-%m-01', created_at)",
+}
+
+
+def setup_rollups(conn):
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS wage_rollups (
+            grain TEXT NOT NULL,        -- 'day' / 'week' / 'month'
+            bucket TEXT NOT NULL,       -- 期間の先頭日 YYYY-MM-DD
+            district TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            wage_sum INTEGER NOT NULL,
+            wage_sq_sum INTEGER NOT NULL,
+            min_wage INTEGER NOT NULL,
+            max_wage INTEGER NOT NULL,
+            PRIMARY KEY (grain, bucket, district)
+        );
+
+        -- どの jobs.id まで集計したか
+        CREATE TABLE IF NOT EXISTS rollup_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            last_job_id INTEGER NOT NULL
+        );
+    ''')
+
+
+def refresh_rollups(conn):
+    """
+    前回から増えた jobs の行だけを集計して、日・週・月のロールアップに足し込む。
+    クロールの後に呼ぶ。追加された行数を返す。
+    """
+    setup_rollups(conn)
+    row = conn.execute('SELECT last_job_id FROM rollup_state WHERE id = 1').fetchone()
+    last_job_id = row[0] if row else 0
+    max_job_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM jobs').fetchone()[0]
+    if max_job_id <= last_job_id:
+        return 0
+
+    with conn:
+        for grain, bucket in GRAINS.items():
+            conn.execute(f'''
+                INSERT INTO wage_rollups
+                    (grain, bucket, district, count, wage_sum, wage_sq_sum, min_wage, max_wage)
+                SELECT ?, {bucket}, district, COUNT(*), SUM(wage_info),
+                       SUM(wage_info * wage_info), MIN(wage_info), MAX(wage_info)
+                FROM jobs
+                WHERE id > ? AND id <= ?
+                GROUP BY 2, district
+                ON CONFLICT(grain, bucket, district) DO UPDATE SET
+                    count = count + excluded.count,
+                    wage_sum = wage_sum + excluded.wage_sum,
+                    wage_sq_sum = wage_sq_sum + excluded.wage_sq_sum,
+                    min_wage = MIN(min_wage, excluded.min_wage),
+                    max_wage = MAX(max_wage, excluded.max_wage)
+            ''', (grain, last_job_id, max_job_id))
+        conn.execute('INSERT OR REPLACE INTO rollup_state (id, last_job_id) VALUES (1, ?)',
+                     (max_job_id,))
+    return max_job_id - last_job_id
+
+
+def rebuild_rollups(conn):
+    """ロールアップを作り直す（jobs の行を削除・修正したとき用）"""
+    setup_rollups(conn)
+    with conn:
+        conn.execute('DELETE FROM wage_rollups')
+        conn.execute('DELETE FROM rollup_state')
+    return refresh_rollups(conn)
+
+
+def load_rollups(conn, grain='month', start=None, end=None):
+    """
+    (bucket, district, count, wage_sum, wage_sq_sum, min_wage, max_wage) の行を返す。
+    DBには書き込まない：まだロールアップに入っていない jobs の行（テーブルがなければ全件）は
+    その場で集計して足し合わせる。
+    """
+    if conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'wage_rollups'"
+    ).fetchone():
+        row = conn.execute('SELECT last_job_id FROM rollup_state WHERE id = 1').fetchone()
+        last_job_id = row[0] if row else 0
+        stored = '''
+            SELECT bucket, district, count, wage_sum, wage_sq_sum, min_wage, max_wage
+            FROM wage_rollups
+            WHERE grain = :grain AND bucket BETWEEN :start AND :end
+            UNION ALL
+        '''
+    else:
+        last_job_id, stored = 0, ''
+    bucket = GRAINS[grain]
+    return conn.execute(f'''
+        SELECT bucket, district, SUM(count), SUM(wage_sum), SUM(wage_sq_sum),
+               MIN(min_wage), MAX(max_wage)
+        FROM ({stored}
+            SELECT {bucket} AS bucket, district, COUNT(*) AS count, SUM(wage_info) AS wage_sum,
+                   SUM(wage_info * wage_info) AS wage_sq_sum, MIN(wage_info) AS min_wage,
+                   MAX(wage_info) AS max_wage
+            FROM jobs
+            WHERE id > :last_job_id AND {bucket} BETWEEN :start AND :end
+            GROUP BY 1, district
+        )
+        GROUP BY bucket, district
+        ORDER BY bucket
+    ''', {'grain': grain, 'start': start or '0000-00-00', 'end': end or '9999-99-99',
+          'last_job_id': last_job_id}).fetchall()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="時給の日・週・月ロールアップ")
+    parser.add_argument("command", choices=["refresh", "rebuild"])
+    parser.add_argument("databases", nargs="+")
+    args = parser.parse_args()
+
+    for path in args.databases:
+        conn = sqlite3.connect(path)
+        added = rebuild_rollups(conn) if args.command == "rebuild" else refresh_rollups(conn)
+        print(f"{path}: {added}件を集計しました")
+        conn.close()
@@ -0,0 +1,227 @@
+import re
+import time
+from collections import Counter
+
+import requests
+from bs4 import BeautifulSoup
+
+from metrics import CrawlMetrics
+from sinks import CsvSink
+
+# 区名とスクレイピング対象URL（「?pageNo=」より前の部分）
+DISTRICT_URLS = {
+    '港区': "https://baito.mynavi.jp/tokyo/city-34/kd-11_3101/",
+    '足立区': "https://baito.mynavi.jp/tokyo/city-52/kd-11_3101/",
+}
+
+# 正規表現パターン: "1600" の直後に4桁の数字が続くか → "1600" に置換
+pattern_remove_1600 = re.compile(r'1600\d{4}')
+pattern_number = re.compile(r'\d+')
+
+# BeautifulSoup のパーサー（lxml が入っていれば "lxml" の方が速い）
+HTML_PARSER = 'html.parser'
+
+
+def extract_jobs(html_content, rejected=None, parser=HTML_PARSER):
+    """
+    1ページ分のHTMLから (会社名, 最低時給) のリストを取り出す。
+    有効なカードが1件もなければ空リストを返す。
+    rejected に Counter を渡すと、除外したカードの件数を理由ごとに数える。
+    """
+    soup = BeautifulSoup(html_content, parser)
+
+    # カード単位で求人情報を取得
+    # 汎用的に "section" を全部取ってきて、その中に会社名・時給があるかを探す
+    cards = soup.find_all("section")
+
+    jobs = []
+    for card in cards:
+        # 会社名を取得
+        company_name_elem = card.select_one("div.shopNameWrap > h2")
+        if not company_name_elem:
+            if rejected is not None:
+                rejected["no_company_name"] += 1
+            continue
+        company_name = company_name_elem.get_text(strip=True)
+
+        # 時給を取得
+        wage_elem = card.select_one("li.baseInformationSet.wage > div.baseInformationFirstContent")
+        if not wage_elem:
+            if rejected is not None:
+                rejected["no_wage"] += 1
+            continue
+
+        wage_text_original = wage_elem.get_text(strip=True)
+
+        # "1600" のあとに4桁の数字 → "1600" に置換
+        wage_text_fixed = pattern_remove_1600.sub('1600', wage_text_original)
+
+        # 数値抽出
+        # 例: "時給1600～2000円" → ['1600','2000']
+        nums = pattern_number.findall(wage_text_fixed)
+        if not nums:
+            if rejected is not None:
+                rejected["no_number"] += 1
+            continue
+
+        min_wage = int(nums[0])  # 最初の数字を最低時給とみなす
+
+        # 3桁以下(例: 900とか700は日当表記などの可能性がある)は無視する
+        if min_wage < 1000:
+            if rejected is not None:
+                rejected["<1000"] += 1
+            continue
+
+        jobs.append((company_name, min_wage))
+
+    return jobs
+
+
+def fetch_page(url, metrics, retries=2, delay=3, session=None):
+    """
+    ページを取得する。通信エラーと5xxは少し待ってから retries 回まで取り直す。
+    session に requests.Session を渡すと接続を使い回す。
+    """
+    client = session or requests
+    for attempt in range(retries + 1):
+        if attempt:
+            metrics.inc("retries")
+            time.sleep(delay * attempt)
+        try:
+            with metrics.timer("fetch"):
+                response = client.get(url)
+        except requests.RequestException as e:
+            print(f"Request failed: {e}")
+            if attempt == retries:
+                raise
+            continue
+
+        metrics.record_response(response.status_code, len(response.content))
+        if response.status_code < 500:
+            break
+    return response
+
+
+def scrape(base_url, sink, max_pages=50, archive=None, metrics=None,
+           delay=3, session=None, parser=HTML_PARSER):
+    """
+    base_url:
+        ページ番号以外の共通部分。末尾に「?pageNo={page}」を付与して利用します。
+
+    sink:
+        結果の書き出し先（sinks.py の CsvSink / SqliteSink / ParquetSink）。
+        数ページごとに書き出すので、メモリに溜まるのはその分だけです。
+        sink に記録された最後のページの次から取得を始めます。
+
+    max_pages:
+        安全のための最大ページ数。デフォルトは50ですが、必要に応じて増減してください。
+
+    archive:
+        PageArchive を渡すと、取得したHTMLをそのまま保存します。
+        後から reparse.py で再クロールせずに解析し直せます。
+
+    metrics:
+        CrawlMetrics を渡すと、各段階の処理時間や件数をそこに記録します。
+        省略時は新しく作り、終了時にサマリーを表示します。
+
+    delay / session / parser:
+        リクエスト前の待機秒数、使い回す requests.Session、BeautifulSoup のパーサー。
+        ローカルのスタブサイト（stub_site.py）で計測するときに変更します。
+    """
+
+    show_report = metrics is None
+    metrics = metrics or CrawlMetrics()
+
+    start_page = sink.last_page() + 1
+    if start_page > 1:
+        print(f"Resume from page {start_page}.")
+
+    for page_no in range(start_page, max_pages+1):
+        # ページURL生成
+        url = f"{base_url}?pageNo={page_no}"
+
+        print(f"Fetching page: {url}")
+
+        # リクエスト 前に3秒待機
+        time.sleep(delay)
+
+        # ページ取得
+        response = fetch_page(url, metrics, delay=delay, session=session)
+        # エラーなどでページが存在しない場合はそこで終了
+        if response.status_code != 200:
+            print(f"Page {page_no} not found (status: {response.status_code}). Stop.")
+            break
+
+        metrics.inc("pages")
+        html_content = response.text
+        if archive is not None:
+            archive.append(url, html_content)
+
+        rejected = Counter()
+        with metrics.timer("parse"):
+            jobs = extract_jobs(html_content, rejected, parser)
+        metrics.record_cards(len(jobs), rejected)
+
+        # 有効なカードが0件の場合は「次のページはない」と判断して終了
+        if not jobs:
+            print(f"No valid job found on page {page_no}. Stop.")
+            break
+
+        with metrics.timer("write"):
+            sink.write_page(page_no, jobs)
+
+    with metrics.timer("write"):
+        sink.flush()
+
+    if show_report:
+        print(metrics.report())
+    return metrics
+
+
+def scrape_and_save_to_csv(base_url, csv_filename, max_pages=50, archive=None, resume=False):
+    """scrape() の結果をCSVに書き出す。resume=True なら前回のチェックポイントから再開する"""
+    with CsvSink(csv_filename, resume=resume) as sink:
+        scrape(base_url, sink, max_pages, archive)
+
+
+if __name__ == "__main__":
+    import argparse
+    from archive import PageArchive
+    from sinks import ParquetSink, SqliteSink
+
+    parser = argparse.ArgumentParser(description="求人情報のスクレイピング")
+    parser.add_argument("district", nargs="?", default='港区', choices=list(DISTRICT_URLS))
+    parser.add_argument("--csv", help="出力するCSVファイル名（既定: wage_info.csv）")
+    parser.add_argument("--db", help="jobs テーブルに書き込むDBファイル名（例: minato.db）")
+    parser.add_argument("--parquet", help="Parquetを書き出すディレクトリ")
+    parser.add_argument("--archive", help="取得したHTMLを保存するディレクトリ")
+    parser.add_argument("--max-pages", type=int, default=50)
+    parser.add_argument("--resume", action="store_true", help="前回のチェックポイントから再開する")
+    parser.add_argument("--metrics-json", help="計測結果をJSONで保存するファイル名")
+    parser.add_argument("--metrics-port", type=int,
+                        help="指定するとクロール中に http://127.0.0.1:<port>/metrics で公開する")
+    args = parser.parse_args()
+
+    base_url = DISTRICT_URLS[args.district]
+    if args.db:
+        sink = SqliteSink(args.db, args.district, base_url, resume=args.resume)
+    elif args.parquet:
+        sink = ParquetSink(args.parquet, resume=args.resume)
+    else:
+        sink = CsvSink(args.csv or "wage_info.csv", resume=args.resume)
+
+    metrics = CrawlMetrics()
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+
+    archive = PageArchive(args.archive) if args.archive else None
+    try:
+        with sink:
+            scrape(base_url, sink, args.max_pages, archive, metrics)
+    finally:
+        if archive is not None:
+            archive.close()
+        print(metrics.report())
+        if args.metrics_json:
+            metrics.to_json(args.metrics_json)
+    print("==== 出力が完了しました ====")
@@ -0,0 +1,211 @@
+import os
+import csv
+import sqlite3
+
+from aggregates import setup_aggregates
+from rollups import refresh_rollups
+from sketch import update_sketches
+
+FIELDNAMES = ["company_name", "wage_info"]
+
+
+def create_jobs_table(conn):
+    """求人テーブルを作成（既にあれば何もしない）"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            company_name TEXT NOT NULL,
+            wage_info INTEGER NOT NULL,
+            district TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    # 区ごとの集計は挿入時にトリガーで更新する
+    setup_aggregates(conn)
+
+
+class Sink:
+    """
+    スクレイピング結果の書き出し先。
+
+    write_page() で受け取った行は batch_pages ページ分だけメモリに溜め、
+    それを超えたら flush() で書き出してチェックポイント（書き終えた最後のページ番号）を記録する。
+    クロールが途中で落ちても、last_page() の次のページから再開できる。
+    """
+
+    def __init__(self, batch_pages=5):
+        self.batch_pages = batch_pages
+        self.buffer = []
+        self.pending_pages = 0
+        self.buffered_page = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def last_page(self):
+        """最後にコミットしたページ番号（なければ0）"""
+        raise NotImplementedError
+
+    def write_page(self, page_no, rows):
+        self.buffer.extend(rows)
+        self.buffered_page = page_no
+        self.pending_pages += 1
+        if self.pending_pages >= self.batch_pages:
+            self.flush()
+
+    def flush(self):
+        if self.buffered_page is None:
+            return
+        self._commit(self.buffer, self.buffered_page)
+        self.buffer = []
+        self.pending_pages = 0
+        self.buffered_page = None
+
+    def _commit(self, rows, page_no):
+        raise NotImplementedError
+
+    def close(self):
+        self.flush()
+
+
+class CsvSink(Sink):
+    """
+    CSVに追記する。チェックポイントは「ページ番号 ファイル長」を別ファイルに保存し、
+    再開時はチェックポイント以降に書かれた中途半端な行を切り捨てる。
+    """
+
+    def __init__(self, csv_filename, resume=False, batch_pages=5):
+        super().__init__(batch_pages)
+        self.csv_filename = csv_filename
+        self.checkpoint_filename = csv_filename + ".checkpoint"
+
+        checkpoint = self._read_checkpoint() if resume else None
+        if checkpoint:
+            self._last_page, size = checkpoint
+            with open(csv_filename, 'r+b') as f:
+                f.truncate(size)
+            self.file = open(csv_filename, 'a', newline='', encoding='utf-8')
+            self.writer = csv.writer(self.file)
+        else:
+            self._last_page = 0
+            self.file = open(csv_filename, 'w', newline='', encoding='utf-8')
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(FIELDNAMES)
+            self._commit([], 0)
+
+    def _read_checkpoint(self):
+        try:
+            with open(self.checkpoint_filename, encoding='utf-8') as f:
+                page_no, size = f.read().split()
+                return int(page_no), int(size)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def last_page(self):
+        return self._last_page
+
+    def _commit(self, rows, page_no):
+        self.writer.writerows(rows)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+        tmp = self.checkpoint_filename + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(f"{page_no} {os.fstat(self.file.fileno()).st_size}")
+        os.replace(tmp, self.checkpoint_filename)
+        self._last_page = page_no
+
+    def close(self):
+        super().close()
+        self.file.close()
+
+
+class SqliteSink(Sink):
+    """
+    jobs テーブルに挿入する。進捗は crawl_progress テーブルに
+    同じトランザクションで書くので、行とチェックポイントが食い違うことはない。
+    """
+
+    def __init__(self, db_filename, district, base_url, resume=False, batch_pages=5):
+        super().__init__(batch_pages)
+        self.district = district
+        self.base_url = base_url
+        self.conn = sqlite3.connect(db_filename)
+        create_jobs_table(self.conn)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS crawl_progress (
+                base_url TEXT PRIMARY KEY,
+                last_page INTEGER NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        if not resume:
+            with self.conn:
+                self.conn.execute('DELETE FROM crawl_progress WHERE base_url = ?', (base_url,))
+
+    def last_page(self):
+        row = self.conn.execute(
+            'SELECT last_page FROM crawl_progress WHERE base_url = ?', (self.base_url,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def _commit(self, rows, page_no):
+        with self.conn:
+            self.conn.executemany(
+                'INSERT INTO jobs (company_name, wage_info, district) VALUES (?, ?, ?)',
+                ((company_name, wage_info, self.district) for company_name, wage_info in rows)
+            )
+            update_sketches(self.conn, self.district, (wage_info for _, wage_info in rows))
+            self.conn.execute('''
+                INSERT OR REPLACE INTO crawl_progress (base_url, last_page, updated_at)
+                VALUES (?, ?, CURRENT_TIMESTAMP)
+            ''', (self.base_url, page_no))
+
+    def close(self):
+        super().close()
+        # クロールの最後に日・週・月のロールアップを更新する
+        refresh_rollups(self.conn)
+        self.conn.close()
+
+
+class ParquetSink(Sink):
+    """
+    チェックポイントごとに part-<ページ番号>.parquet を1ファイル書く。
+    一時ファイルに書いてからリネームするので、途中で落ちても壊れたファイルは残らない。
+    """
+
+    def __init__(self, directory, resume=False, batch_pages=5):
+        import pyarrow  # 任意の依存なので使うときだけ読み込む
+        import pyarrow.parquet
+
+        super().__init__(batch_pages)
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+        if not resume:
+            for name in self._parts():
+                os.remove(os.path.join(directory, name))
+
+    def _parts(self):
+        return sorted(
+            name for name in os.listdir(self.directory)
+            if name.startswith("part-") and name.endswith(".parquet")
+        )
+
+    def last_page(self):
+        parts = self._parts()
+        return int(parts[-1][len("part-"):-len(".parquet")]) if parts else 0
+
+    def _commit(self, rows, page_no):
+        table = self.pa.table({
+            "company_name": self.pa.array([row[0] for row in rows], self.pa.string()),
+            "wage_info": self.pa.array([row[1] for row in rows], self.pa.int32()),
+        })
+        path = os.path.join(self.directory, f"part-{page_no:05d}.parquet")
+        self.pq.write_table(table, path + ".tmp")
+        os.replace(path + ".tmp", path)
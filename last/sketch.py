@@ -0,0 +1,270 @@
+import math
+import random
+import struct
+import sqlite3
+import argparse
+from array import array
+from datetime import datetime, timezone
+
+# 区全体の（日付で分けない）スケッチに使う day の値
+ALL_DAYS = ''
+
+HEADER = struct.Struct('<HHQ')
+
+
+class KLLSketch:
+    """
+    KLL 分位点スケッチ。
+
+    レベル h の要素は重み 2^h を持ち、各レベルが容量を超えたら
+    ソートして1つおきに上のレベルへ送る。k=200 で誤差はおよそ1%程度。
+    同じ k のスケッチ同士は merge() で足し合わせられる。
+    """
+
+    def __init__(self, k=200, c=2 / 3, seed=None):
+        self.k = k
+        self.c = c
+        self.n = 0
+        self.compactors = []
+        self.random = random.Random(seed)
+        self.max_size = 0
+        self._grow()
+
+    def _capacity(self, h):
+        depth = len(self.compactors) - h - 1
+        return int(math.ceil(self.k * self.c ** depth)) + 1
+
+    def _grow(self):
+        self.compactors.append([])
+        self.max_size = sum(self._capacity(h) for h in range(len(self.compactors)))
+
+    def _size(self):
+        return sum(len(items) for items in self.compactors)
+
+    def _compress(self):
+        for h in range(len(self.compactors)):
+            items = self.compactors[h]
+            if len(items) < self._capacity(h):
+                continue
+            if h + 1 >= len(self.compactors):
+                self._grow()
+
+            keep = [items.pop()] if len(items) % 2 else []
+            items.sort()
+            offset = self.random.random() < 0.5
+            self.compactors[h + 1].extend(items[offset::2])
+            self.compactors[h] = keep
+
+            if self._size() < self.max_size:
+                break
+
+    def update(self, value):
+        self.compactors[0].append(value)
+        self.n += 1
+        if self._size() >= self.max_size:
+            self._compress()
+
+    def extend(self, values):
+        for value in values:
+            self.update(value)
+
+    def merge(self, other):
+        while len(self.compactors) < len(other.compactors):
+            self._grow()
+        for h, items in enumerate(other.compactors):
+            self.compactors[h].extend(items)
+        self.n += other.n
+        while self._size() >= self.max_size:
+            self._compress()
+        return self
+
+    def quantiles(self, qs):
+        """qs（0〜1）それぞれの分位点を返す"""
+        weighted = sorted(
+            (value, 1 << h) for h, items in enumerate(self.compactors) for value in items
+        )
+        if not weighted:
+            return [None for _ in qs]
+
+        total = sum(weight for _, weight in weighted)
+        results = []
+        for q in qs:
+            target = q * total
+            seen = 0
+            for value, weight in weighted:
+                seen += weight
+                if seen >= target:
+                    break
+            results.append(value)
+        return results
+
+    def quantile(self, q):
+        return self.quantiles([q])[0]
+
+    def to_bytes(self):
+        """ヘッダ + レベルごとの要素数 + float32 の値の列"""
+        lengths = array('I', (len(items) for items in self.compactors))
+        values = array('f', (value for items in self.compactors for value in items))
+        return HEADER.pack(self.k, len(self.compactors), self.n) + lengths.tobytes() + values.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        k, levels, n = HEADER.unpack_from(data)
+        sketch = cls(k)
+        while len(sketch.compactors) < levels:
+            sketch._grow()
+
+        lengths = array('I')
+        lengths.frombytes(data[HEADER.size:HEADER.size + levels * lengths.itemsize])
+        values = array('f')
+        values.frombytes(data[HEADER.size + levels * lengths.itemsize:])
+
+        start = 0
+        for h, length in enumerate(lengths):
+            sketch.compactors[h] = values[start:start + length].tolist()
+            start += length
+        sketch.n = n
+        return sketch
+
+
+def setup_sketches(conn):
+    """
+    スケッチのテーブルを作成する。新しく作ったときは True を返す。
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'wage_sketches'"
+    ).fetchone()
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS wage_sketches (
+            district TEXT NOT NULL,
+            day TEXT NOT NULL,          -- 'YYYY-MM-DD'、区全体は ''
+            sketch BLOB NOT NULL,
+            PRIMARY KEY (district, day)
+        )
+    ''')
+    return not exists
+
+
+def _load(conn, district, day):
+    row = conn.execute(
+        'SELECT sketch FROM wage_sketches WHERE district = ? AND day = ?', (district, day)
+    ).fetchone()
+    return KLLSketch.from_bytes(row[0]) if row else KLLSketch()
+
+
+def _store(conn, district, day, sketch):
+    conn.execute(
+        'INSERT OR REPLACE INTO wage_sketches (district, day, sketch) VALUES (?, ?, ?)',
+        (district, day, sketch.to_bytes())
+    )
+
+
+def _sketches_from_jobs(conn):
+    """{(区名, 日): スケッチ} を jobs から作る（区全体の日は ALL_DAYS）"""
+    sketches = {}
+    for district, day, wage_info in conn.execute(
+        'SELECT district, date(created_at), wage_info FROM jobs'
+    ):
+        for key in (ALL_DAYS, day):
+            sketches.setdefault((district, key), KLLSketch()).update(wage_info)
+    return sketches
+
+
+def _build_from_jobs(conn):
+    sketches = _sketches_from_jobs(conn)
+    conn.execute('DELETE FROM wage_sketches')
+    for (district, day), sketch in sketches.items():
+        _store(conn, district, day, sketch)
+
+
+def update_sketches(conn, district, wages, day=None):
+    """
+    取り込んだ時給を区全体と区×日のスケッチに追加する。
+    jobs の created_at（UTC）に合わせて、day の既定値はUTCの今日。
+    呼び出し側のトランザクションの中で、jobs への挿入の後に実行する。
+    """
+    if setup_sketches(conn):
+        # 初回は今回の行も含めて jobs から作る
+        _build_from_jobs(conn)
+        return
+
+    wages = list(wages)
+    if not wages:
+        return
+    day = day or datetime.now(timezone.utc).strftime('%Y-%m-%d')
+    for key in (ALL_DAYS, day):
+        sketch = _load(conn, district, key)
+        sketch.extend(wages)
+        _store(conn, district, key, sketch)
+
+
+def rebuild_sketches(conn):
+    """jobs から全スケッチを作り直す"""
+    with conn:
+        setup_sketches(conn)
+        _build_from_jobs(conn)
+
+
+def merged_sketch(conn, districts=None, start_day=None, end_day=None):
+    """
+    指定した区・期間のスケッチを足し合わせる。
+    期間を指定しなければ区全体のスケッチだけを読むので、区の数だけの行で済む。
+    スケッチのテーブルがまだないDBでは、何も書き込まずに jobs から作る。
+    """
+    if not conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'wage_sketches'"
+    ).fetchone():
+        merged = KLLSketch()
+        for (district, day), sketch in _sketches_from_jobs(conn).items():
+            if districts and district not in districts:
+                continue
+            if start_day or end_day:
+                if day == ALL_DAYS or not (start_day or '0000-00-00') <= day <= (end_day or '9999-99-99'):
+                    continue
+            elif day != ALL_DAYS:
+                continue
+            merged.merge(sketch)
+        return merged
+
+    query = 'SELECT sketch FROM wage_sketches WHERE '
+    params = []
+    if start_day or end_day:
+        query += 'day != ? AND day BETWEEN ? AND ?'
+        params += [ALL_DAYS, start_day or '0000-00-00', end_day or '9999-99-99']
+    else:
+        query += 'day = ?'
+        params.append(ALL_DAYS)
+    if districts:
+        query += f' AND district IN ({", ".join("?" for _ in districts)})'
+        params += list(districts)
+
+    merged = KLLSketch()
+    for (data,) in conn.execute(query, params):
+        merged.merge(KLLSketch.from_bytes(data))
+    return merged
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="時給の分位点スケッチ")
+    parser.add_argument("command", choices=["rebuild", "report"])
+    parser.add_argument("databases", nargs="+")
+    parser.add_argument("--district", action="append", help="集計する区（複数指定可）")
+    parser.add_argument("--from", dest="start_day", help="開始日 YYYY-MM-DD")
+    parser.add_argument("--to", dest="end_day", help="終了日 YYYY-MM-DD")
+    args = parser.parse_args()
+
+    total = KLLSketch()
+    for path in args.databases:
+        conn = sqlite3.connect(path)
+        if args.command == "rebuild":
+            rebuild_sketches(conn)
+        sketch = merged_sketch(conn, args.district, args.start_day, args.end_day)
+        conn.close()
+
+        p50, p90, p99 = sketch.quantiles([0.5, 0.9, 0.99])
+        print(f"{path}: {sketch.n}件 p50={p50} p90={p90} p99={p99}")
+        total.merge(sketch)
+
+    if len(args.databases) > 1:
+        p50, p90, p99 = total.quantiles([0.5, 0.9, 0.99])
+        print(f"合計: {total.n}件 p50={p50} p90={p90} p99={p99}")
@@ -0,0 +1,166 @@
+import time
+import random
+import argparse
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from archive import PageArchive
+
+CARD_TEMPLATE = '''
+<section class="jobOfferCard">
+  <div class="shopNameWrap"><h2>{name}</h2></div>
+  <ul>
+    <li class="baseInformationSet wage">
+      <div class="baseInformationFirstContent">{wage_text}</div>
+    </li>
+  </ul>
+</section>
+'''
+
+EMPTY_PAGE = "<html><body><section><p>該当する求人がありません</p></section></body></html>"
+
+
+def sample_page(page_no, cards=30, anomalies=True):
+    """
+    サイトの求人一覧ページに近い構造のHTMLを生成する。
+    anomalies=True なら「1600xxxx」表記と日給（1000円未満）のカードを1件ずつ混ぜる。
+    """
+    body = [
+        CARD_TEMPLATE.format(name=f"テスト店舗{page_no}-{i}",
+                             wage_text=f"時給{1000 + (i * 37) % 900}円～{2000 + i}円")
+        for i in range(cards)
+    ]
+    if anomalies:
+        body.append(CARD_TEMPLATE.format(name=f"テスト店舗{page_no}-1600",
+                                         wage_text="時給16002000円～"))
+        body.append(CARD_TEMPLATE.format(name=f"テスト店舗{page_no}-daily",
+                                         wage_text="日給900円"))
+    return f"<html><body>{''.join(body)}</body></html>"
+
+
+def fixture_pages(count, cards=30, end="404"):
+    """
+    count ページ分の固定ページ。
+    end="empty" なら最後に求人0件のページ（200）を付け、"404" ならその次が404になる。
+    """
+    pages = [sample_page(page_no, cards) for page_no in range(1, count + 1)]
+    if end == "empty":
+        pages.append(EMPTY_PAGE)
+    return pages
+
+
+class StubSite:
+    """
+    記録済みのページを ?pageNo=N で返すローカルのHTTPサーバー。
+    範囲外のページは404。latency / jitter で応答を遅らせ、error_rate の割合で503を返す。
+    """
+
+    def __init__(self, pages, latency=0.0, jitter=0.0, error_rate=0.0, seed=0,
+                 host="127.0.0.1", port=0):
+        self.pages = [page.encode('utf-8') for page in pages]
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests_served = 0
+        self.errors_injected = 0
+
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                site.handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @classmethod
+    def from_archive(cls, archive_dir, **kwargs):
+        with PageArchive(archive_dir, mode='r') as archive:
+            pages = [html_content for _, html_content in archive]
+        return cls(pages, **kwargs)
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/tokyo/"
+
+    def handle(self, request):
+        query = parse_qs(urlparse(request.path).query)
+        try:
+            page_no = int(query.get("pageNo", ["1"])[0])
+        except ValueError:
+            page_no = 0
+
+        with self.lock:
+            self.requests_served += 1
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            fail = self.random.random() < self.error_rate
+            if fail:
+                self.errors_injected += 1
+
+        if delay:
+            time.sleep(delay)
+
+        if not 1 <= page_no <= len(self.pages):
+            status, body = 404, b"not found"
+        elif fail:
+            status, body = 503, b"service unavailable"
+        else:
+            status, body = 200, self.pages[page_no - 1]
+
+        request.send_response(status)
+        request.send_header("Content-Type", "text/html; charset=utf-8")
+        request.send_header("Content-Length", str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self.base_url
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="スクレイパー用のローカルスタブサイト")
+    parser.add_argument("--archive", help="返すページを読み込むアーカイブ（省略時は固定ページ）")
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--end", choices=["404", "empty"], default="404")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0, help="応答までの待ち時間（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="503を返す割合")
+    args = parser.parse_args()
+
+    options = dict(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                   port=args.port)
+    if args.archive:
+        site = StubSite.from_archive(args.archive, **options)
+    else:
+        site = StubSite(fixture_pages(args.pages, end=args.end), **options)
+
+    print(f"Serving {len(site.pages)} pages at {site.base_url}")
+    try:
+        site.server.serve_forever()
+    except KeyboardInterrupt:
+        site.server.server_close()
@@ -0,0 +1,117 @@
+import os
+import sys
+import sqlite3
+import argparse
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from forecast_cache import JMA_BASE_URL, setup_database  # noqa: E402
+
+# 地点ごとの10分値は気象庁のサイトに10日分ほどしか残らない
+KEEP_DAYS = 10
+HTTP_TIMEOUT = 10
+
+
+def setup_observations(conn):
+    """アメダスの日ごとの観測値。id は取り込んだ順の通し番号で、検証ジョブはこれで続きから処理する。"""
+    setup_database(conn)
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS observations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            station_code TEXT NOT NULL,
+            obs_date DATE NOT NULL,
+            temperature_max REAL,       -- 日最高気温
+            temperature_min REAL,       -- 日最低気温
+            precipitation REAL,         -- 日降水量（mm）
+            created_at TIMESTAMP DEFAULT (DATETIME('now', 'localtime')),
+            UNIQUE(station_code, obs_date)
+        );
+    ''')
+
+
+def daily_summary(blocks, day):
+    """
+    1日分の10分値（3時間ごとのJSON 8つ）から (最高気温, 最低気温, 日降水量)。
+    品質フラグが0（正常）の値だけを使い、値がなければ None。
+    """
+    prefix = day.strftime('%Y%m%d')
+    temps, rain = [], []
+    for records in blocks:
+        for at, record in records.items():
+            if not at.startswith(prefix):
+                continue
+            value = record.get('temp')
+            if value and value[0] is not None and value[1] == 0:
+                temps.append(value[0])
+            value = record.get('precipitation10m')
+            if value and value[0] is not None and value[1] == 0:
+                rain.append(value[0])
+    return (max(temps) if temps else None, min(temps) if temps else None,
+            round(sum(rain), 1) if rain else None)
+
+
+def fetch_day(session, base_url, station_code, day):
+    """地点の1日分の観測値。1ブロックでも取れなければ None（次回また取りに行く）。"""
+    blocks = []
+    for hour in range(0, 24, 3):
+        url = f"{base_url}/amedas/data/point/{station_code}/{day:%Y%m%d}_{hour:02d}.json"
+        try:
+            response = session.get(url, timeout=HTTP_TIMEOUT)
+            response.raise_for_status()
+            blocks.append(response.json())
+        except (requests.RequestException, ValueError) as e:
+            print(f"観測値取得エラー: {station_code} {day:%Y-%m-%d}: {e}")
+            return None
+    return daily_summary(blocks, day)
+
+
+def ingest_observations(db_path='weather.db', base_url=JMA_BASE_URL, days=KEEP_DAYS, workers=8,
+                        today=None):
+    """
+    予報の気温の観測地点（area_stations）について、昨日までの days 日のうち
+    まだ取り込んでいない日の観測値を取り込む。取り込んだ地点・日の数を返す。
+    """
+    base_url = base_url.rstrip('/')
+    today = (today or datetime.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+    start = today - timedelta(days=days)
+
+    with sqlite3.connect(db_path) as conn:
+        setup_observations(conn)
+        stations = [row[0] for row in conn.execute('SELECT DISTINCT station_code FROM area_stations')]
+        done = set(conn.execute('SELECT station_code, obs_date FROM observations WHERE obs_date >= ?',
+                                (start.strftime('%Y-%m-%d'),)))
+
+    todo = [(station, start + timedelta(days=i)) for station in stations for i in range(days)
+            if (station, (start + timedelta(days=i)).strftime('%Y-%m-%d')) not in done]
+    if not todo:
+        return 0
+
+    with requests.Session() as session, ThreadPoolExecutor(workers) as pool:
+        summaries = list(pool.map(lambda job: fetch_day(session, base_url, *job), todo))
+
+    rows = [(station, day.strftime('%Y-%m-%d'), *summary)
+            for (station, day), summary in zip(todo, summaries) if summary is not None]
+    with sqlite3.connect(db_path) as conn:
+        # 同じ地点・日を取り込み直すことはない（id が変わらないので、検証ジョブが二重に数えない）
+        conn.executemany('''
+            INSERT OR IGNORE INTO observations
+            (station_code, obs_date, temperature_max, temperature_min, precipitation)
+            VALUES (?, ?, ?, ?, ?)
+        ''', rows)
+    return len(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="アメダスの観測値（日最高・最低気温、日降水量）を取り込む")
+    parser.add_argument("--db", default="weather.db")
+    parser.add_argument("--base-url", default=JMA_BASE_URL, help="スタブで試すときは stub_jma.py のURL")
+    parser.add_argument("--days", type=int, default=KEEP_DAYS, help="昨日から遡って見る日数")
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    count = ingest_observations(args.db, args.base_url, args.days, args.workers)
+    print(f"{count}地点・日の観測値を取り込みました")
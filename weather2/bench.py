@@ -0,0 +1,350 @@
+import os
+import sys
+import time
+import random
+import asyncio
+import sqlite3
+import argparse
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from stub_jma import StubJMA, station_for
+
+# Flet アプリ本体は src/ にある
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+
+def harness(workers):
+    """
+    1プロセスに載った Flet のセッション群（イベントループ・ハンドラ用スレッドプール・pubsub ハブを共有）。
+    接続はブラウザに送るはずだったメッセージを数えるだけ。
+    """
+    from flet.core.local_connection import LocalConnection
+    from flet.core.page import Page
+    from flet.core.protocol import PageCommandResponsePayload, PageCommandsBatchResponsePayload
+    from flet.core.pubsub.pubsub_hub import PubSubHub
+
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    executor = ThreadPoolExecutor(workers)
+    hub = PubSubHub(loop, executor)
+
+    class CountingConnection(LocalConnection):
+        def __init__(self):
+            super().__init__()
+            self.pubsubhub = hub
+            self.messages = 0
+
+        def send_command(self, session_id, command):
+            result, message = self._process_command(command)
+            self.messages += bool(message)
+            return PageCommandResponsePayload(result=result, error="")
+
+        def send_commands(self, session_id, commands):
+            results, sent = [], False
+            for command in commands:
+                result, message = self._process_command(command)
+                if command.name in ("add", "get"):
+                    results.append(result)
+                sent = sent or bool(message)
+            self.messages += sent
+            return PageCommandsBatchResponsePayload(results=results, error="")
+
+    def new_page(session_id):
+        return Page(CountingConnection(), session_id, loop=loop, executor=executor)
+
+    new_page.executor = executor
+    return new_page
+
+
+def wait_until(condition, timeout=60):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+def bench_viewers(viewers, areas, latency, threads, workers):
+    """
+    viewers 個のセッションが areas 個の地域を一斉に開いたときの、気象庁への問い合わせ回数と表示までの時間。
+    続けて予報を更新し、表示中の全セッションに配信されるまでの時間を測る。
+    """
+    import main
+    from forecast_cache import ConnectionPool, ForecastCache
+
+    new_page = harness(workers)
+    with StubJMA(latency=latency) as site, tempfile.TemporaryDirectory() as tmp:
+        cache = ForecastCache(ConnectionPool(os.path.join(tmp, "weather.db")), base_url=site.base_url,
+                              refresh_interval=0.05)
+        main.forecast_cache = lambda: cache
+
+        apps = [main.WeatherApp(new_page(f"session-{i}")) for i in range(viewers)]
+        codes = [area['code'] for area in apps[0].area_list[:areas]]
+
+        def open_area(i):
+            app = apps[i]
+            app.area_dropdown.value = codes[i % len(codes)]
+            app.get_weather_forecast(None)
+
+        def shown(revision_weather=None):
+            for app in apps:
+                controls = app.forecast_row.controls
+                if not controls:
+                    return False
+                if revision_weather and controls[0].content.controls[2].value != revision_weather[app.area_code]:
+                    return False
+            return True
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            list(pool.map(open_area, range(viewers)))
+        opened = wait_until(shown)
+        open_ms = (time.perf_counter() - start) * 1000
+        open_fetches = site.requests_for("/bosai/forecast/")
+
+        # 予報が更新され、キャッシュの期限が切れた：バックグラウンドの取り直しが全員に配られる
+        from stub_jma import sample_forecast
+        site.revision += 1
+        expected = {code: sample_forecast(code, site.revision)[0]['timeSeries'][0]['areas'][0]['weathers'][0]
+                    for code in codes}
+        start = time.perf_counter()
+        with cache.lock:
+            for code in codes:
+                cache.entries[code] = (0, *cache.entries[code][1:])
+        pushed = wait_until(lambda: shown(expected))
+        push_ms = (time.perf_counter() - start) * 1000
+        push_fetches = site.requests_for("/bosai/forecast/") - open_fetches
+
+        result = {
+            "viewers": viewers,
+            "areas": len(codes),
+            "area_list_fetches": site.requests_for("/bosai/common/"),
+            "open_fetches": open_fetches,
+            "open_ms": open_ms,
+            "all_opened": opened,
+            "push_fetches": push_fetches,
+            "push_ms": push_ms,
+            "all_pushed": pushed,
+        }
+        cache.close()
+    new_page.executor.shutdown(wait=False)
+    return result
+
+
+def bench_verify(history_days, areas):
+    """
+    スタブから予報と観測値を取り込む経路を通したうえで、さらに history_days 日分の予報・観測値を入れ、
+    検証ジョブの初回（全履歴）と、1日分の観測値が増えた夜間の実行の時間を比べる。
+    """
+    from amedas import ingest_observations
+    from forecast_cache import ConnectionPool, ForecastCache
+    from verify import verification_report, verify_forecasts
+
+    with StubJMA() as site, tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "weather.db")
+        cache = ForecastCache(ConnectionPool(db_path), base_url=site.base_url)
+        codes = sorted(site.areas)[:areas]
+        for code in codes:
+            cache.forecast(code)
+        cache.close()
+
+        start = time.perf_counter()
+        ingested = ingest_observations(db_path, site.base_url, days=7)
+        ingest_ms = (time.perf_counter() - start) * 1000
+        ingest_requests = site.requests_for("/bosai/amedas/")
+        ingested_again = ingest_observations(db_path, site.base_url, days=7)
+
+        # それより前の日の予報（リード0〜2日）と観測値は直接入れる
+        rng = random.Random(0)
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+        def insert(days):
+            snapshots, observations = [], []
+            for day in days:
+                date_str = day.strftime('%Y-%m-%d')
+                for code in codes:
+                    observed = 10 + rng.uniform(-8, 8)
+                    for lead in range(3):
+                        issued = (day - timedelta(days=lead)).strftime('%Y-%m-%d')
+                        snapshots.append((code, issued, date_str, lead,
+                                          round(observed + 5 + rng.gauss(0, 1 + lead)),
+                                          round(observed - 5 + rng.gauss(0, 1 + lead)),
+                                          rng.randrange(0, 101, 10)))
+                    observations.append((station_for(code), date_str, observed + 5, observed - 5,
+                                         rng.choice([0.0, 0.0, 0.5, 3.0, 12.0])))
+            with sqlite3.connect(db_path) as conn:
+                conn.executemany('INSERT OR REPLACE INTO forecast_snapshots VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                 snapshots)
+                conn.executemany('''
+                    INSERT OR IGNORE INTO observations
+                    (station_code, obs_date, temperature_max, temperature_min, precipitation)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', observations)
+
+        insert(today - timedelta(days=8 + i) for i in range(history_days))
+        timings = {}
+        for label in ("first", "nightly", "idle"):
+            if label == "nightly":
+                insert([today - timedelta(days=8 + history_days)])
+            start = time.perf_counter()
+            count = verify_forecasts(db_path)
+            timings[label] = ((time.perf_counter() - start) * 1000, count)
+        overall = [row for row in verification_report(db_path) if row[0] is None]
+
+    return {
+        "areas": len(codes),
+        "ingested": ingested,
+        "ingest_ms": ingest_ms,
+        "ingest_requests": ingest_requests,
+        "ingested_again": ingested_again,
+        "timings": timings,
+        "overall": overall,
+    }
+
+
+def bench_maintain(years, areas, keep_days):
+    """
+    years 年分の運用（毎日の予報・発表日ごとの予報・観測値・誤差）をひと月ずつ入れ、
+    月に1回 maintain() するDBとしないDBで、ファイルサイズ・保守の時間・よく使う問い合わせの時間を比べる。
+    """
+    from forecast_cache import ConnectionPool
+    from maintain import maintain, setup_maintenance
+
+    rng = random.Random(0)
+    codes = sorted(StubJMA().areas)[:areas]
+    start_day = datetime(2020, 1, 1)
+
+    def month_rows(first_day, days):
+        forecasts, snapshots, observations, errors = [], [], [], []
+        for i in range(days):
+            date_str = (first_day + timedelta(days=i)).strftime('%Y-%m-%d')
+            for code in codes:
+                high, low = rng.randint(5, 35), rng.randint(-5, 25)
+                forecasts.append((code, date_str, "くもり　時々　晴れ", high, low, rng.randrange(0, 101, 10)))
+                observations.append((station_for(code), date_str, high + rng.gauss(0, 2), low + rng.gauss(0, 2),
+                                     rng.choice([0.0, 0.0, 3.0])))
+                for lead in range(3):
+                    issued = (first_day + timedelta(days=i - lead)).strftime('%Y-%m-%d')
+                    snapshots.append((code, issued, date_str, lead, high, low, rng.randrange(0, 101, 10)))
+                    errors.append((code, date_str, lead, rng.gauss(0, 2), rng.gauss(0, 2), rng.random() / 2))
+        return forecasts, snapshots, observations, errors
+
+    def insert(conn, rows):
+        forecasts, snapshots, observations, errors = rows
+        with conn:
+            conn.executemany('''
+                INSERT OR REPLACE INTO weather_forecasts
+                (area_code, forecast_date, weather_description,
+                temperature_max, temperature_min, precipitation_probability)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', forecasts)
+            conn.executemany('INSERT OR REPLACE INTO forecast_snapshots VALUES (?, ?, ?, ?, ?, ?, ?)', snapshots)
+            conn.executemany('''
+                INSERT OR IGNORE INTO observations
+                (station_code, obs_date, temperature_max, temperature_min, precipitation)
+                VALUES (?, ?, ?, ?, ?)
+            ''', observations)
+            conn.executemany('INSERT OR REPLACE INTO forecast_errors VALUES (?, ?, ?, ?, ?, ?)', errors)
+
+    def query_ms(conn, day):
+        # 日付を指定した検索（インデックス）と、直近30日の地域ごとの平均（範囲の集計）
+        date_str = (day - timedelta(days=3)).strftime('%Y-%m-%d')
+        since = (day - timedelta(days=30)).strftime('%Y-%m-%d')
+        timings = []
+        for sql, params in (
+            ('''SELECT forecast_date, weather_description, temperature_max, temperature_min,
+                    precipitation_probability
+                FROM weather_forecasts WHERE area_code = ? AND forecast_date = ?''', (codes[0], date_str)),
+            ('''SELECT area_code, AVG(temperature_max), AVG(temperature_min) FROM weather_forecasts
+                WHERE forecast_date >= ? GROUP BY area_code''', (since,)),
+        ):
+            start = time.perf_counter()
+            for _ in range(20):
+                conn.execute(sql, params).fetchall()
+            timings.append((time.perf_counter() - start) / 20 * 1000)
+        return timings
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = {name: os.path.join(tmp, f"{name}.db") for name in ("maintained", "unmaintained")}
+        conns = {}
+        for name, path in paths.items():
+            ConnectionPool(path).close()
+            conns[name] = sqlite3.connect(path)
+            setup_maintenance(conns[name])
+            conns[name].commit()
+
+        day = start_day
+        for month in range(years * 12):
+            days = 30
+            rows = month_rows(day, days)
+            day += timedelta(days=days)
+            for conn in conns.values():
+                insert(conn, rows)
+            start = time.perf_counter()
+            report = maintain(paths["maintained"], keep_days=keep_days, today=day)
+            maintain_ms = (time.perf_counter() - start) * 1000
+            if (month + 1) % 12 == 0:
+                row = {"year": (month + 1) // 12, "maintain_ms": maintain_ms, "reclaimed": report['reclaimed']}
+                for name, conn in conns.items():
+                    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+                    row[name] = (os.path.getsize(paths[name]), *query_ms(conn, day))
+                results.append(row)
+        for conn in conns.values():
+            conn.close()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="天気予報アプリの計測")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    viewers_parser = sub.add_parser("viewers", help="Flet Web版の共有キャッシュ：閲覧者数と気象庁への問い合わせ")
+    viewers_parser.add_argument("--viewers", type=int, nargs="+", default=[1, 100, 300])
+    viewers_parser.add_argument("--areas", type=int, default=1, help="セッションが開く地域の数")
+    viewers_parser.add_argument("--latency", type=float, default=0.3, help="スタブの応答までの待ち時間（秒）")
+    viewers_parser.add_argument("--threads", type=int, default=32, help="同時に地域を選ぶ数")
+    viewers_parser.add_argument("--workers", type=int, default=32, help="Flet のハンドラ用スレッド数")
+
+    verify_parser = sub.add_parser("verify", help="観測値の取り込みと予報の検証ジョブ")
+    verify_parser.add_argument("--days", type=int, default=365, help="検証ジョブの前に入れておく過去の日数")
+    verify_parser.add_argument("--areas", type=int, default=58)
+
+    maintain_parser = sub.add_parser("maintain", help="weather.db の保守：年ごとのサイズと問い合わせ時間")
+    maintain_parser.add_argument("--years", type=int, default=5)
+    maintain_parser.add_argument("--areas", type=int, default=58)
+    maintain_parser.add_argument("--keep-days", type=int, default=400)
+    args = parser.parse_args()
+
+    if args.command == "viewers":
+        for viewers in args.viewers:
+            r = bench_viewers(viewers, args.areas, args.latency, args.threads, args.workers)
+            print(f"{r['viewers']:4d}セッション/{r['areas']}地域: "
+                  f"地域リスト取得 {r['area_list_fetches']}回, "
+                  f"予報取得 {r['open_fetches']}回, 全員表示まで {r['open_ms']:7.0f} ms"
+                  f"{'' if r['all_opened'] else '（未表示あり）'}; "
+                  f"更新時の取得 {r['push_fetches']}回, 全員に配信まで {r['push_ms']:6.0f} ms"
+                  f"{'' if r['all_pushed'] else '（未配信あり）'}")
+
+    elif args.command == "verify":
+        r = bench_verify(args.days, args.areas)
+        print(f"観測値の取り込み: {r['areas']}地点×7日 = {r['ingested']}件, {r['ingest_requests']}リクエスト, "
+              f"{r['ingest_ms']:.0f} ms（再実行で取り込んだ件数 {r['ingested_again']}）")
+        for label, name in (("first", "初回（全履歴）"), ("nightly", "夜間（1日分）"), ("idle", "新しい観測値なし")):
+            ms, count = r['timings'][label]
+            print(f"検証 {name:<10} {count:7d}件 {ms:8.1f} ms")
+        for _, lead, n, max_mae, max_bias, min_mae, min_bias, brier in r['overall']:
+            print(f"  リード{lead}日: {n}件 最高MAE {max_mae:.2f} バイアス {max_bias:+.2f} "
+                  f"最低MAE {min_mae:.2f} バイアス {min_bias:+.2f} ブライア {brier:.3f}")
+
+    elif args.command == "maintain":
+        from maintain import format_bytes
+        print("年   保守あり: サイズ  検索 ms  30日集計 ms | 保守なし: サイズ  検索 ms  30日集計 ms | 月1回の保守 ms")
+        for r in bench_maintain(args.years, args.areas, args.keep_days):
+            kept, grown = r["maintained"], r["unmaintained"]
+            print(f"{r['year']:2d}年 {format_bytes(kept[0]):>16} {kept[1]:8.3f} {kept[2]:12.2f} | "
+                  f"{format_bytes(grown[0]):>16} {grown[1]:8.3f} {grown[2]:12.2f} | {r['maintain_ms']:10.1f}")
@@ -0,0 +1,75 @@
+import sqlite3
+import argparse
+
+# SQLiteから一度に読む行数
+BATCH_ROWS = 50_000
+
+
+def export_forecasts(db_path='weather.db', out_dir='forecasts_parquet'):
+    """
+    weather_forecasts を area_code=<地域コード>/month=<YYYY-MM>/ で分割した Parquet に書き出す。
+    地域と月で絞り込む集計は、該当するファイルだけを読めば済む。
+    DuckDB で読むときは地域コードの先頭の0が消えないように
+    hive_types={'area_code': 'VARCHAR'} を指定する。
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+    except ImportError:
+        raise ImportError("Parquet を書き出すには pyarrow が必要です（pip install pyarrow）")
+
+    schema = pa.schema([
+        ("forecast_date", pa.date32()),
+        ("weather_description", pa.string()),
+        ("temperature_max", pa.int16()),
+        ("temperature_min", pa.int16()),
+        ("precipitation_probability", pa.int16()),
+        ("created_at", pa.timestamp("s")),
+        ("area_code", pa.string()),
+        ("month", pa.string()),
+    ])
+
+    def batches():
+        with sqlite3.connect(db_path) as conn:
+            cursor = conn.execute('''
+                SELECT forecast_date, weather_description, temperature_max, temperature_min,
+                    precipitation_probability, datetime(created_at), area_code,
+                    strftime('%Y-%m', forecast_date)
+                FROM weather_forecasts
+                ORDER BY area_code, forecast_date
+            ''')
+            while True:
+                rows = cursor.fetchmany(BATCH_ROWS)
+                if not rows:
+                    break
+                columns = list(zip(*rows))
+                yield pa.record_batch([
+                    pa.array(columns[0], pa.string()).cast(pa.date32()),
+                    pa.array(columns[1], pa.string()),
+                    pa.array(columns[2], pa.int16()),
+                    pa.array(columns[3], pa.int16()),
+                    pa.array(columns[4], pa.int16()),
+                    pa.array(columns[5], pa.string()).cast(pa.timestamp("s")),
+                    pa.array(columns[6], pa.string()),
+                    pa.array(columns[7], pa.string()),
+                ], schema=schema)
+
+    ds.write_dataset(
+        pa.RecordBatchReader.from_batches(schema, batches()),
+        out_dir,
+        format="parquet",
+        partitioning=ds.partitioning(
+            pa.schema([("area_code", pa.string()), ("month", pa.string())]), flavor="hive"
+        ),
+        existing_data_behavior="delete_matching",
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="天気予報の履歴を Parquet に書き出す")
+    parser.add_argument("--db", default="weather.db")
+    parser.add_argument("out_dir", nargs="?", default="forecasts_parquet")
+    args = parser.parse_args()
+
+    export_forecasts(args.db, args.out_dir)
+    print(f"==== {args.out_dir} に書き出しました ====")
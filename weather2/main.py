@@ -61,11 +61,8 @@ class WeatherApp:
                     )
                 ''')
                 
-                # インデックスの作成
-                cursor.execute('''
-                    CREATE INDEX IF NOT EXISTS idx_area_date 
-                    ON weather_forecasts(area_code, forecast_date)
-                ''')
+                # (area_code, forecast_date) の検索は UNIQUE 制約のインデックスが使われるので、
+                # 同じ列のインデックスは作らない
                 
                 conn.commit()
         except sqlite3.Error as e:
@@ -156,20 +153,26 @@ class WeatherApp:
                     cursor = conn.cursor()
                     
                     current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                    
+                    # 保存済みの地域と比べ、新しい地域と名前が変わった地域だけを書き込む
+                    stored = dict(cursor.execute('SELECT area_code, area_name FROM areas'))
+                    changed = []
+
                     for office_code, office_info in areas['offices'].items():
                         if isinstance(office_info, dict) and 'name' in office_info:
-                            cursor.execute('''
-                                INSERT OR REPLACE INTO areas 
-                                (area_code, area_name, created_at)
-                                VALUES (?, ?, ?)
-                            ''', (office_code, office_info['name'], current_time))
-                            
+                            if stored.get(office_code) != office_info['name']:
+                                changed.append((office_code, office_info['name'], current_time))
+
                             area_list.append({
                                 'code': office_code,
                                 'name': office_info['name']
                             })
-                    
+
+                    if changed:
+                        cursor.executemany('''
+                            INSERT OR REPLACE INTO areas
+                            (area_code, area_name, created_at)
+                            VALUES (?, ?, ?)
+                        ''', changed)
                     conn.commit()
             
             return sorted(area_list, key=lambda x: x['name'])
@@ -0,0 +1,196 @@
+import os
+import sqlite3
+import argparse
+from datetime import datetime, timedelta
+
+from verify import setup_verification
+
+# 日ごとの予報・観測値・誤差を残す日数。これより古い月の予報は月ごとの集計だけ残す
+KEEP_DAYS = 400
+# 月ごとの集計を残す月数
+KEEP_MONTHS = 120
+# 1回の実行でファイルから返す空きページの上限（0 なら空きページすべて）
+VACUUM_PAGES = 0
+# ANALYZE で1つのインデックスあたりに見る行数の目安（0 なら全行）
+ANALYSIS_LIMIT = 1000
+
+
+# forecast_monthly にあとから足した、値のある日数の列
+COUNT_COLUMNS = ('temperature_max_days', 'temperature_min_days', 'precipitation_probability_days')
+
+
+def setup_maintenance(conn):
+    setup_verification(conn)
+    conn.executescript('''
+        -- 日ごとの予報を月・地域ごとにまとめたもの。平均は合計 / 値のある日数（*_days）で求める
+        CREATE TABLE IF NOT EXISTS forecast_monthly (
+            area_code TEXT NOT NULL,
+            month TEXT NOT NULL,                    -- YYYY-MM
+            days INTEGER NOT NULL,
+            temperature_max_sum INTEGER,
+            temperature_max_highest INTEGER,
+            temperature_min_sum INTEGER,
+            temperature_min_lowest INTEGER,
+            precipitation_probability_sum INTEGER,
+            temperature_max_days INTEGER NOT NULL DEFAULT 0,
+            temperature_min_days INTEGER NOT NULL DEFAULT 0,
+            precipitation_probability_days INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (area_code, month)
+        );
+    ''')
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(forecast_monthly)')}
+    for column in COUNT_COLUMNS:
+        if column not in columns:
+            conn.execute(f'ALTER TABLE forecast_monthly ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0')
+
+
+def database_size(conn):
+    """(ファイルのページ数 × ページサイズ, うち空きページの分) をバイトで"""
+    page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+    pages = conn.execute('PRAGMA page_count').fetchone()[0]
+    free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    return pages * page_size, free * page_size
+
+
+def maintain(db_path='weather.db', keep_days=KEEP_DAYS, keep_months=KEEP_MONTHS,
+             vacuum_pages=VACUUM_PAGES, analysis_limit=ANALYSIS_LIMIT, today=None):
+    """
+    weather.db の保守。毎晩実行しても、その間に増えた分だけの仕事で済む。
+
+    1. keep_days より古い月の予報を forecast_monthly に足し込み、日ごとの行は消す
+       （月の途中では切らないので、1つの月が2回に分けて集計されることはない）。
+       集計は forecast_snapshots の、その日に最後に発表された予報から取る。weather_forecasts は
+       '--' を 0 として保存しているので集計には使わず、forecast_snapshots のない地域・月
+       （tkinter版だけで取得した月など）の weather_forecasts の行は集計できないので消さずに残す
+    2. 発表日ごとの予報・観測値・誤差も同じ日付より前を消す（採点の累計は verification_scores に残る）
+    3. keep_months より古い月ごとの集計を消す
+    4. 空いたページを incremental_vacuum でファイルから返し、統計が古くなった表だけ ANALYZE し直す
+
+    消した行数と、実行前後のファイルサイズ・空きページの量を返す。
+    """
+    today = today or datetime.now()
+    oldest_day = today - timedelta(days=keep_days)
+    cutoff = oldest_day.strftime('%Y-%m-01')
+    month_index = today.year * 12 + today.month - 1 - keep_months
+    oldest_month = f"{month_index // 12:04d}-{month_index % 12 + 1:02d}"
+
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        setup_maintenance(conn)
+        conn.commit()
+        size_before, free_before = database_size(conn)
+        report = {'rolled_up': 0, 'deleted': {}}
+
+        with conn:
+            report['rolled_up'] = conn.execute('''
+                INSERT INTO forecast_monthly
+                (area_code, month, days, temperature_max_sum, temperature_max_highest,
+                temperature_min_sum, temperature_min_lowest, precipitation_probability_sum,
+                temperature_max_days, temperature_min_days, precipitation_probability_days)
+                SELECT area_code, strftime('%Y-%m', forecast_date), COUNT(*),
+                    SUM(temperature_max), MAX(temperature_max),
+                    SUM(temperature_min), MIN(temperature_min), SUM(precipitation_probability),
+                    COUNT(temperature_max), COUNT(temperature_min), COUNT(precipitation_probability)
+                FROM forecast_snapshots s
+                WHERE forecast_date < ?
+                  AND issued_date = (SELECT MAX(issued_date) FROM forecast_snapshots
+                                     WHERE area_code = s.area_code AND forecast_date = s.forecast_date)
+                GROUP BY area_code, strftime('%Y-%m', forecast_date)
+                ON CONFLICT(area_code, month) DO UPDATE SET
+                    days = days + excluded.days,
+                    -- 値のない（NULL の）側は足さない・比べない
+                    temperature_max_sum = COALESCE(temperature_max_sum, 0) + COALESCE(excluded.temperature_max_sum, 0),
+                    temperature_max_highest = COALESCE(MAX(temperature_max_highest, excluded.temperature_max_highest),
+                                                       temperature_max_highest, excluded.temperature_max_highest),
+                    temperature_min_sum = COALESCE(temperature_min_sum, 0) + COALESCE(excluded.temperature_min_sum, 0),
+                    temperature_min_lowest = COALESCE(MIN(temperature_min_lowest, excluded.temperature_min_lowest),
+                                                      temperature_min_lowest, excluded.temperature_min_lowest),
+                    precipitation_probability_sum =
+                        COALESCE(precipitation_probability_sum, 0) + COALESCE(excluded.precipitation_probability_sum, 0),
+                    temperature_max_days = temperature_max_days + excluded.temperature_max_days,
+                    temperature_min_days = temperature_min_days + excluded.temperature_min_days,
+                    precipitation_probability_days =
+                        precipitation_probability_days + excluded.precipitation_probability_days
+            ''', (cutoff,)).rowcount
+            # 月ごとの集計に入った地域・月の行だけを消す
+            report['deleted']['weather_forecasts'] = conn.execute('''
+                DELETE FROM weather_forecasts
+                WHERE forecast_date < ? AND EXISTS (
+                    SELECT 1 FROM forecast_monthly m
+                    WHERE m.area_code = weather_forecasts.area_code
+                      AND m.month = strftime('%Y-%m', weather_forecasts.forecast_date))
+            ''', (cutoff,)).rowcount
+            for table, column in (('forecast_snapshots', 'forecast_date'),
+                                  ('forecast_errors', 'forecast_date'),
+                                  ('observations', 'obs_date')):
+                report['deleted'][table] = conn.execute(
+                    f'DELETE FROM {table} WHERE {column} < ?', (cutoff,)).rowcount
+            report['deleted']['forecast_monthly'] = conn.execute(
+                'DELETE FROM forecast_monthly WHERE month < ?', (oldest_month,)).rowcount
+            # UNIQUE(area_code, forecast_date) と同じ列のインデックス（以前のスキーマで作っていた）
+            conn.execute('DROP INDEX IF EXISTS idx_area_date')
+
+        size_deleted, free_deleted = database_size(conn)
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            # incremental にするには一度だけ全体の VACUUM が要る（以後は空きページを少しずつ返せる）
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('VACUUM')
+            report['full_vacuum'] = True
+        else:
+            conn.execute(f'PRAGMA incremental_vacuum({int(vacuum_pages)})')
+            report['full_vacuum'] = False
+
+        conn.execute(f'PRAGMA analysis_limit = {int(analysis_limit)}')
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone():
+            # 前回から行数が大きく変わった表だけを ANALYZE し直す
+            conn.execute('PRAGMA optimize')
+        else:
+            conn.execute('ANALYZE')
+        conn.commit()
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+        size_after, free_after = database_size(conn)
+    finally:
+        conn.close()
+
+    report.update({
+        'size_before': size_before,
+        'free_before': free_before,
+        'free_after_delete': free_deleted,
+        'size_after': size_after,
+        'free_after': free_after,
+        'reclaimed': size_before - size_after,
+        'cutoff': cutoff,
+        'oldest_month': oldest_month,
+    })
+    return report
+
+
+def format_bytes(size):
+    for unit in ('B', 'KB', 'MB'):
+        if abs(size) < 1024:
+            return f"{size:.0f}{unit}" if unit == 'B' else f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}GB"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="weather.db の集計・削除・VACUUM/ANALYZE")
+    parser.add_argument("--db", default="weather.db")
+    parser.add_argument("--keep-days", type=int, default=KEEP_DAYS, help="日ごとのデータを残す日数")
+    parser.add_argument("--keep-months", type=int, default=KEEP_MONTHS, help="月ごとの集計を残す月数")
+    parser.add_argument("--vacuum-pages", type=int, default=VACUUM_PAGES,
+                        help="1回に返す空きページの上限（0 ならすべて）")
+    parser.add_argument("--analysis-limit", type=int, default=ANALYSIS_LIMIT)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        parser.error(f"{args.db} がありません")
+    r = maintain(args.db, args.keep_days, args.keep_months, args.vacuum_pages, args.analysis_limit)
+    print(f"{r['cutoff']} より前の日ごとのデータを集計・削除しました（月の集計は {r['oldest_month']} から）")
+    print(f"  月ごとの集計に足し込んだ行: {r['rolled_up']}")
+    for table, count in r['deleted'].items():
+        print(f"  {table}: {count}行を削除")
+    print(f"ファイルサイズ: {format_bytes(r['size_before'])} → {format_bytes(r['size_after'])} "
+          f"（{format_bytes(r['reclaimed'])} を返却、空きページ {format_bytes(r['free_after'])}"
+          f"{'、初回のため全体をVACUUM' if r['full_vacuum'] else ''}）")
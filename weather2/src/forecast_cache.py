@@ -0,0 +1,360 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import requests
+
+# 気象庁の防災情報JSONの置き場所（計測ではローカルのスタブに向ける）
+JMA_BASE_URL = os.environ.get('JMA_BASE_URL', 'https://www.jma.go.jp/bosai')
+# 予報の発表は1日3回なので、取得した予報はこの秒数のあいだ取り直さない
+FORECAST_TTL = 10 * 60
+# 取得に失敗した地域は、この秒数が経つまでDBの予報で済ませる
+RETRY_AFTER = 30
+HTTP_TIMEOUT = 10
+
+
+def setup_database(conn):
+    """
+    データベースとテーブルの初期設定（tkinter版と同じスキーマ）。
+    auto_vacuum はファイルにまだ何も書かれていないときしか効かないので、
+    journal_mode=WAL などより先に、接続してすぐ呼ぶこと（ConnectionPool.connect も同じ順で設定する）。
+    """
+    # 削除で空いたページを maintain.py の incremental_vacuum で返せるようにする
+    conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS areas (
+            area_code TEXT PRIMARY KEY,
+            area_name TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT (DATETIME('now', 'localtime'))
+        );
+
+        CREATE TABLE IF NOT EXISTS weather_forecasts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            area_code TEXT,
+            forecast_date DATE NOT NULL,
+            weather_description TEXT,
+            temperature_max INTEGER,
+            temperature_min INTEGER,
+            precipitation_probability INTEGER,
+            created_at TIMESTAMP DEFAULT (DATETIME('now', 'localtime')),
+            FOREIGN KEY (area_code) REFERENCES areas(area_code),
+            UNIQUE(area_code, forecast_date)
+        );
+
+        -- weather_forecasts は取得のたびに上書きされるので、検証用に発表日ごとの予報を残す
+        -- （lead_days は発表日から予報日までの日数、'--' の値は NULL）
+        CREATE TABLE IF NOT EXISTS forecast_snapshots (
+            area_code TEXT NOT NULL,
+            issued_date DATE NOT NULL,
+            forecast_date DATE NOT NULL,
+            lead_days INTEGER NOT NULL,
+            temperature_max INTEGER,
+            temperature_min INTEGER,
+            precipitation_probability INTEGER,
+            PRIMARY KEY (area_code, forecast_date, issued_date)
+        );
+
+        -- 予報の気温の観測地点（予報JSONの気温の系列に載っているアメダス地点）
+        CREATE TABLE IF NOT EXISTS area_stations (
+            area_code TEXT PRIMARY KEY,
+            station_code TEXT NOT NULL
+        );
+    ''')
+
+
+class ConnectionPool:
+    """
+    SQLite接続のプール。操作のたびに connect() し直さず、使い終わった接続を使い回す。
+    同時に使う接続は size 本まで。WALにしておくので、予報の書き込み中も読み出しは待たされない。
+    """
+
+    def __init__(self, path='weather.db', size=4):
+        self.path = path
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(size)
+        with self.connection() as conn:
+            setup_database(conn)
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        # WAL にするとファイルが初期化されるので、新しいDBの auto_vacuum はその前に決める
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """接続を1本借りる。ブロックを抜けるとコミット（例外ならロールバック）して返す。"""
+        with self.slots:
+            try:
+                conn = self.idle.get_nowait()
+            except queue.Empty:
+                conn = self.connect()
+            try:
+                with conn:
+                    yield conn
+            finally:
+                self.idle.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def series_values(series, key):
+    """
+    系列の値を timeDefines の (日付, 時) と組にする：[('YYYY-MM-DD', 時, 値), ...]。
+    値の並びは系列ごとに違う（天気は日ごと、降水確率は6時間ごと、気温は 00時が最低・09時が最高）ので、
+    位置ではなく時刻で読む。
+    """
+    areas = series.get('areas', [])
+    values = areas[0].get(key, []) if areas else []
+    return [(time_define[:10], int(time_define[11:13]), value)
+            for time_define, value in zip(series.get('timeDefines', []), values)]
+
+
+def parse_forecast(report, today=None, missing=0):
+    """
+    予報JSONの先頭の発表から、今日からの3日分を (日付, 天気, 最高気温, 最低気温, 降水確率) の行にする。
+    降水確率はその日の6時間ごとの値の最大。気温は今日と明日の分しか発表されない。
+    値のない（'--' の、または発表されていない）気温・降水確率は missing にする。
+    """
+    today = today or datetime.now()
+    series = report['timeSeries']
+    weathers, pops, temps = {}, {}, {}
+    for date_str, _, value in series_values(series[0], 'weathers'):
+        weathers.setdefault(date_str, value)
+    if len(series) > 1:
+        for date_str, _, value in series_values(series[1], 'pops'):
+            if value != '--':
+                pops[date_str] = max(pops.get(date_str, 0), int(value))
+    if len(series) > 2:
+        for date_str, hour, value in series_values(series[2], 'temps'):
+            if value != '--':
+                # 00時の値がその日の最低気温、09時の値が最高気温
+                temps[date_str, 'min' if hour < 9 else 'max'] = int(value)
+
+    rows = []
+    for i in range(3):
+        date_str = (today + timedelta(days=i)).strftime('%Y-%m-%d')
+        rows.append((date_str, weathers.get(date_str, "不明"),
+                     temps.get((date_str, 'max'), missing), temps.get((date_str, 'min'), missing),
+                     pops.get(date_str, missing)))
+    return rows
+
+
+def temperature_station(report):
+    """予報の気温を観測するアメダス地点のコード（系列がなければ None）"""
+    series = report['timeSeries']
+    if len(series) > 2 and series[2].get('areas'):
+        return series[2]['areas'][0].get('area', {}).get('code')
+    return None
+
+
+class ForecastCache:
+    """
+    プロセス全体で1つだけ持つ、地域ごとの予報キャッシュ。
+
+    request(area_code) はキャッシュが新しければ済みの Future を、古ければ取得中の Future を返す。
+    同じ地域の取得が進行中なら新たに問い合わせず同じ Future を返すので（single-flight）、
+    何百セッションが同じ地域を開いても気象庁への問い合わせは1回で済む。
+    取得した予報が前と変わっていれば、pubsub の forecast/<地域コード> で
+    (地域コード, 版, 行) を配り、その地域を表示中の全セッションが書き換える。
+    表示中の地域（watch() されている地域）は、TTLが切れるとバックグラウンドで取り直す。
+    """
+
+    def __init__(self, pool, base_url=JMA_BASE_URL, ttl=FORECAST_TTL, retry_after=RETRY_AFTER,
+                 refresh_interval=60, workers=4):
+        self.pool = pool
+        self.base_url = base_url.rstrip('/')
+        self.ttl = ttl
+        self.retry_after = retry_after
+        self.refresh_interval = refresh_interval
+        self.http = requests.Session()
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix='forecast')
+        self.lock = threading.Lock()
+        self.entries = {}    # 地域コード -> (有効期限, 版, 行)
+        self.inflight = {}   # 地域コード -> 取得中の Future
+        self.viewers = Counter()
+        self.pubsub = None
+        self.refresher = None
+        self.fetches = 0     # 気象庁に予報を問い合わせた回数
+        self.area_lock = threading.Lock()
+        self.areas = None
+
+    @staticmethod
+    def topic(area_code):
+        return f'forecast/{area_code}'
+
+    def bind(self, pubsub):
+        """配信に使う pubsub クライアント。どのセッションのものでも同じハブに届く。"""
+        with self.lock:
+            self.pubsub = pubsub
+
+    def watch(self, area_code):
+        with self.lock:
+            self.viewers[area_code] += 1
+            if self.refresher is None:
+                self.refresher = threading.Thread(target=self.refresh_loop, name='forecast-refresh',
+                                                  daemon=True)
+                self.refresher.start()
+
+    def unwatch(self, area_code):
+        with self.lock:
+            self.viewers[area_code] -= 1
+            if self.viewers[area_code] <= 0:
+                del self.viewers[area_code]
+
+    def request(self, area_code):
+        """地域の今日からの3日分の予報 (版, 行) が入る Future。"""
+        with self.lock:
+            entry = self.entries.get(area_code)
+            if entry and entry[0] > time.monotonic():
+                future = Future()
+                future.set_result(entry[1:])
+                return future
+            future = self.inflight.get(area_code)
+            if future is None:
+                future = self.inflight[area_code] = self.executor.submit(self.refresh, area_code)
+            return future
+
+    def forecast(self, area_code):
+        return self.request(area_code).result()
+
+    def refresh(self, area_code):
+        ttl = self.ttl
+        try:
+            try:
+                with self.lock:
+                    self.fetches += 1
+                response = self.http.get(f'{self.base_url}/forecast/data/forecast/{area_code}.json',
+                                         timeout=HTTP_TIMEOUT)
+                response.raise_for_status()
+                self.save_forecast(area_code, response.json()[0])
+            except (requests.RequestException, ValueError, LookupError) as e:
+                # 取得に失敗したときはDBに残っている予報を返す
+                print(f"天気予報取得エラー: {e}")
+                ttl = self.retry_after
+            rows = self.get_forecast_from_db(area_code)
+
+            with self.lock:
+                old = self.entries.get(area_code)
+                version = old[1] if old else 0
+                changed = old is None or old[2] != rows
+                if changed:
+                    version += 1
+                self.entries[area_code] = (time.monotonic() + ttl, version, rows)
+                pubsub = self.pubsub
+            if changed and pubsub is not None:
+                pubsub.send_all_on_topic(self.topic(area_code), (area_code, version, rows))
+            return version, rows
+        finally:
+            with self.lock:
+                del self.inflight[area_code]
+
+    def refresh_loop(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            now = time.monotonic()
+            with self.lock:
+                stale = [code for code in self.viewers
+                         if code not in self.entries or self.entries[code][0] <= now]
+            for code in stale:
+                self.request(code)
+
+    def save_forecast(self, area_code, report):
+        today = datetime.now()
+        snapshot = parse_forecast(report, today, missing=None)
+        # 表示用の行は tkinter版と同じく、値のないところを0にする
+        rows = [(date_str, weather, *(0 if value is None else value for value in values))
+                for date_str, weather, *values in snapshot]
+        station = temperature_station(report)
+        issued_date = today.strftime('%Y-%m-%d')
+        with self.pool.connection() as conn:
+            conn.executemany('''
+                INSERT OR REPLACE INTO weather_forecasts
+                (area_code, forecast_date, weather_description,
+                temperature_max, temperature_min, precipitation_probability)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', [(area_code, *row) for row in rows])
+            conn.executemany('''
+                INSERT OR REPLACE INTO forecast_snapshots
+                (area_code, issued_date, forecast_date, lead_days,
+                temperature_max, temperature_min, precipitation_probability)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', [(area_code, issued_date, date_str, lead, temp_max, temp_min, pop)
+                  for lead, (date_str, _, temp_max, temp_min, pop) in enumerate(snapshot)])
+            if station:
+                conn.execute('INSERT OR REPLACE INTO area_stations (area_code, station_code) VALUES (?, ?)',
+                             (area_code, station))
+
+    def get_forecast_from_db(self, area_code, date_str=None):
+        with self.pool.connection() as conn:
+            if date_str:
+                cursor = conn.execute('''
+                    SELECT forecast_date, weather_description,
+                        temperature_max, temperature_min, precipitation_probability
+                    FROM weather_forecasts
+                    WHERE area_code = ? AND forecast_date = ?
+                ''', (area_code, date_str))
+            else:
+                cursor = conn.execute('''
+                    SELECT forecast_date, weather_description,
+                        temperature_max, temperature_min, precipitation_probability
+                    FROM weather_forecasts
+                    WHERE area_code = ? AND forecast_date >= date('now')
+                    ORDER BY forecast_date
+                    LIMIT 3
+                ''', (area_code,))
+            return cursor.fetchall()
+
+    def area_list(self):
+        """地域リスト。プロセスで最初に呼ばれたときに1回だけ取得し、全セッションで使い回す。"""
+        with self.area_lock:
+            if not self.areas:
+                self.areas = self.get_area_list()
+            return self.areas
+
+    def get_area_list(self):
+        try:
+            response = self.http.get(f'{self.base_url}/common/const/area.json', timeout=HTTP_TIMEOUT)
+            response.raise_for_status()
+            offices = response.json().get('offices', {})
+            area_list = [{'code': code, 'name': info['name']} for code, info in offices.items()
+                         if isinstance(info, dict) and 'name' in info]
+            current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            with self.pool.connection() as conn:
+                # 保存済みの地域と比べ、新しい地域と名前が変わった地域だけを書き込む
+                stored = dict(conn.execute('SELECT area_code, area_name FROM areas'))
+                conn.executemany('''
+                    INSERT OR REPLACE INTO areas (area_code, area_name, created_at)
+                    VALUES (?, ?, ?)
+                ''', [(area['code'], area['name'], current_time) for area in area_list
+                      if stored.get(area['code']) != area['name']])
+            return sorted(area_list, key=lambda x: x['name'])
+        except (requests.RequestException, ValueError) as e:
+            print(f"地域リスト取得エラー: {e}")
+
+        # DBから既存のデータを取得
+        try:
+            with self.pool.connection() as conn:
+                rows = conn.execute('SELECT area_code, area_name FROM areas').fetchall()
+            return sorted([{'code': row[0], 'name': row[1]} for row in rows], key=lambda x: x['name'])
+        except sqlite3.Error as e:
+            print(f"DB取得エラー: {e}")
+            return []
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.http.close()
+        self.pool.close()
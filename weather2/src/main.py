@@ -0,0 +1,198 @@
+import os
+import re
+import atexit
+import threading
+from datetime import datetime
+from functools import lru_cache
+
+import flet as ft
+
+from forecast_cache import ConnectionPool, ForecastCache
+
+WEATHER_ICONS = {
+    '晴': '☀️',
+    'くもり': '☁️',
+    '曇': '☁️',
+    '雨': '🌧️',
+    '霧': '🌁',
+    '雪': '⛄️',
+}
+
+
+@lru_cache(maxsize=None)
+def forecast_cache():
+    # 全セッションで1つ：DB接続プール・予報キャッシュ・気象庁への取得を共有する
+    cache = ForecastCache(ConnectionPool(os.environ.get('WEATHER_DB', 'weather.db')))
+    atexit.register(cache.close)
+    return cache
+
+
+class WeatherApp:
+    """
+    tkinter版 WeatherApp のFlet Web版。セッションごとに1つ作る。
+    予報は forecast_cache() から受け取り、表示中の地域の予報が更新されると pubsub で届く。
+    """
+
+    def __init__(self, page: ft.Page):
+        self.page = page
+        self.page.title = "天気予報アプリ"
+        self.cache = forecast_cache()
+        self.cache.bind(page.pubsub)
+
+        # 表示中の地域と、画面に出ている予報の版
+        self.area_code = None
+        self.shown_version = 0
+        # 日付を指定して検索した結果を出している間は、更新を受けても書き換えない
+        self.searching = False
+        self.lock = threading.Lock()
+
+        self.area_list = self.cache.area_list()
+        self.create_ui()
+        page.on_close = self.on_close
+
+    def validate_date(self, date_str):
+        """日付形式の検証（YYYY-MM-DD）"""
+        if not re.match(r'^\d{4}-\d{2}-\d{2}$', date_str):
+            return False
+        try:
+            datetime.strptime(date_str, '%Y-%m-%d')
+            return True
+        except ValueError:
+            return False
+
+    def create_ui(self):
+        self.area_dropdown = ft.Dropdown(
+            label="地域を選択",
+            options=[ft.dropdown.Option(key=area['code'], text=area['name']) for area in self.area_list],
+            width=300,
+            on_change=self.get_weather_forecast,
+        )
+        self.date_field = ft.TextField(
+            label="日付を選択 (YYYY-MM-DD)",
+            value=datetime.now().strftime('%Y-%m-%d'),
+            width=200,
+        )
+        self.forecast_row = ft.Row(wrap=True, alignment=ft.MainAxisAlignment.CENTER)
+        self.page.add(
+            ft.Column(
+                [
+                    self.area_dropdown,
+                    ft.Row(
+                        [self.date_field, ft.ElevatedButton("検索", on_click=self.search_forecast)],
+                        alignment=ft.MainAxisAlignment.CENTER,
+                    ),
+                    self.forecast_row,
+                ],
+                horizontal_alignment=ft.CrossAxisAlignment.CENTER,
+            )
+        )
+
+    def show_message(self, text):
+        self.page.open(ft.SnackBar(ft.Text(text)))
+
+    def get_weather_forecast(self, e):
+        area_code = self.area_dropdown.value
+        if not area_code or area_code == self.area_code:
+            return
+
+        # 前の地域の配信をやめ、新しい地域の配信を受ける
+        with self.lock:
+            previous, self.area_code = self.area_code, area_code
+            self.shown_version = 0
+            self.searching = False
+        if previous:
+            self.page.pubsub.unsubscribe_topic(self.cache.topic(previous))
+            self.cache.unwatch(previous)
+        self.page.pubsub.subscribe_topic(self.cache.topic(area_code), self.forecast_updated)
+        self.cache.watch(area_code)
+
+        # 取得を待つ間スレッドを塞がない：揃ったところで表示する
+        self.cache.request(area_code).add_done_callback(
+            lambda future: self.forecast_received(area_code, future))
+
+    def forecast_received(self, area_code, future):
+        # コールバックの中で投げた例外は握りつぶされるので、ここで画面に出す
+        error = future.exception()
+        if error is not None:
+            print(f"天気予報取得エラー: {error}")
+            with self.lock:
+                if area_code != self.area_code:
+                    return
+                self.forecast_row.controls = []
+                self.forecast_row.update()
+            self.show_message("天気予報の取得中にエラーが発生しました")
+            return
+        version, rows = future.result()
+        if not rows and area_code == self.area_code:
+            self.show_message("予報データが見つかりませんでした")
+        self.show_forecast(area_code, version, rows)
+
+    def forecast_updated(self, topic, message):
+        self.show_forecast(*message)
+
+    def show_forecast(self, area_code, version, rows):
+        # 配信はスレッドプールで処理されるので、古い版が後から届くこともある
+        with self.lock:
+            if area_code != self.area_code or version <= self.shown_version or self.searching:
+                return
+            self.shown_version = version
+            self.display_forecast(rows)
+
+    def search_forecast(self, e):
+        """日付を指定して予報を検索"""
+        date_str = self.date_field.value.strip()
+        if not self.validate_date(date_str):
+            self.show_message("正しい日付形式で入力してください (YYYY-MM-DD)")
+            return
+        if not self.area_code:
+            self.show_message("地域を選択してください")
+            return
+
+        forecast_data = self.cache.get_forecast_from_db(self.area_code, date_str)
+        if not forecast_data:
+            self.show_message("指定された日付の予報データが見つかりませんでした")
+            return
+        with self.lock:
+            self.searching = True
+            self.display_forecast(forecast_data)
+
+    def display_forecast(self, forecast_data):
+        """天気予報の表示（DBのデータを使用）"""
+        cards = []
+        for date_str, weather, temp_max, temp_min, pop in forecast_data:
+            cards.append(ft.Container(
+                ft.Column(
+                    [
+                        ft.Text(date_str, size=16, weight=ft.FontWeight.BOLD),
+                        ft.Text(self.get_weather_icons(weather), size=30),
+                        ft.Text(weather, size=12, text_align=ft.TextAlign.CENTER),
+                        ft.Text(f"気温：最高 {temp_max}℃ / 最低 {temp_min}℃", size=12),
+                        ft.Text(f"降水確率：{pop}%", size=12),
+                    ],
+                    horizontal_alignment=ft.CrossAxisAlignment.CENTER,
+                ),
+                width=250,
+                padding=10,
+                border=ft.border.all(2, ft.Colors.OUTLINE),
+                border_radius=8,
+            ))
+        self.forecast_row.controls = cards
+        self.forecast_row.update()
+
+    def get_weather_icons(self, weather_str):
+        icons = [icon for key, icon in WEATHER_ICONS.items() if key in weather_str]
+        if len(icons) > 3:
+            return " ".join(icons[:3]) + " ..."
+        return " ".join(icons) if icons else '❓'
+
+    def on_close(self, e):
+        if self.area_code:
+            self.cache.unwatch(self.area_code)
+
+
+def main(page: ft.Page):
+    WeatherApp(page)
+
+
+if __name__ == "__main__":
+    ft.app(main)
@@ -0,0 +1,186 @@
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WEATHERS = ["晴れ", "くもり　時々　晴れ", "雨　後　くもり", "くもり　夜遅く　雪"]
+
+
+def sample_areas(count=58):
+    """area.json の offices に近い構造の地域リスト（コードは 010000 から始まる6桁）"""
+    return {f"{(i + 1) * 10000:06d}": {"name": f"テスト地方{i + 1}", "officeName": f"テスト気象台{i + 1}"}
+            for i in range(count)}
+
+
+def station_for(area_code):
+    """地域の気温の観測地点（5桁のアメダス地点コード）"""
+    return f"{area_code[:2]}111"
+
+
+def sample_forecast(area_code, revision=0, today=None):
+    """
+    forecast/<地域コード>.json の先頭の発表（天気・降水確率・気温の3系列）。気象庁と同じく、
+    天気は3日分の日ごと、降水確率は今の6時間から明日いっぱいまでの6時間ごと、
+    気温は今日と明日の 00時（最低）と 09時（最高）。
+    revision を変えると天気と気温が変わる（予報の更新の代わり）。
+    """
+    today = today or datetime.now()
+    seed = int(area_code) // 10000 + revision
+    midnight = today.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def define(at):
+        return at.strftime('%Y-%m-%dT%H:00:00+09:00')
+
+    days = [define(midnight + timedelta(days=i)) for i in range(3)]
+    slots = [define(midnight + timedelta(hours=hour))
+             for hour in range(today.hour // 6 * 6, 48, 6)]
+    temp_times = [define(midnight + timedelta(days=i, hours=hour)) for i in range(2) for hour in (0, 9)]
+    return [{
+        "publishingOffice": "テスト気象台",
+        "reportDatetime": today.strftime('%Y-%m-%dT%H:00:00+09:00'),
+        "timeSeries": [
+            {"timeDefines": days,
+             "areas": [{"area": {"name": "テスト", "code": area_code},
+                        "weathers": [WEATHERS[(seed + i) % len(WEATHERS)] for i in range(3)]}]},
+            {"timeDefines": slots,
+             "areas": [{"area": {"name": "テスト", "code": area_code},
+                        "pops": [str((seed * 10 + i * 20) % 100) for i in range(len(slots))]}]},
+            {"timeDefines": temp_times,
+             "areas": [{"area": {"name": "テスト観測所", "code": station_for(area_code)},
+                        "temps": [str(value) for i in range(2)
+                                  for value in (10 + (seed + i) % 5, 20 + (seed + i) % 10)]}]},
+        ],
+    }]
+
+
+def sample_point(station_code, day, hour):
+    """
+    amedas/data/point/<地点>/<YYYYMMDD>_<HH>.json：HH時から3時間分の10分ごとの観測値。
+    気温は日ごとに決まる最高・最低の間を1日周期で動き、降水は雨の日だけ少し降る。
+    """
+    rng = random.Random(f"{station_code}/{day:%Y%m%d}")
+    low = 5 + rng.uniform(0, 10)
+    high = low + rng.uniform(4, 12)
+    rainy = rng.random() < 0.3
+    records = {}
+    for step in range(18):
+        at = day + timedelta(hours=hour, minutes=10 * step)
+        # 最低は5時ごろ、最高は14時ごろ
+        phase = math.cos((at.hour + at.minute / 60 - 14) / 24 * 2 * math.pi)
+        records[at.strftime('%Y%m%d%H%M%S')] = {
+            "temp": [round(low + (high - low) * (phase + 1) / 2, 1), 0],
+            "precipitation10m": [0.5 if rainy and step % 3 == 0 else 0.0, 0],
+        }
+    return records
+
+
+class StubJMA:
+    """
+    気象庁の防災情報JSON（area.json、forecast/<地域コード>.json、アメダスの地点ごとの観測値）を
+    返すローカルのHTTPサーバー。
+    latency で応答を遅らせ、パスごとの問い合わせ回数を数える。
+    revision を上げると全地域の予報が変わる。
+    """
+
+    def __init__(self, areas=None, latency=0.0, host="127.0.0.1", port=0):
+        self.areas = areas or sample_areas()
+        self.latency = latency
+        self.revision = 0
+        self.lock = threading.Lock()
+        self.requests = {}   # パス -> 回数
+
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                site.handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/bosai"
+
+    def requests_for(self, prefix):
+        with self.lock:
+            return sum(count for path, count in self.requests.items() if path.startswith(prefix))
+
+    def body(self, path):
+        if path == "/bosai/common/const/area.json":
+            return {"offices": self.areas}
+        prefix, suffix = "/bosai/forecast/data/forecast/", ".json"
+        if path.startswith(prefix) and path.endswith(suffix):
+            area_code = path[len(prefix):-len(suffix)]
+            if area_code in self.areas:
+                return sample_forecast(area_code, self.revision)
+        prefix = "/bosai/amedas/data/point/"
+        if path.startswith(prefix) and path.endswith(suffix):
+            try:
+                station_code, block = path[len(prefix):-len(suffix)].split("/")
+                day, hour = datetime.strptime(block[:8], '%Y%m%d'), int(block[9:])
+            except ValueError:
+                return None
+            if hour % 3 == 0 and station_code in {station_for(code) for code in self.areas}:
+                return sample_point(station_code, day, hour)
+        return None
+
+    def handle(self, request):
+        path = request.path.split("?")[0]
+        with self.lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        data = self.body(path)
+        if data is None:
+            status, body = 404, b"not found"
+        else:
+            status, body = 200, json.dumps(data, ensure_ascii=False).encode('utf-8')
+        request.send_response(status)
+        request.send_header("Content-Type", "application/json; charset=utf-8")
+        request.send_header("Content-Length", str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self.base_url
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="天気予報アプリ用の気象庁JSONのスタブ")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.0, help="応答までの待ち時間（秒）")
+    args = parser.parse_args()
+
+    site = StubJMA(latency=args.latency, port=args.port)
+    print(f"Serving {len(site.areas)} areas at {site.base_url}（JMA_BASE_URL に指定する）")
+    try:
+        site.server.serve_forever()
+    except KeyboardInterrupt:
+        site.server.server_close()
@@ -0,0 +1,45 @@
+import os
+import sys
+import sqlite3
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from forecast_cache import ConnectionPool, parse_forecast, setup_database  # noqa: E402
+
+
+def test_pool_creates_incremental_auto_vacuum(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "weather.db"))
+    try:
+        with pool.connection() as conn:
+            assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+            assert conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+    finally:
+        pool.close()
+
+
+def test_setup_database_creates_incremental_auto_vacuum(tmp_path):
+    with sqlite3.connect(tmp_path / "weather.db") as conn:
+        setup_database(conn)
+        assert conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+
+
+def test_parse_forecast_reads_values_by_time():
+    # 05時の発表：今日の気温は最高（09時）だけ、降水確率は6時間ごと、気温は明日まで
+    report = {'timeSeries': [
+        {'timeDefines': ['2024-05-01T05:00:00+09:00', '2024-05-02T00:00:00+09:00',
+                         '2024-05-03T00:00:00+09:00'],
+         'areas': [{'weathers': ['晴れ', 'くもり', '雨']}]},
+        {'timeDefines': ['2024-05-01T06:00:00+09:00', '2024-05-01T12:00:00+09:00',
+                         '2024-05-01T18:00:00+09:00', '2024-05-02T00:00:00+09:00',
+                         '2024-05-02T06:00:00+09:00'],
+         'areas': [{'pops': ['0', '10', '20', '--', '30']}]},
+        {'timeDefines': ['2024-05-01T09:00:00+09:00', '2024-05-02T00:00:00+09:00',
+                         '2024-05-02T09:00:00+09:00'],
+         'areas': [{'area': {'code': '44132'}, 'temps': ['22', '12', '21']}]},
+    ]}
+    assert parse_forecast(report, datetime(2024, 5, 1, 5), missing=None) == [
+        ('2024-05-01', '晴れ', 22, None, 20),
+        ('2024-05-02', 'くもり', 21, 12, 30),
+        ('2024-05-03', '雨', None, None, None),
+    ]
@@ -0,0 +1,31 @@
+import os
+import sys
+import sqlite3
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from maintain import maintain, setup_maintenance  # noqa: E402
+
+
+def test_maintain_keeps_months_without_rollup(tmp_path):
+    # 010000 の1月は発表日ごとの予報があるので集計して消す。tkinter版だけの月は残す
+    path = str(tmp_path / "weather.db")
+    with sqlite3.connect(path) as conn:
+        setup_maintenance(conn)
+        conn.execute("INSERT INTO forecast_snapshots VALUES ('010000', '2020-01-02', '2020-01-02', 0, 12, 3, 40)")
+        conn.executemany(
+            'INSERT INTO weather_forecasts (area_code, forecast_date, temperature_max, '
+            'temperature_min, precipitation_probability) VALUES (?, ?, ?, ?, ?)',
+            [('010000', '2020-01-02', 12, 3, 40), ('010000', '2020-02-05', 9, 1, 10),
+             ('020000', '2020-01-02', 5, 0, 0)])
+    conn.close()
+
+    report = maintain(path, today=datetime(2021, 6, 1))
+
+    assert report['deleted']['weather_forecasts'] == 1
+    with sqlite3.connect(path) as conn:
+        assert conn.execute('SELECT area_code, forecast_date FROM weather_forecasts '
+                            'ORDER BY area_code').fetchall() == [('010000', '2020-02-05'),
+                                                                 ('020000', '2020-01-02')]
+    conn.close()
@@ -0,0 +1,192 @@
+import sqlite3
+import argparse
+
+from amedas import setup_observations
+
+# 日降水量がこれ以上の日を「降水あり」として降水確率を採点する
+RAIN_THRESHOLD = 1.0
+
+
+def setup_verification(conn):
+    """
+    forecast_errors は予報1件ごとの誤差、verification_scores は地域・リードタイムごとの累計。
+    累計を足し込んでいくので、MAE・バイアス・ブライアスコアは履歴の長さによらず1行から読める。
+    """
+    setup_observations(conn)
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS forecast_errors (
+            area_code TEXT NOT NULL,
+            forecast_date DATE NOT NULL,
+            lead_days INTEGER NOT NULL,
+            temperature_max_error REAL,     -- 予報 - 観測
+            temperature_min_error REAL,
+            brier REAL,                     -- (降水確率 - 降水の有無)^2
+            PRIMARY KEY (area_code, forecast_date, lead_days)
+        );
+
+        CREATE TABLE IF NOT EXISTS verification_scores (
+            area_code TEXT NOT NULL,
+            lead_days INTEGER NOT NULL,
+            max_count INTEGER NOT NULL,
+            max_abs_sum REAL NOT NULL,
+            max_sum REAL NOT NULL,
+            min_count INTEGER NOT NULL,
+            min_abs_sum REAL NOT NULL,
+            min_sum REAL NOT NULL,
+            pop_count INTEGER NOT NULL,
+            brier_sum REAL NOT NULL,
+            PRIMARY KEY (area_code, lead_days)
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_area_stations_station
+        ON area_stations(station_code);
+
+        -- ジョブがどの観測値（observations.id）まで処理したか
+        CREATE TABLE IF NOT EXISTS job_state (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+    ''')
+
+
+def verify_forecasts(db_path='weather.db', rain_threshold=RAIN_THRESHOLD):
+    """
+    前回の実行のあとに取り込まれた観測値だけを、同じ地域・日付の予報（全リードタイム）と突き合わせ、
+    誤差を forecast_errors に、地域・リードタイムごとの累計を verification_scores に足し込む。
+    誤差と累計の計算は numpy で全地域・全リードタイムまとめて行う。採点した予報の件数を返す。
+    """
+    try:
+        import numpy as np
+    except ImportError:
+        raise ImportError("予報の検証には numpy が必要です（pip install numpy）")
+
+    with sqlite3.connect(db_path) as conn:
+        setup_verification(conn)
+        row = conn.execute("SELECT value FROM job_state WHERE name = 'verify_observation_id'").fetchone()
+        last_id = row[0] if row else 0
+        latest_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM observations').fetchone()[0]
+        if latest_id <= last_id:
+            return 0
+
+        # 新しい観測値から辿る（CROSS JOIN で結合順を固定し、予報の履歴を全件なめないようにする）
+        rows = conn.execute('''
+            SELECT s.area_code, s.forecast_date, s.lead_days,
+                s.temperature_max, s.temperature_min, s.precipitation_probability,
+                o.temperature_max, o.temperature_min, o.precipitation
+            FROM observations o
+            CROSS JOIN area_stations a ON a.station_code = o.station_code
+            CROSS JOIN forecast_snapshots s ON s.area_code = a.area_code AND s.forecast_date = o.obs_date
+            WHERE o.id > ? AND o.id <= ?
+        ''', (last_id, latest_id)).fetchall()
+
+        if rows:
+            columns = list(zip(*rows))
+            areas, dates = columns[0], columns[1]
+            leads = np.array(columns[2], dtype=np.int64)
+            # None（値なし）は NaN になり、その予報はその指標だけ採点しない
+            fc_max, fc_min, pop, ob_max, ob_min, rain = (np.array(column, dtype=np.float64)
+                                                          for column in columns[3:])
+            max_error = fc_max - ob_max
+            min_error = fc_min - ob_min
+            brier = (pop / 100 - (rain >= rain_threshold)) ** 2
+            brier[np.isnan(rain)] = np.nan
+
+            # 地域とリードタイムの組ごとに bincount で集計する
+            area_codes, area_index = np.unique(np.array(areas), return_inverse=True)
+            group_key = area_index * (leads.max() + 1) + leads
+            groups, group_index = np.unique(group_key, return_inverse=True)
+
+            def sums(values):
+                valid = ~np.isnan(values)
+                count = np.bincount(group_index, weights=valid, minlength=len(groups))
+                total = np.bincount(group_index, weights=np.where(valid, values, 0), minlength=len(groups))
+                absolute = np.bincount(group_index, weights=np.where(valid, np.abs(values), 0),
+                                       minlength=len(groups))
+                return count, absolute, total
+
+            max_count, max_abs, max_sum = sums(max_error)
+            min_count, min_abs, min_sum = sums(min_error)
+            pop_count, _, brier_sum = sums(brier)
+
+            def nullable(values):
+                return [None if np.isnan(value) else value for value in values.tolist()]
+
+            conn.executemany('''
+                INSERT OR REPLACE INTO forecast_errors
+                (area_code, forecast_date, lead_days, temperature_max_error, temperature_min_error, brier)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', zip(areas, dates, leads.tolist(), nullable(max_error), nullable(min_error), nullable(brier)))
+
+            group_lead = groups % (leads.max() + 1)
+            group_area = area_codes[groups // (leads.max() + 1)]
+            conn.executemany('''
+                INSERT INTO verification_scores
+                (area_code, lead_days, max_count, max_abs_sum, max_sum,
+                min_count, min_abs_sum, min_sum, pop_count, brier_sum)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(area_code, lead_days) DO UPDATE SET
+                    max_count = max_count + excluded.max_count,
+                    max_abs_sum = max_abs_sum + excluded.max_abs_sum,
+                    max_sum = max_sum + excluded.max_sum,
+                    min_count = min_count + excluded.min_count,
+                    min_abs_sum = min_abs_sum + excluded.min_abs_sum,
+                    min_sum = min_sum + excluded.min_sum,
+                    pop_count = pop_count + excluded.pop_count,
+                    brier_sum = brier_sum + excluded.brier_sum
+            ''', zip(group_area.tolist(), group_lead.tolist(),
+                     max_count.astype(int).tolist(), max_abs.tolist(), max_sum.tolist(),
+                     min_count.astype(int).tolist(), min_abs.tolist(), min_sum.tolist(),
+                     pop_count.astype(int).tolist(), brier_sum.tolist()))
+
+        # 誤差・累計と同じトランザクションで進めるので、途中で落ちても二重に数えない
+        conn.execute('''
+            INSERT INTO job_state (name, value) VALUES ('verify_observation_id', ?)
+            ON CONFLICT(name) DO UPDATE SET value = excluded.value
+        ''', (latest_id,))
+    return len(rows)
+
+
+def verification_report(db_path='weather.db'):
+    """
+    地域・リードタイムごとの (地域コード, リードタイム, 件数, 最高気温のMAE, バイアス,
+    最低気温のMAE, バイアス, ブライアスコア)。地域コードが None の行は全地域の合計。
+    """
+    with sqlite3.connect(db_path) as conn:
+        setup_verification(conn)
+        return conn.execute('''
+            SELECT area_code, lead_days, max_count,
+                max_abs_sum / NULLIF(max_count, 0), max_sum / NULLIF(max_count, 0),
+                min_abs_sum / NULLIF(min_count, 0), min_sum / NULLIF(min_count, 0),
+                brier_sum / NULLIF(pop_count, 0)
+            FROM (
+                SELECT * FROM verification_scores
+                UNION ALL
+                SELECT NULL, lead_days, SUM(max_count), SUM(max_abs_sum), SUM(max_sum),
+                    SUM(min_count), SUM(min_abs_sum), SUM(min_sum), SUM(pop_count), SUM(brier_sum)
+                FROM verification_scores
+                GROUP BY lead_days
+            )
+            ORDER BY area_code IS NOT NULL, area_code, lead_days
+        ''').fetchall()
+
+
+def format_score(value, width=6):
+    return f"{value:{width}.2f}" if value is not None else " " * (width - 1) + "-"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="予報（最高・最低気温、降水確率）をアメダスの観測値で検証する")
+    parser.add_argument("--db", default="weather.db")
+    parser.add_argument("--rain-threshold", type=float, default=RAIN_THRESHOLD,
+                        help="降水ありとする日降水量（mm）")
+    parser.add_argument("--all-areas", action="store_true", help="地域ごとの成績も表示する")
+    args = parser.parse_args()
+
+    count = verify_forecasts(args.db, args.rain_threshold)
+    print(f"{count}件の予報を採点しました")
+    print("地域      リード  件数  最高MAE バイアス 最低MAE バイアス ブライア")
+    for area, lead, n, max_mae, max_bias, min_mae, min_bias, brier in verification_report(args.db):
+        if area is not None and not args.all_areas:
+            continue
+        print(f"{area or '全地域':<8} {lead:4d}日 {n:6d} {format_score(max_mae, 8)} {format_score(max_bias, 8)} "
+              f"{format_score(min_mae, 8)} {format_score(min_bias, 8)} {format_score(brier, 8)}")